@@ -0,0 +1,109 @@
+"""
+Scaling benchmark for concurrent EN_Project handles in one process.
+
+For N = 1, 2, 4, ... worker threads it runs the same batch of full
+extended-period simulations with ``ProjectThreads`` (each worker owns its
+handle, OpenMP threads partitioned via ENT_set_num_threads) and reports
+wall time, throughput, speed-up over N=1 and resident memory. Every
+concurrent result is compared bit-for-bit with a serial reference run.
+
+    python dev_tools/bench_concurrent_projects.py model.inp --runs 16 --max-workers 8
+    python dev_tools/bench_concurrent_projects.py model.inp --processes   # also time a process pool
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "examples"))
+
+from concurrent_projects import ProjectThreads  # noqa: E402
+from turbo_simulation import run_simulation  # noqa: E402
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        return float("nan")
+
+
+def _solve(inp_path):
+    res = run_simulation(inp_path)
+    return res.pressures, res.flows
+
+
+def _worker_counts(max_workers):
+    counts, n = [], 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    return counts + [max_workers]
+
+
+def bench_threads(inp_path, runs, workers, total_threads, reference):
+    with ProjectThreads(workers, total_threads) as pool:
+        # Open one handle per worker first: the benchmark times solves, not EN_open
+        for f in [pool.submit(inp_path, lambda proj: None) for _ in range(workers)]:
+            f.result()
+        t0 = time.perf_counter()
+        results = pool.map([inp_path] * runs, fn=lambda proj: _copy(run_simulation(proj)))
+        elapsed = time.perf_counter() - t0
+        rss = _rss_mb()
+        shares = pool.shares
+    identical = all(np.array_equal(p, reference[0]) and np.array_equal(q, reference[1]) for p, q in results)
+    return elapsed, rss, shares, identical
+
+
+def _copy(res):
+    return res.pressures.copy(), res.flows.copy()
+
+
+def bench_processes(inp_path, runs, workers):
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        list(ex.map(_solve, [inp_path] * runs))
+    elapsed = time.perf_counter() - t0
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1e3
+    return elapsed, children
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("inp")
+    parser.add_argument("--runs", type=int, default=8, help="simulations per measurement")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=None, help="OpenMP threads to partition (default: cores)")
+    parser.add_argument("--processes", action="store_true", help="also time a process pool of the same size")
+    args = parser.parse_args()
+
+    print(f"Model: {args.inp}  runs: {args.runs}  cores: {os.cpu_count()}")
+    reference = _solve(args.inp)
+
+    base = None
+    print(f"{'workers':>7} {'omp/worker':>10} {'wall s':>8} {'runs/s':>8} {'speedup':>8} {'rss MB':>8}  identical")
+    for n in _worker_counts(args.max_workers):
+        elapsed, rss, shares, identical = bench_threads(args.inp, args.runs, n, args.threads, reference)
+        base = base or elapsed
+        omp = f"{min(shares)}-{max(shares)}" if min(shares) != max(shares) else str(shares[0])
+        print(f"{n:>7} {omp:>10} {elapsed:>8.3f} {args.runs / elapsed:>8.2f} {base / elapsed:>8.2f} "
+              f"{rss:>8.1f}  {'yes' if identical else 'NO'}")
+        if not identical:
+            print("❌ Concurrent results differ from the serial reference")
+            sys.exit(1)
+
+    if args.processes:
+        n = args.max_workers
+        elapsed, child_rss = bench_processes(args.inp, args.runs, n)
+        print(f"process pool ({n}): {elapsed:.3f} s, {args.runs / elapsed:.2f} runs/s, "
+              f"peak child RSS {child_rss:.1f} MB each (+ interpreter per worker)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Import-time budget check.
+
+Imports a module in fresh interpreters and fails when the median import
+time exceeds the budget, or when the import pulled in anything that must
+stay lazy: heavy libraries (polars, pandas, numpy, requests), the PyArmor
+runtime, the telemetry module or the kernel shared library.
+
+    python dev_tools/check_import_time.py                         # installed epanet_turbo
+    python dev_tools/check_import_time.py --budget-ms 50 --runs 9
+    python dev_tools/check_import_time.py --module turbo_kernel --path examples --allow numpy
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("polars", "pandas", "numpy", "requests", "pyarmor_runtime_000000")
+KERNEL_LIBRARIES = ("libepanet2", "epanet2.dll", "epanet2_openmp.dll")
+
+_CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+try:
+    with open("/proc/self/maps") as fh:
+        maps = fh.read()
+except OSError:
+    maps = ""
+# The disabled-telemetry stub has no file; only the real module counts
+telemetry = getattr(sys.modules.get("{module}.telemetry"), "__file__", None)
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules), "telemetry": telemetry, "maps": maps}}))
+"""
+
+
+def measure(module, path=None):
+    env = dict(os.environ, EPANET_TURBO_TELEMETRY="0")
+    if path:
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.abspath(path), env.get("PYTHONPATH")]))
+    out = subprocess.run([sys.executable, "-c", _CHILD.format(module=module)], env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def violations(sample, module, allowed):
+    found = []
+    loaded = set(sample["modules"])
+    for name in HEAVY_MODULES:
+        if name not in allowed and name in loaded:
+            found.append(f"imports {name}")
+    if sample["telemetry"] and "telemetry" not in allowed:
+        found.append("imports the telemetry module")
+    for lib in KERNEL_LIBRARIES:
+        if lib in sample["maps"]:
+            found.append(f"loads the kernel library ({lib})")
+            break
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default="epanet_turbo")
+    parser.add_argument("--path", default=None, help="prepend to PYTHONPATH (e.g. examples)")
+    parser.add_argument("--budget-ms", type=float, default=100.0)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--allow", nargs="*", default=[], help="modules the import may load")
+    args = parser.parse_args()
+
+    samples = [measure(args.module, args.path) for _ in range(args.runs)]
+    median_ms = statistics.median(s["seconds"] for s in samples) * 1e3
+    found = violations(samples[0], args.module, set(args.allow))
+
+    print(f"import {args.module}: median {median_ms:.1f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    for item in found:
+        print(f"❌ {item}")
+    if median_ms > args.budget_ms:
+        print("❌ Import-time budget exceeded")
+    if found or median_ms > args.budget_ms:
+        sys.exit(1)
+    print("✅ Import is lazy and within budget")
+
+
+if __name__ == "__main__":
+    main()
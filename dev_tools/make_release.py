@@ -1,3 +1,4 @@
+import ast
 import os
 import shutil
 import subprocess
@@ -13,6 +14,137 @@ BUILD_SRC_DIR = f"build_src_{int(time.time())}"
 OUTPUT_DIR = "epanet_turbo"
 RESOURCES_DIR = "resources"
 EXAMPLES_DIR = "examples"
+# The obfuscated package __init__ is shipped as this module and loaded on
+# first attribute access by the plain-text entry point below
+CORE_MODULE = "_core"
+
+# Plain-text (not obfuscated) package entry point. `import epanet_turbo`
+# then costs no PyArmor runtime, kernel library, polars/pandas/numpy or
+# telemetry; all of them load on first use of InpParser, simulate, ...
+LAZY_INIT = '''"""
+EPANET-Turbo
+============
+
+Lightweight entry point: the API (and with it the kernel library, Polars,
+pandas and NumPy) is imported on first attribute access, e.g. the first use
+of ``InpParser`` or ``simulate``.
+
+Telemetry is off unless ``EPANET_TURBO_TELEMETRY=1`` is set or
+``enable_telemetry()`` is called before the first API use.
+"""
+
+import importlib
+import os
+import sys
+import types
+
+__version__ = "{version}"
+
+_CORE = __name__ + ".{core}"
+_TELEMETRY = __name__ + ".telemetry"
+# Public API of telemetry.py, read from its source when the release was built
+_TELEMETRY_API = {telemetry}
+_telemetry_enabled = os.environ.get("EPANET_TURBO_TELEMETRY", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _noop(*args, **kwargs):
+    return None
+
+
+class _DisabledTelemetry(types.ModuleType):
+    """Stands in for the telemetry module: its functions and methods do nothing, its constants are None."""
+
+    def __init__(self, name):
+        super().__init__(name, self.__doc__)
+        for fname in _TELEMETRY_API["functions"]:
+            setattr(self, fname, _noop)
+        for cname, methods in _TELEMETRY_API["classes"].items():
+            setattr(self, cname, type(cname, (), dict.fromkeys(("__init__",) + tuple(methods), _noop)))
+        for vname in _TELEMETRY_API["values"]:
+            setattr(self, vname, None)
+        self.__all__ = sorted(n for n in vars(self) if not n.startswith("_"))
+
+
+def _stub_telemetry(install):
+    # Registered in sys.modules before any submodule can be imported, so
+    # neither _core nor a direct submodule import loads the real module
+    current = sys.modules.get(_TELEMETRY)
+    if install and current is None:
+        stub = sys.modules[_TELEMETRY] = _DisabledTelemetry(_TELEMETRY)
+        globals()["telemetry"] = stub
+    elif not install and isinstance(current, _DisabledTelemetry):
+        del sys.modules[_TELEMETRY]
+        globals().pop("telemetry", None)
+
+
+def enable_telemetry(enabled=True):
+    """Opt in to (or out of) usage telemetry; call before the first API use."""
+    global _telemetry_enabled
+    if _CORE in sys.modules:
+        raise RuntimeError("telemetry must be configured before the first use of epanet_turbo")
+    _telemetry_enabled = bool(enabled)
+    _stub_telemetry(not _telemetry_enabled)
+
+
+_stub_telemetry(not _telemetry_enabled)
+
+
+def _load_core():
+    core = sys.modules.get(_CORE)
+    if core is None:
+        core = importlib.import_module(_CORE)
+    return core
+
+
+def __getattr__(name):
+    if name.startswith("_"):
+        raise AttributeError(f"module {{__name__!r}} has no attribute {{name!r}}")
+    core = _load_core()
+    if not hasattr(core, name):
+        raise AttributeError(f"module {{__name__!r}} has no attribute {{name!r}}")
+    return getattr(core, name)
+
+
+def __dir__():
+    names = set(globals())
+    core = sys.modules.get(_CORE)
+    if core is not None:
+        names.update(n for n in dir(core) if not n.startswith("_"))
+    return sorted(names)
+'''
+
+def telemetry_api(path):
+    """
+    Public functions, classes (with their public methods) and constants of
+    telemetry.py, from its syntax tree; the disabled-telemetry stub of
+    LAZY_INIT defines exactly these names.
+    """
+    api = {"functions": [], "classes": {}, "values": []}
+    if not os.path.exists(path):
+        # An empty stub would break _core's `from .telemetry import ...`
+        print(f"\n❌ Build Failed: {path} not found, cannot build the telemetry stub")
+        sys.exit(1)
+    with open(path, encoding="utf-8-sig") as f:
+        tree = ast.parse(f.read(), path)
+    exported = None
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == "__all__" for t in node.targets):
+            exported = set(ast.literal_eval(node.value))
+
+    def public(name):
+        return not name.startswith("_") and (exported is None or name in exported)
+
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and public(node.name):
+            api["functions"].append(node.name)
+        elif isinstance(node, ast.ClassDef) and public(node.name):
+            api["classes"][node.name] = [item.name for item in node.body
+                                         if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))
+                                         and not item.name.startswith("_")]
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            api["values"].extend(t.id for t in targets if isinstance(t, ast.Name) and public(t.id))
+    return api
 
 def clean():
     print("🧹 Cleaning artifacts...")
@@ -59,10 +191,16 @@ def prepare_source():
                     with open(path, 'wb') as fp:
                         fp.write(content.lstrip(BOM))
                         
-    # 2. Inject Version
+    # 2. Move the package body to _core (loaded lazily, see LAZY_INIT) and
+    #    leave an empty __init__ so PyArmor still sees a package
     init_path = os.path.join(pkg_dir, "__init__.py")
-    with open(init_path, "a", encoding="utf-8") as f:
+    core_path = os.path.join(pkg_dir, f"{CORE_MODULE}.py")
+    if os.path.exists(init_path):
+        shutil.move(init_path, core_path)
+    with open(core_path, "a", encoding="utf-8") as f:
         f.write(f"\n__version__ = '{VERSION}'\n")
+    with open(init_path, "w", encoding="utf-8") as f:
+        f.write("")
 
     # 3. Clean any existing PyArmor artifacts in the COPIED source
     # This prevents PyArmor from hanging when it sees existing runtimes
@@ -107,6 +245,11 @@ def encrypt():
 
 def finalize_package():
     print("📦 Finalizing package structure...")
+
+    # 0. Plain-text lazy entry point (replaces the obfuscated placeholder)
+    with open(os.path.join(OUTPUT_DIR, "__init__.py"), "w", encoding="utf-8") as f:
+        f.write(LAZY_INIT.format(version=VERSION, core=CORE_MODULE,
+                                 telemetry=telemetry_api(os.path.join(SRC_DIR, "telemetry.py"))))
     
     # 1. Examples
     dest_examples = os.path.join(OUTPUT_DIR, "examples")
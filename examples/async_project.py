@@ -0,0 +1,152 @@
+"""
+EPANET-Turbo asyncio API
+========================
+
+Async wrapper around ``ResidentProject`` for asyncio services (digital
+twins, web backends). Every kernel call runs on a dedicated single-thread
+executor per project, so an EN_Project handle is only ever touched by one
+thread while the event loop stays free. ctypes releases the GIL for the
+duration of each foreign call, so several projects solve in parallel.
+
+Cancellation takes effect between hydraulic steps: a running kernel call
+always completes, after which the run stops and hydraulics are closed.
+
+Usage:
+------
+    import asyncio
+    from async_project import AsyncProject
+
+    async def main():
+        async with await AsyncProject.open("Net3.inp") as proj:
+            res = await proj.run_async(nodes=["10", "15"])
+
+            async for t, pressures, flows in proj.steps():
+                if pressures.min() < 0:
+                    break                     # hydraulics are closed on exit
+
+    asyncio.run(main())
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from . import turbo_kernel as tk
+    from .turbo_simulation import run_simulation
+except ImportError:
+    import turbo_kernel as tk
+    from turbo_simulation import run_simulation
+
+
+class AsyncProject:
+    def __init__(self, project, executor, owns_executor):
+        """Use ``await AsyncProject.open(...)``; the constructor expects an open project."""
+        self.project = project
+        self._executor = executor
+        self._owns_executor = owns_executor
+        self._busy = asyncio.Lock()
+
+    @classmethod
+    async def open(cls, inp_path, executor=None, openmp=True):
+        """
+        Open a model without blocking the event loop.
+
+        Parameters
+        ----------
+        inp_path : str
+        executor : concurrent.futures.Executor, optional
+            Executor for all kernel calls of this project. It must run jobs
+            one at a time in submission order (one worker thread). Default:
+            a new single-thread executor owned by the project.
+        """
+        owns = executor is None
+        if owns:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="epanet-turbo")
+        loop = asyncio.get_running_loop()
+        try:
+            project = await loop.run_in_executor(executor, lambda: tk.ResidentProject(inp_path, openmp=openmp))
+        except BaseException:
+            if owns:
+                executor.shutdown(wait=False)
+            raise
+        return cls(project, executor, owns)
+
+    async def call(self, fn, *args, **kwargs):
+        """Run ``fn(project, *args, **kwargs)`` on the project's executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(self.project, *args, **kwargs))
+
+    async def run_async(self, **kwargs):
+        """
+        ``run_simulation`` on the executor; keyword arguments are forwarded.
+
+        Cancelling the awaiting task stops the run at the next hydraulic step.
+        """
+        cancel = threading.Event()
+        loop = asyncio.get_running_loop()
+        async with self._busy:
+            future = loop.run_in_executor(self._executor,
+                                          lambda: run_simulation(self.project, cancel=cancel, **kwargs))
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                cancel.set()
+                # Let the worker reach the step boundary before handing the project on
+                await asyncio.wait([future])
+                if not future.cancelled():
+                    future.exception()
+                raise
+
+    async def steps(self, nodes=None, links=None, start=None, end=None, every=1, reporting_only=True):
+        """
+        Async generator of ``(t, pressures, flows)`` per step.
+
+        Wraps ``ResidentProject.iter_steps``: each step (solve + extraction)
+        is one executor job, and the yielded arrays are copies owned by the
+        consumer, since they cross the thread boundary.
+        """
+        async with self._busy:
+            loop = asyncio.get_running_loop()
+            gen = self.project.iter_steps(nodes, links, reporting_only, start, end, every)
+
+            def step():
+                item = next(gen, None)
+                if item is None:
+                    return None
+                t, pressures, flows = item
+                return t, pressures.copy(), flows.copy()
+
+            try:
+                while True:
+                    item = await loop.run_in_executor(self._executor, step)
+                    if item is None:
+                        break
+                    yield item
+            finally:
+                # Queued behind any running step on the single worker thread
+                self._executor.submit(gen.close)
+
+    async def close(self):
+        if self.project is None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.project.close)
+        self.project = None
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def __repr__(self):
+        return f"AsyncProject({self.project!r})"
+
+
+async def simulate_async(inp_path, executor=None, **kwargs):
+    """Open, run and close a model on an executor; returns the ``SimulationResult``."""
+    async with await AsyncProject.open(inp_path, executor=executor) as proj:
+        return await proj.run_async(**kwargs)
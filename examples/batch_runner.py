@@ -0,0 +1,390 @@
+"""
+EPANET-Turbo Batch Runner
+=========================
+
+Scenario batches (Monte Carlo, sensitivity sweeps) with a convergence
+policy instead of silent garbage:
+
+* Non-convergence is detected per step from the solver (``EN_runH``
+  warning ``EN_WARN_UNBALANCED``) and from NaNs in the extracted values.
+  A failing attempt is abandoned at the first bad step instead of running
+  the rest of the period.
+* Failed scenarios are retried along a deterministic ladder of solver
+  settings (warm start, damping, more trials, relaxed accuracy), so the
+  same scenario always takes the same path.
+* Every scenario ends with a status code (``STATUS_*``). Rows of scenarios
+  that did not converge are NaN *and* flagged; ``converged()`` returns
+  only the good ones.
+* ``time_budget`` caps the wall time per scenario (checked between
+  hydraulic steps; a running solve always completes).
+
+Usage:
+------
+    from batch_runner import run_batch, ConvergencePolicy
+    from turbo_kernel import EN_BASEDEMAND
+
+    scenarios = [{"name": f"mc_{i}", "node_values": {EN_BASEDEMAND: draws[i]}}
+                 for i in range(1000)]
+    res = run_batch("Net3.inp", scenarios, nodes=sensors,
+                    policy=ConvergencePolicy(time_budget=2.0), workers=4)
+
+    print(res.summary())        # {'ok': 961, 'retried': 35, 'unconverged': 3, 'timeout': 1, 'error': 0}
+    names, p, q = res.converged()
+"""
+
+import time
+
+import numpy as np
+
+try:
+    from . import turbo_kernel as tk
+    from .concurrent_projects import ProjectThreads
+    from .turbo_simulation import report_times, resolve_selection
+except ImportError:
+    import turbo_kernel as tk
+    from concurrent_projects import ProjectThreads
+    from turbo_simulation import report_times, resolve_selection
+
+STATUS_OK = 0           # converged on the first attempt
+STATUS_RETRIED = 1      # converged after one or more retries
+STATUS_UNCONVERGED = 2  # every attempt failed to converge
+STATUS_TIMEOUT = 3      # time budget exhausted
+STATUS_ERROR = 4        # kernel error (invalid input, ...)
+STATUS_NAMES = {STATUS_OK: "ok", STATUS_RETRIED: "retried", STATUS_UNCONVERGED: "unconverged",
+                STATUS_TIMEOUT: "timeout", STATUS_ERROR: "error"}
+# Largest ACCURACY the kernel accepts (EN_setoption error 213 above it);
+# caps relaxed attempts and the coarse warm-start solve
+COARSE_ACCURACY_MAX = 0.1
+
+
+class Attempt:
+    def __init__(self, name, trials_factor=1.0, accuracy_factor=1.0, damp_factor=None, warm_start=False):
+        """
+        One rung of the retry ladder, relative to the model's own options.
+
+        Parameters
+        ----------
+        trials_factor : float
+            Multiplies TRIALS (maximum iterations).
+        accuracy_factor : float
+            Multiplies ACCURACY (>1 relaxes the convergence criterion).
+        damp_factor : float, optional
+            Sets DAMPLIMIT to ``damp_factor * ACCURACY``: the solver damps
+            flow updates (relaxation 0.6) once the relative error is below
+            it, which settles oscillating valve/pump statuses.
+        warm_start : bool
+            Start from the flows of a coarse solve (accuracy x100) of the
+            scenario at its start time instead of the default initial flows.
+        """
+        self.name = name
+        self.trials_factor = trials_factor
+        self.accuracy_factor = accuracy_factor
+        self.damp_factor = damp_factor
+        self.warm_start = warm_start
+
+    def __repr__(self):
+        return f"Attempt({self.name!r})"
+
+
+DEFAULT_LADDER = (
+    Attempt("default"),
+    Attempt("warm_start", warm_start=True),
+    Attempt("damped", trials_factor=2.0, damp_factor=10.0, warm_start=True),
+    Attempt("relaxed", trials_factor=4.0, accuracy_factor=10.0, damp_factor=10.0, warm_start=True),
+)
+
+
+class ConvergencePolicy:
+    def __init__(self, attempts=DEFAULT_LADDER, time_budget=None, nan_is_failure=True):
+        """
+        Parameters
+        ----------
+        attempts : sequence of Attempt
+            Tried in order until one converges.
+        time_budget : float, optional
+            Wall-clock seconds per scenario over all attempts.
+        nan_is_failure : bool
+            Treat NaN/inf in the extracted values as non-convergence even
+            when the solver reported none.
+        """
+        if not attempts:
+            raise ValueError("a policy needs at least one attempt")
+        self.attempts = tuple(attempts)
+        self.time_budget = time_budget
+        self.nan_is_failure = nan_is_failure
+
+
+class BatchResult:
+    def __init__(self, names, times, pressures, flows, node_ids, link_ids, status, attempts,
+                 iterations, warnings, elapsed, errors, ladder):
+        """
+        Per-scenario results; ``pressures``/``flows`` are (S, T, N) / (S, T, M).
+
+        ``status`` (S,) holds ``STATUS_*`` codes, ``attempts`` (S,) the index
+        of the ladder rung that produced the values (-1: none), and
+        ``iterations`` (S,) the solver trials summed over the steps of that
+        run. Rows of failed scenarios are NaN.
+        """
+        self.names = names
+        self.times = times
+        self.pressures = pressures
+        self.flows = flows
+        self.node_ids = node_ids
+        self.link_ids = link_ids
+        self.status = status
+        self.attempts = attempts
+        self.iterations = iterations
+        self.warnings = warnings
+        self.elapsed = elapsed
+        self.errors = errors
+        self.ladder = ladder
+
+    @property
+    def ok(self):
+        """Mask of scenarios with valid results (converged, possibly after retries)."""
+        return self.status <= STATUS_RETRIED
+
+    def summary(self):
+        return {name: int(np.count_nonzero(self.status == code)) for code, name in STATUS_NAMES.items()}
+
+    def converged(self):
+        """``(names, pressures, flows)`` of the valid scenarios only."""
+        mask = self.ok
+        return [n for n, m in zip(self.names, mask) if m], self.pressures[mask], self.flows[mask]
+
+    def failed(self):
+        """Names of the scenarios without valid results, with their status name."""
+        return {n: STATUS_NAMES[int(s)] for n, s in zip(self.names, self.status) if s > STATUS_RETRIED}
+
+    def status_frame(self):
+        """Polars frame: name, status, attempt, iterations, warning, seconds, error."""
+        import polars as pl
+        return pl.DataFrame({
+            "name": self.names,
+            "status": [STATUS_NAMES[int(s)] for s in self.status],
+            "attempt": [self.ladder[a].name if a >= 0 else None for a in self.attempts],
+            "iterations": self.iterations,
+            "warning": self.warnings,
+            "seconds": self.elapsed,
+            "error": self.errors,
+        })
+
+    def __repr__(self):
+        counts = ", ".join(f"{k}={v}" for k, v in self.summary().items() if v)
+        return f"BatchResult(scenarios={len(self.names)}, {counts})"
+
+
+class _Failed(Exception):
+    def __init__(self, status, error=None):
+        self.status = status
+        self.error = error
+
+
+def _apply(proj, scenario, undo):
+    # Appends to ``undo`` as it goes, so a partly applied scenario is undone too
+    for kind, key in (("node", "node_values"), ("link", "link_values")):
+        for prop, values in (scenario.get(key) or {}).items():
+            if isinstance(values, dict):
+                lookup = proj.node_index if kind == "node" else proj.link_index
+                idx, vals = lookup(list(values)), list(values.values())
+            else:
+                idx, vals = values
+                idx = np.ascontiguousarray(idx, dtype=np.int32)
+            getter = proj.get_node_values if kind == "node" else proj.get_link_values
+            setter = proj.set_node_values if kind == "node" else proj.set_link_values
+            undo.append((setter, idx, prop, getter(prop, indices=idx).copy()))
+            setter(idx, prop, vals)
+    options = dict(scenario.get("options") or {})
+    if "demand_multiplier" in scenario:
+        options[tk.EN_DEMANDMULT] = scenario["demand_multiplier"]
+    for option, value in options.items():
+        undo.append((None, None, option, proj.get_option(option)))
+        proj.set_option(option, value)
+    if scenario.get("controls") is not None or scenario.get("rules") is not None:
+        # Polars is only needed by scenarios that carry control tables
+        try:
+            from .control_builder import add_controls, add_rules
+        except ImportError:
+            from control_builder import add_controls, add_rules
+        undo.append((proj.truncate_controls, None, None,
+                     (proj.count(tk.EN_CONTROLCOUNT), proj.count(tk.EN_RULECOUNT))))
+        if scenario.get("controls") is not None:
+            add_controls(proj, scenario["controls"])
+        if scenario.get("rules") is not None:
+            add_rules(proj, scenario["rules"])
+
+
+def _undo(proj, undo):
+    for setter, idx, prop, old in reversed(undo):
+        if setter is None:
+            proj.set_option(prop, old)
+        elif idx is None:
+            setter(*old)
+        else:
+            setter(idx, prop, old)
+
+
+def _set_attempt(proj, attempt, base):
+    trials, accuracy, damp = base
+    accuracy = min(accuracy * attempt.accuracy_factor, COARSE_ACCURACY_MAX)
+    proj.set_option(tk.EN_TRIALS, max(int(round(trials * attempt.trials_factor)), 1))
+    proj.set_option(tk.EN_ACCURACY, accuracy)
+    proj.set_option(tk.EN_DAMPLIMIT, damp if attempt.damp_factor is None else accuracy * attempt.damp_factor)
+
+
+def _warm_start(proj, attempt, base):
+    # Coarse solve of the start time, then restart the clock keeping its flows
+    trials, accuracy, _ = base
+    proj.set_option(tk.EN_ACCURACY, min(accuracy * attempt.accuracy_factor * 100.0, COARSE_ACCURACY_MAX))
+    proj.set_option(tk.EN_TRIALS, max(int(round(trials * attempt.trials_factor)), 1))
+    proj.init_hydraulics(tk.EN_INITFLOW)
+    proj.run_step()
+    _set_attempt(proj, attempt, base)
+    proj.init_hydraulics(tk.EN_NOSAVE)
+
+
+def _run_attempt(proj, attempt, base, times, node_idx, link_idx, p_out, q_out, deadline, nan_is_failure):
+    # Fills p_out/q_out; returns (iterations, worst warning) or raises _Failed
+    iterations = 0
+    warning = 0
+    k = 0
+    try:
+        if attempt.warm_start:
+            _warm_start(proj, attempt, base)
+        else:
+            _set_attempt(proj, attempt, base)
+            proj.init_hydraulics(tk.EN_INITFLOW)
+        while k < len(times):
+            if deadline is not None and time.perf_counter() > deadline:
+                raise _Failed(STATUS_TIMEOUT)
+            t = proj.run_step()
+            iterations += int(proj.get_statistic(tk.EN_ITERATIONS))
+            if proj.last_warning == tk.EN_WARN_UNBALANCED:
+                raise _Failed(STATUS_UNCONVERGED)
+            warning = max(warning, proj.last_warning)
+            if t == times[k]:
+                proj.get_node_values(tk.EN_PRESSURE, out=p_out[k], indices=node_idx)
+                proj.get_link_values(tk.EN_FLOW, out=q_out[k], indices=link_idx)
+                if nan_is_failure and not (np.isfinite(p_out[k]).all() and np.isfinite(q_out[k]).all()):
+                    raise _Failed(STATUS_UNCONVERGED)
+                k += 1
+            if proj.next_step() <= 0:
+                break
+    except tk.EPANETError as e:
+        # Solver errors (e.g. 110, cannot solve the equations) fail this
+        # attempt only; the next one relaxes the settings
+        raise _Failed(STATUS_UNCONVERGED, f"{type(e).__name__}: {e}") from e
+    finally:
+        proj.close_hydraulics()
+    if k < len(times):
+        # The solver halted before the end of the period
+        raise _Failed(STATUS_UNCONVERGED)
+    return iterations, warning
+
+
+def run_scenario(proj, scenario, policy, times, node_idx, link_idx, p_out, q_out):
+    """
+    Run one scenario on an open project under ``policy``.
+
+    Writes (T, n) rows into ``p_out``/``q_out`` (NaN unless the status is OK
+    or RETRIED) and returns ``(status, attempt, iterations, warning, seconds,
+    error)``. The project is left as it was.
+    """
+    t0 = time.perf_counter()
+    deadline = None if policy.time_budget is None else t0 + policy.time_budget
+    status, used, iterations, warning, error = STATUS_UNCONVERGED, -1, 0, 0, None
+    undo = []
+    try:
+        _apply(proj, scenario, undo)
+        base = (proj.get_option(tk.EN_TRIALS), proj.get_option(tk.EN_ACCURACY), proj.get_option(tk.EN_DAMPLIMIT))
+        try:
+            for a, attempt in enumerate(policy.attempts):
+                try:
+                    iterations, warning = _run_attempt(proj, attempt, base, times, node_idx, link_idx,
+                                                       p_out, q_out, deadline, policy.nan_is_failure)
+                except _Failed as failure:
+                    status, error = failure.status, failure.error
+                    if status == STATUS_TIMEOUT:
+                        break
+                    continue
+                status, used, error = (STATUS_OK if a == 0 else STATUS_RETRIED), a, None
+                break
+        finally:
+            proj.set_option(tk.EN_TRIALS, base[0])
+            proj.set_option(tk.EN_ACCURACY, base[1])
+            proj.set_option(tk.EN_DAMPLIMIT, base[2])
+    except (tk.EPANETError, KeyError, IndexError, ValueError) as e:
+        # Kernel errors and invalid scenario input (unknown IDs, bad shapes)
+        status, error = STATUS_ERROR, f"{type(e).__name__}: {e}"
+    finally:
+        _undo(proj, undo)
+    if status > STATUS_RETRIED:
+        p_out.fill(np.nan)
+        q_out.fill(np.nan)
+    return status, used, iterations, warning, time.perf_counter() - t0, error
+
+
+def run_batch(model, scenarios, policy=None, nodes=None, links=None, start=None, end=None, every=1,
+              workers=None, openmp=True):
+    """
+    Run hydraulic scenarios under a convergence policy.
+
+    Parameters
+    ----------
+    model : str or ResidentProject
+        INP path, or an open project (then run sequentially on it).
+    scenarios : list of dict
+        Keys (all optional): ``name``; ``node_values`` / ``link_values`` as
+        ``{property: {id: value}}`` or ``{property: (indices, values)}``
+        with 1-based kernel indices; ``demand_multiplier``; ``options``
+        ``{EN_option: value}``; ``controls`` / ``rules`` tables (see
+        ``control_builder``). Changes are undone after every scenario.
+    policy : ConvergencePolicy, optional
+        Retry ladder and time budget (default: ``ConvergencePolicy()``).
+    nodes, links, start, end, every
+        Recorded elements and reporting window, see ``run_simulation``.
+    workers : int, optional
+        Run on this many threads, each with its own project handle
+        (``concurrent_projects.ProjectThreads``).
+
+    Returns
+    -------
+    BatchResult
+    """
+    policy = policy or ConvergencePolicy()
+    scenarios = list(scenarios)
+    names = [sc.get("name", f"scenario_{i}") for i, sc in enumerate(scenarios)]
+    owned = not isinstance(model, tk.ResidentProject)
+    proj = tk.ResidentProject(model, openmp=openmp) if owned else model
+    try:
+        times = report_times(proj, start, end, every)
+        node_idx, node_ids = resolve_selection(proj, nodes, "node")
+        link_idx, link_ids = resolve_selection(proj, links, "link")
+        n = len(scenarios)
+        pressures = np.empty((n, len(times), len(node_ids)))
+        flows = np.empty((n, len(times), len(link_ids)))
+        rows = [None] * n
+
+        if workers and workers > 1 and owned:
+            with ProjectThreads(workers, openmp=openmp) as pool:
+                futures = [pool.submit(proj.inp_path, run_scenario, sc, policy, times, node_idx, link_idx,
+                                       pressures[i], flows[i]) for i, sc in enumerate(scenarios)]
+                rows = [f.result() for f in futures]
+        else:
+            for i, sc in enumerate(scenarios):
+                rows[i] = run_scenario(proj, sc, policy, times, node_idx, link_idx, pressures[i], flows[i])
+    finally:
+        if owned:
+            proj.close()
+
+    status, used, iterations, warnings, elapsed, errors = zip(*rows) if rows else ([],) * 6
+    return BatchResult(
+        names, times, pressures, flows, node_ids, link_ids,
+        status=np.array(status, dtype=np.int8),
+        attempts=np.array(used, dtype=np.int8),
+        iterations=np.array(iterations, dtype=np.int32),
+        warnings=np.array(warnings, dtype=np.int16),
+        elapsed=np.array(elapsed, dtype=np.float64),
+        errors=list(errors),
+        ladder=policy.attempts,
+    )
@@ -0,0 +1,161 @@
+"""
+EPANET-Turbo Concurrent Projects
+================================
+
+Thread-safe mode for running several models (or several scenarios of one
+model) in one process instead of a process pool.
+
+Thread-safety contract:
+
+* Every worker thread owns its ``ResidentProject`` handles; a handle is
+  never touched by two threads. Independent EN_Project handles share no
+  mutable kernel state (the only writable globals of the kernel are the
+  legacy default project and constant keyword tables).
+* ctypes releases the GIL for the duration of each kernel call, so the
+  solves of different threads overlap; only the Python glue between calls
+  is serialised.
+* ``ENT_set_num_threads`` sets the OpenMP team size of the *calling* thread,
+  so the cores are partitioned between workers (``partition_threads``)
+  instead of every project spawning a full-size team.
+
+``dev_tools/bench_concurrent_projects.py`` measures the scaling and checks
+that concurrent results are bit-identical to serial runs.
+
+Usage:
+------
+    from concurrent_projects import ProjectThreads, run_concurrent
+
+    # One result per job, in job order (default job: run_simulation)
+    results = run_concurrent(["dma_01.inp", "dma_02.inp", "dma_03.inp"], workers=3)
+
+    # Long-lived workers; each keeps its handles open between jobs
+    with ProjectThreads(workers=4) as pool:
+        futures = [pool.submit("Net3.inp", run_simulation, nodes=sensors)
+                   for _ in range(16)]
+        results = [f.result() for f in futures]
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from . import turbo_kernel as tk
+    from .turbo_simulation import run_simulation
+except ImportError:
+    import turbo_kernel as tk
+    from turbo_simulation import run_simulation
+
+
+def partition_threads(n_workers, total=None):
+    """
+    Split ``total`` OpenMP threads (default: all cores) between workers.
+
+    Every worker gets at least one thread; the remainder goes to the first
+    workers.
+    """
+    if n_workers < 1:
+        raise ValueError("n_workers must be >= 1")
+    total = total or os.cpu_count() or 1
+    base, extra = divmod(total, n_workers)
+    return [max(1, base + (1 if i < extra else 0)) for i in range(n_workers)]
+
+
+class ProjectThreads:
+    def __init__(self, workers=None, total_threads=None, openmp=True):
+        """
+        Worker threads that each drive their own resident projects.
+
+        Parameters
+        ----------
+        workers : int, optional
+            Number of threads (default: number of cores).
+        total_threads : int, optional
+            OpenMP threads shared out between the workers (default: number
+            of cores), see ``partition_threads``.
+        openmp : bool
+            Kernel flavour passed to ``ResidentProject``.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.openmp = openmp
+        self.shares = partition_threads(self.workers, total_threads)
+        self._lock = threading.Lock()
+        self._free_shares = list(self.shares)
+        self._local = threading.local()
+        self._projects = []
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="epanet-turbo",
+                                            initializer=self._init_worker)
+
+    def _init_worker(self):
+        with self._lock:
+            self._local.num_threads = self._free_shares.pop() if self._free_shares else 1
+        self._local.projects = {}
+        tk.set_num_threads(self._local.num_threads, self.openmp)
+
+    def _project(self, inp_path):
+        # Open-Once per worker thread; changes of the previous job are undone
+        key = os.path.realpath(inp_path)
+        proj = self._local.projects.get(key)
+        if proj is None:
+            proj = tk.ResidentProject(inp_path, openmp=self.openmp, track_changes=True,
+                                      num_threads=self._local.num_threads)
+            self._local.projects[key] = proj
+            with self._lock:
+                self._projects.append(proj)
+        else:
+            proj.reset()
+        return proj
+
+    def _run(self, inp_path, fn, args, kwargs):
+        return fn(self._project(inp_path), *args, **kwargs)
+
+    def submit(self, inp_path, fn=run_simulation, *args, **kwargs):
+        """
+        Run ``fn(project, *args, **kwargs)`` on a worker; returns a Future.
+
+        ``project`` is the calling worker's own handle for ``inp_path``;
+        it must not escape ``fn`` (results holding views of its buffers
+        are fine, ``run_simulation`` results own their arrays).
+        """
+        return self._executor.submit(self._run, inp_path, fn, args, kwargs)
+
+    def map(self, jobs, fn=run_simulation):
+        """
+        Results of ``fn`` for each job, in job order.
+
+        A job is an INP path or an ``(inp_path, kwargs)`` pair.
+        """
+        futures = []
+        for job in jobs:
+            inp_path, kwargs = (job, {}) if isinstance(job, (str, os.PathLike)) else job
+            futures.append(self.submit(inp_path, fn, **kwargs))
+        return [f.result() for f in futures]
+
+    def close(self):
+        """Wait for running jobs, then close every handle."""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            projects, self._projects = self._projects, []
+        for proj in projects:
+            proj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f"ProjectThreads(workers={self.workers}, omp_threads={self.shares})"
+
+
+def run_concurrent(jobs, fn=run_simulation, workers=None, total_threads=None, openmp=True):
+    """
+    Run jobs on ``workers`` threads with partitioned OpenMP threads.
+
+    See ``ProjectThreads.map`` for the job format; handles are closed on return.
+    """
+    jobs = list(jobs)
+    workers = workers or min(len(jobs), os.cpu_count() or 1) or 1
+    with ProjectThreads(workers, total_threads, openmp) as pool:
+        return pool.map(jobs, fn)
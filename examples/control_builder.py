@@ -0,0 +1,238 @@
+"""
+EPANET-Turbo Control Builder
+============================
+
+Installs simple controls and rule-based controls from tables, for
+optimisation studies that try thousands of operating strategies per run
+instead of regenerating INP text for every candidate.
+
+* Controls: one row per control with columns ``link``, ``type``,
+  ``setting`` and, depending on the type, ``node`` + ``level`` or
+  ``time``. IDs are resolved with one join per column, the rows are
+  checked as a whole and then added in a single tight loop over
+  ``EN_addcontrol`` (about 5 µs per control).
+* Rules: one row per clause (``rule``, ``clause``, ``object``, ``id``,
+  ``attribute``, ``relation``, ``value``), rendered to rule text with
+  Polars string expressions and added through ``EN_addrule``.
+
+Rules added this way are parsed by the same kernel rule parser as the
+``[RULES]`` section, so the v2.1 state-driven rule engine tracks their
+dependencies too (the dependency sets are built when a rule is compiled).
+
+Usage:
+------
+    import polars as pl
+    from control_builder import add_controls, add_rules, installed
+
+    controls = pl.DataFrame({
+        "link": ["10", "10", "335"],
+        "type": ["TIMER", "TIMER", "LOWLEVEL"],
+        "time": [0, 6 * 3600, None],
+        "node": [None, None, "1"],
+        "level": [None, None, 5.0],
+        "setting": ["OPEN", "CLOSED", "OPEN"],
+    })
+    rules = pl.DataFrame({
+        "rule":      ["R1", "R1", "R1"],
+        "clause":    ["IF", "THEN", "PRIORITY"],
+        "object":    ["TANK", "VALVE", None],
+        "id":        ["1", "V1", None],
+        "attribute": ["LEVEL", "SETTING", None],
+        "relation":  [">", None, None],
+        "value":     ["6.5", "40", "2"],
+    })
+
+    with installed(proj, controls=controls, rules=rules):   # removed again on exit
+        res = run_simulation(proj, nodes=sensors)
+"""
+
+from contextlib import contextmanager
+
+import numpy as np
+import polars as pl
+
+try:
+    from .turbo_kernel import (EN_CONTROLCOUNT, EN_CVPIPE, EN_GPV, EN_HILEVEL, EN_LOWLEVEL, EN_PIPE, EN_PUMP,
+                               EN_RULECOUNT, EN_TIMEOFDAY, EN_TIMER)
+except ImportError:
+    from turbo_kernel import (EN_CONTROLCOUNT, EN_CVPIPE, EN_GPV, EN_HILEVEL, EN_LOWLEVEL, EN_PIPE, EN_PUMP,
+                              EN_RULECOUNT, EN_TIMEOFDAY, EN_TIMER)
+
+# Control type names (INP keywords and EN_ControlType names)
+CONTROL_TYPES = {
+    "LOWLEVEL": EN_LOWLEVEL, "BELOW": EN_LOWLEVEL,
+    "HILEVEL": EN_HILEVEL, "ABOVE": EN_HILEVEL,
+    "TIMER": EN_TIMER, "TIME": EN_TIMER,
+    "TIMEOFDAY": EN_TIMEOFDAY, "CLOCKTIME": EN_TIMEOFDAY,
+}
+# Status keywords accepted in the ``setting`` column
+SETTING_KEYWORDS = {"OPEN": 1.0, "CLOSED": 0.0}
+# Link types whose control setting 1 / 0 means OPEN / CLOSED: pipes, pumps
+# and GPVs. PRV/PSV/PBV/FCV/TCV would read it as a pressure, flow or loss
+# setting.
+STATUS_LINK_TYPES = (EN_CVPIPE, EN_PIPE, EN_PUMP, EN_GPV)
+
+CONTROL_COLUMNS = ("link", "type", "setting", "node", "level", "time")
+RULE_COLUMNS = ("rule", "clause", "object", "id", "attribute", "relation", "value")
+RULE_CLAUSES = ("IF", "AND", "OR", "THEN", "ELSE", "PRIORITY")
+
+
+def _frame(table, columns):
+    # Polars DataFrame, dict of columns or NumPy structured array
+    if isinstance(table, np.ndarray):
+        table = {name: table[name] for name in table.dtype.names}
+    df = table if isinstance(table, pl.DataFrame) else pl.DataFrame(table)
+    unknown = set(df.columns) - set(columns)
+    if unknown:
+        raise ValueError(f"unknown columns {sorted(unknown)}; expected some of {list(columns)}")
+    return df
+
+
+def _indices(column, ids, kind):
+    """1-based kernel indices for a column of IDs (or of indices already)."""
+    if column.dtype.is_integer():
+        return column.fill_null(0).to_numpy().astype(np.int32)
+    lookup = pl.DataFrame({"key": ids, "index": np.arange(1, len(ids) + 1, dtype=np.int32)})
+    keys = pl.DataFrame({"key": column.cast(pl.Utf8)})
+    found = keys.join(lookup, on="key", how="left", maintain_order="left")
+    missing = found.filter(pl.col("key").is_not_null() & pl.col("index").is_null())
+    if missing.height:
+        raise KeyError(f"unknown {kind} ID {missing['key'][0]!r} ({missing.height} unknown)")
+    return found["index"].fill_null(0).to_numpy().astype(np.int32)
+
+
+def _codes(column, names, what):
+    if column.dtype.is_integer():
+        return column.to_numpy()
+    upper = column.cast(pl.Utf8).str.strip_chars().str.to_uppercase()
+    codes = upper.replace_strict(names, default=None, return_dtype=pl.Float64)
+    bad = upper.filter(codes.is_null() & upper.is_not_null())
+    if bad.len():
+        raise ValueError(f"unknown {what} {bad[0]!r}")
+    return codes.to_numpy()
+
+
+def control_arrays(proj, table):
+    """
+    Resolve a control table to the arrays of ``ResidentProject.add_controls``.
+
+    Parameters
+    ----------
+    proj : ResidentProject
+    table : DataFrame, dict or structured array
+        Columns ``link`` (ID or 1-based index), ``type`` (name, see
+        ``CONTROL_TYPES``, or ``EN_*`` code), ``setting`` (number, or
+        OPEN/CLOSED for pipes, pumps and GPVs); ``node`` (ID or index) and ``level`` (pressure or
+        tank level) for level controls; ``time`` (seconds, elapsed for
+        TIMER, of the day for TIMEOFDAY) for time controls.
+
+    Returns
+    -------
+    tuple of ndarray
+        ``(types, links, settings, nodes, levels)``.
+    """
+    df = _frame(table, CONTROL_COLUMNS)
+    for name in ("link", "type", "setting"):
+        if name not in df.columns:
+            raise ValueError(f"control table needs a {name!r} column")
+    n = df.height
+    types = _codes(df["type"], CONTROL_TYPES, "control type").astype(np.int32)
+    links = _indices(df["link"], proj.link_ids, "link")
+    settings = df["setting"]
+    is_keyword = np.zeros(n, dtype=bool)
+    if settings.dtype == pl.Utf8:
+        numeric = settings.str.strip_chars().cast(pl.Float64, strict=False)
+        keyword = settings.str.strip_chars().str.to_uppercase().replace_strict(
+            SETTING_KEYWORDS, default=None, return_dtype=pl.Float64)
+        is_keyword = (numeric.is_null() & keyword.is_not_null()).to_numpy()
+        settings = numeric.fill_null(keyword)
+    settings = settings.cast(pl.Float64).to_numpy()
+    if is_keyword.any():
+        valve = np.zeros(n, dtype=bool)
+        valid = is_keyword & (links > 0) & (links <= proj.num_links)
+        valve[valid] = ~np.isin(proj.link_types(links[valid]), STATUS_LINK_TYPES)
+        if valve.any():
+            row = int(np.argmax(valve))
+            raise ValueError(f"control row {row} sets valve {proj.link_ids[links[row] - 1]!r} "
+                             f"{df['setting'][row].strip().upper()}; PRV/PSV/PBV/FCV/TCV controls need a "
+                             f"numeric setting ({int(valve.sum())} rows)")
+
+    is_level = (types == EN_LOWLEVEL) | (types == EN_HILEVEL)
+    nodes = _indices(df["node"], proj.node_ids, "node") if "node" in df.columns else np.zeros(n, np.int32)
+    level = df["level"].cast(pl.Float64).to_numpy() if "level" in df.columns else np.full(n, np.nan)
+    when = df["time"].cast(pl.Float64).to_numpy() if "time" in df.columns else np.full(n, np.nan)
+    levels = np.where(is_level, level, when)
+    nodes[~is_level] = 0
+
+    problems = (("no valid type", (types < EN_LOWLEVEL) | (types > EN_TIMEOFDAY)),
+                ("no setting", np.isnan(settings)),
+                ("a level control without a node", is_level & (nodes == 0)),
+                ("a control without its level / time", np.isnan(levels)))
+    for message, bad in problems:
+        if bad.any():
+            raise ValueError(f"control row {int(np.argmax(bad))} has {message} ({int(bad.sum())} rows)")
+    return types, links, settings, nodes, levels
+
+
+def add_controls(proj, table):
+    """Add every control of ``table`` (see ``control_arrays``); returns their 1-based indices."""
+    return proj.add_controls(*control_arrays(proj, table))
+
+
+def rule_texts(table):
+    """
+    Render a clause table to one rule text per rule, in first-seen order.
+
+    Each row is one clause: ``clause`` is IF/AND/OR/THEN/ELSE/PRIORITY;
+    ``object`` NODE/TANK/JUNCTION/LINK/PIPE/PUMP/VALVE/SYSTEM; ``id``
+    (empty for SYSTEM); ``attribute`` LEVEL/PRESSURE/STATUS/SETTING/
+    CLOCKTIME/...; ``relation`` (default ``IS`` for OPEN/CLOSED/ACTIVE
+    values, ``=`` otherwise); ``value``. PRIORITY rows only use ``value``.
+    """
+    df = _frame(table, RULE_COLUMNS)
+    for name in ("rule", "clause", "value"):
+        if name not in df.columns:
+            raise ValueError(f"rule table needs a {name!r} column")
+    text = {name: (pl.col(name).cast(pl.Utf8).str.strip_chars() if name in df.columns
+                   else pl.lit(None, dtype=pl.Utf8)) for name in RULE_COLUMNS}
+    clause = text["clause"].str.to_uppercase()
+    status = text["value"].str.to_uppercase().is_in(["OPEN", "CLOSED", "ACTIVE"])
+    relation = text["relation"].fill_null(pl.when(status).then(pl.lit("IS")).otherwise(pl.lit("=")))
+    line = (pl.when(clause == "PRIORITY")
+            .then(pl.concat_str([clause, text["value"]], separator=" "))
+            .otherwise(pl.concat_str([clause, text["object"], text["id"], text["attribute"], relation,
+                                      text["value"]], separator=" ", ignore_nulls=True)))
+    lines = df.select(text["rule"].alias("rule"), clause.alias("clause"), line.alias("line"))
+
+    bad = lines.filter(~pl.col("clause").is_in(RULE_CLAUSES) | pl.col("clause").is_null())
+    if bad.height:
+        raise ValueError(f"rule {bad['rule'][0]!r}: unknown clause {bad['clause'][0]!r}")
+    rules = (lines.group_by("rule", maintain_order=True)
+             .agg(pl.col("line").str.join("\n"))
+             .select(pl.concat_str([pl.lit("RULE "), pl.col("rule"), pl.lit("\n"), pl.col("line")])))
+    return rules.to_series().to_list()
+
+
+def add_rules(proj, rules):
+    """
+    Add rule-based controls; ``rules`` is a clause table (see ``rule_texts``)
+    or a list of rule texts. Returns their 1-based indices.
+    """
+    if not isinstance(rules, (list, tuple)):
+        rules = rule_texts(rules)
+    return proj.add_rules(rules)
+
+
+@contextmanager
+def installed(proj, controls=None, rules=None):
+    """
+    Add controls and rules for the duration of a ``with`` block, then
+    delete them again; yields ``(control_indices, rule_indices)``.
+    """
+    n_controls, n_rules = proj.count(EN_CONTROLCOUNT), proj.count(EN_RULECOUNT)
+    try:
+        control_idx = add_controls(proj, controls) if controls is not None else np.zeros(0, np.int32)
+        rule_idx = add_rules(proj, rules) if rules is not None else np.zeros(0, np.int32)
+        yield control_idx, rule_idx
+    finally:
+        proj.truncate_controls(n_controls=n_controls, n_rules=n_rules)
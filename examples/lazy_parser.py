@@ -0,0 +1,551 @@
+"""
+EPANET-Turbo Lazy Section Parser
+================================
+
+Table access to an INP file where every section is parsed on first use
+and only for the columns that are actually requested.
+
+``InpParser`` materialises every section (coordinates, vertices, labels,
+curves, ...) up front. Services that only need a few columns of
+``junctions`` and ``pipes`` can use ``LazyInpParser`` instead: opening a
+file only indexes the byte offsets of its ``[SECTION]`` headers, and each
+table is tokenised with Polars when it is first queried. Memory then scales
+with what is queried, not with the size of the model.
+
+Usage:
+------
+    from lazy_parser import LazyInpParser
+
+    model = LazyInpParser("Net3.inp")
+
+    # Full table, parsed on first access and cached
+    pipes = model.pipes
+
+    # Column projection: only 'id' and 'elevation' are extracted
+    elev = model.table("junctions", columns=["id", "elevation"])
+
+    # LazyFrame for further query planning
+    lf = model.scan("pipes", columns=["id", "diameter"])
+    big = lf.filter(pl.col("diameter") > 300).collect()
+
+    # Edit a table and write the model back (untouched sections are copied)
+    model.set_table("pipes", pipes.with_columns(pl.col("roughness") * 0.9))
+    model.write_inp("Net3_aged.inp")
+
+    # Huge networks: Float32 values and Categorical IDs, tables dropped
+    # once the kernel has the model
+    model = LazyInpParser("city.inp", compact=True)
+    elev = model.table("junctions", ["id", "elevation"])
+    proj = ResidentProject("city.inp")
+    model.clear_cache()
+"""
+
+import io
+import mmap
+import os
+import re
+
+import polars as pl
+
+# Column layout of every tabular section, in INP token order.
+# Sections not listed here are kept as raw text lines (column 'line').
+SECTION_SCHEMAS = {
+    "JUNCTIONS": ("id", "elevation", "demand", "pattern"),
+    "RESERVOIRS": ("id", "head", "pattern"),
+    "TANKS": ("id", "elevation", "init_level", "min_level", "max_level",
+              "diameter", "min_vol", "vol_curve", "overflow"),
+    "PIPES": ("id", "node1", "node2", "length", "diameter", "roughness",
+              "minor_loss", "status"),
+    "PUMPS": ("id", "node1", "node2", "parameters"),
+    "VALVES": ("id", "node1", "node2", "diameter", "type", "setting",
+               "minor_loss", "curve"),
+    "DEMANDS": ("id", "demand", "pattern"),
+    "EMITTERS": ("id", "coefficient"),
+    "STATUS": ("id", "status"),
+    "PATTERNS": ("id", "multiplier"),
+    "CURVES": ("id", "x", "y"),
+    "QUALITY": ("id", "init_qual"),
+    "SOURCES": ("id", "type", "strength", "pattern"),
+    "MIXING": ("id", "model", "fraction"),
+    "TAGS": ("object", "id", "tag"),
+    "COORDINATES": ("id", "x", "y"),
+    "VERTICES": ("id", "x", "y"),
+    "LABELS": ("x", "y", "label", "anchor"),
+}
+
+# Columns holding text; every other schema column is parsed as Float64.
+STRING_COLUMNS = frozenset({
+    "id", "node1", "node2", "pattern", "vol_curve", "overflow", "status",
+    "parameters", "type", "curve", "model", "object", "tag", "label",
+    "anchor", "line",
+})
+
+# Text columns that reference IDs or keywords; Categorical in compact mode
+# (one shared dictionary instead of a string per row).
+CATEGORICAL_COLUMNS = frozenset({
+    "id", "node1", "node2", "pattern", "vol_curve", "overflow", "status",
+    "type", "curve", "model", "object",
+})
+
+# Sections whose numbers stay Float64 in compact mode: projected map
+# coordinates need more than float32's 7 significant digits
+COORDINATE_SECTIONS = frozenset({"COORDINATES", "VERTICES", "LABELS"})
+
+# Columns that swallow the rest of the line (pump keyword/value lists).
+REST_COLUMNS = {"PUMPS": "parameters"}
+
+# Property name -> INP section, mirroring the InpParser attributes.
+TABLE_SECTIONS = {
+    "junctions": "JUNCTIONS",
+    "reservoirs": "RESERVOIRS",
+    "tanks": "TANKS",
+    "pipes": "PIPES",
+    "pumps": "PUMPS",
+    "valves": "VALVES",
+    "demands": "DEMANDS",
+    "emitters": "EMITTERS",
+    "status": "STATUS",
+    "patterns": "PATTERNS",
+    "curves": "CURVES",
+    "controls": "CONTROLS",
+    "rules": "RULES",
+    "quality": "QUALITY",
+    "sources": "SOURCES",
+    "mixing": "MIXING",
+    "coordinates": "COORDINATES",
+    "vertices": "VERTICES",
+    "labels": "LABELS",
+    "options": "OPTIONS",
+    "times": "TIMES",
+}
+
+NODE_SECTIONS = ("JUNCTIONS", "RESERVOIRS", "TANKS")
+LINK_SECTIONS = ("PIPES", "PUMPS", "VALVES")
+
+# Sections whose text fields may be quoted and contain blanks
+QUOTED_SECTIONS = frozenset({"LABELS"})
+
+_HEADER_RE = re.compile(rb"[ \t]*\[([A-Za-z_]+)\][^\r\n]*\r?\n?")
+_TOKEN_RE = r"\S+"
+_QUOTED_TOKEN_RE = r'"[^"]*"|\S+'
+
+try:
+    pl.col("x").list.get(0, null_on_oob=True)
+    _GET_KWARGS = {"null_on_oob": True}
+except TypeError:
+    # polars < 1.0 already returns null for out-of-bounds indices
+    _GET_KWARGS = {}
+
+
+def _list_get(expr, index):
+    return expr.list.get(index, **_GET_KWARGS)
+
+
+def _read_lines(data, encoding):
+    """Split a section body into a single 'raw' string column."""
+    if not data.strip():
+        return pl.DataFrame({"raw": []}, schema={"raw": pl.Utf8})
+    if encoding.replace("-", "").lower() != "utf8":
+        data = data.decode(encoding, errors="replace").encode("utf-8")
+    # A separator that never occurs in INP text keeps each line whole
+    return pl.read_csv(
+        io.BytesIO(data), has_header=False, separator="\x1f", quote_char=None,
+        schema={"raw": pl.Utf8},
+        encoding="utf8-lossy", truncate_ragged_lines=True,
+    )
+
+
+def section_columns(section):
+    """Column names of a section table (raw sections have a single 'line')."""
+    return SECTION_SCHEMAS.get(section, ("line",))
+
+
+class LazyInpParser:
+    def __init__(self, filepath, encoding="utf-8", verbose=False, compact=False):
+        """
+        Index an INP file without parsing any section.
+
+        Parameters
+        ----------
+        filepath : str
+            Path to the INP file.
+        encoding : str
+            Text encoding used when a section is decoded.
+        verbose : bool
+            Print the section index after opening.
+        compact : bool
+            Parse numeric columns as Float32 and ID/keyword columns as
+            Categorical. Tables take roughly half the memory; values keep
+            about 7 significant digits (``write_inp`` then writes float32
+            text). Coordinates (``COORDINATE_SECTIONS``) stay Float64.
+        """
+        self.filepath = os.fspath(filepath)
+        self.encoding = encoding
+        self.compact = compact
+        self._file = open(self.filepath, "rb")
+        try:
+            self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            self._buf = b""
+        self._spans = {}
+        self._order = []
+        self._cache = {}
+        self._edits = {}
+        self._index_sections()
+
+        if verbose:
+            for name in self._order:
+                size = sum(end - start for start, end in self._spans[name])
+                print(f"   [{name}] {size} bytes")
+
+    # ------------------------------------------------------------------
+    # Section index
+    # ------------------------------------------------------------------
+    def _index_sections(self):
+        # memchr-style scan for '[' instead of a line-anchored regex over the
+        # whole file; only candidates at a line start are matched
+        buf = self._buf
+        headers = []
+        pos = 0
+        while True:
+            i = buf.find(b"[", pos)
+            if i < 0:
+                break
+            match = _HEADER_RE.match(buf, buf.rfind(b"\n", 0, i) + 1)
+            if match is not None and match.start(1) == i + 1:
+                headers.append(match)
+                pos = match.end()
+            else:
+                pos = i + 1
+        for i, match in enumerate(headers):
+            name = match.group(1).decode("ascii").upper()
+            start = match.end()
+            end = headers[i + 1].start() if i + 1 < len(headers) else len(self._buf)
+            if name not in self._spans:
+                self._spans[name] = []
+                self._order.append(name)
+            self._spans[name].append((start, end))
+
+    @property
+    def sections(self):
+        """Section names in file order."""
+        return list(self._order)
+
+    def has_section(self, section):
+        return section.upper() in self._spans
+
+    def section_bytes(self, section):
+        """Raw body bytes of a section (all occurrences, concatenated)."""
+        spans = self._spans.get(section.upper(), ())
+        return b"".join(self._buf[start:end] for start, end in spans)
+
+    # ------------------------------------------------------------------
+    # Lazy tables
+    # ------------------------------------------------------------------
+    def scan(self, section, columns=None):
+        """
+        Build a LazyFrame for one section with column projection.
+
+        Parameters
+        ----------
+        section : str
+            Section name (``"PIPES"``) or table name (``"pipes"``).
+        columns : list of str, optional
+            Columns to extract. Defaults to the full schema.
+
+        Returns
+        -------
+        polars.LazyFrame
+        """
+        section = TABLE_SECTIONS.get(section, section).upper()
+        schema = section_columns(section)
+        wanted = schema if columns is None else tuple(columns)
+        unknown = [c for c in wanted if c not in schema]
+        if unknown:
+            raise KeyError(f"[{section}] has no columns {unknown}; available: {list(schema)}")
+
+        raw = _read_lines(self.section_bytes(section), self.encoding).lazy()
+        body = (
+            raw.with_columns(pl.col("raw").str.replace(r";.*$", "").str.strip_chars())
+            .filter(pl.col("raw") != "")
+        )
+        if schema == ("line",):
+            return body.select(pl.col("raw").alias("line"))
+
+        if section == "PATTERNS":
+            return self._scan_patterns(body, wanted)
+
+        pattern = _QUOTED_TOKEN_RE if section in QUOTED_SECTIONS else _TOKEN_RE
+        tokens = body.select(pl.col("raw").str.extract_all(pattern).alias("tok"))
+        rest = REST_COLUMNS.get(section)
+        exprs = []
+        for name in wanted:
+            pos = schema.index(name)
+            if name == rest:
+                expr = pl.col("tok").list.slice(pos).list.join(" ")
+                expr = pl.when(expr != "").then(expr)
+            else:
+                expr = _list_get(pl.col("tok"), pos)
+            if name not in STRING_COLUMNS:
+                single = self.compact and section not in COORDINATE_SECTIONS
+                expr = expr.cast(pl.Float32 if single else pl.Float64, strict=False)
+            elif self.compact and name in CATEGORICAL_COLUMNS:
+                expr = expr.cast(pl.Categorical)
+            exprs.append(expr.alias(name))
+        return tokens.select(exprs)
+
+    def _scan_patterns(self, body, wanted):
+        # Patterns span several lines per ID; emit one row per multiplier
+        tokens = body.select(pl.col("raw").str.extract_all(_TOKEN_RE).alias("tok"))
+        long = tokens.select(
+            _list_get(pl.col("tok"), 0).alias("id"),
+            pl.col("tok").list.slice(1).alias("multiplier"),
+        ).explode("multiplier").drop_nulls("multiplier")
+        long = long.with_columns(pl.col("multiplier").cast(pl.Float32 if self.compact else pl.Float64,
+                                                           strict=False))
+        if self.compact:
+            long = long.with_columns(pl.col("id").cast(pl.Categorical))
+        return long.select(list(wanted))
+
+    def table(self, section, columns=None):
+        """
+        Materialised (and cached) section table.
+
+        A projection is served from the cached full table when one exists,
+        otherwise only the requested columns are extracted and cached.
+        """
+        section = TABLE_SECTIONS.get(section, section).upper()
+        key = (section, None if columns is None else tuple(columns))
+        df = self._cache.get(key)
+        if df is not None:
+            return df
+        full = self._cache.get((section, None))
+        if full is not None:
+            df = full.select(list(columns))
+        else:
+            df = self.scan(section, columns).collect()
+        self._cache[key] = df
+        return df
+
+    def clear_cache(self, section=None):
+        """Drop cached tables (all, or those of one section)."""
+        if section is None:
+            self._cache.clear()
+            return
+        section = TABLE_SECTIONS.get(section, section).upper()
+        for key in [k for k in self._cache if k[0] == section]:
+            del self._cache[key]
+
+    @property
+    def cached_tables(self):
+        """(section, columns) keys of the tables materialised so far."""
+        return list(self._cache)
+
+    def memory_usage(self):
+        """
+        Estimated bytes of every cached table, keyed like ``cached_tables``.
+
+        Edited tables stay referenced for ``write_inp`` until the parser is
+        closed, so they are reported (and kept) after ``clear_cache``.
+        """
+        usage = {key: df.estimated_size() for key, df in self._cache.items()}
+        for section, df in self._edits.items():
+            usage.setdefault((section, None), df.estimated_size())
+        return usage
+
+    # ------------------------------------------------------------------
+    # Editing / writing
+    # ------------------------------------------------------------------
+    def set_table(self, section, df):
+        """
+        Replace a section table; the edit is picked up by ``write_inp``.
+
+        ``df`` must contain every column of the section schema (extra
+        columns are dropped, order is normalised).
+        """
+        section = TABLE_SECTIONS.get(section, section).upper()
+        schema = section_columns(section)
+        missing = [c for c in schema if c not in df.columns]
+        if missing:
+            raise KeyError(f"[{section}] table is missing columns {missing}")
+        df = df.select(list(schema))
+        self.clear_cache(section)
+        self._cache[(section, None)] = df
+        self._edits[section] = df
+        if section not in self._order:
+            self._order.insert(self._order.index("END") if "END" in self._order else len(self._order), section)
+
+    @property
+    def edited_sections(self):
+        return list(self._edits)
+
+    def write_inp(self, filepath, tables=None):
+        """
+        Write the model back to INP.
+
+        Sections that were not edited are copied byte-for-byte from the
+        source file; edited sections (``set_table`` or ``tables``) are
+        serialised with one vectorised ``write_csv`` call each.
+
+        Parameters
+        ----------
+        filepath : str
+            Output path. Writing over the source file is supported on
+            POSIX (the mapped source stays valid until ``close()``).
+        tables : dict, optional
+            Section/table name -> DataFrame overrides for this write only.
+
+        Returns
+        -------
+        str : the output path
+        """
+        filepath = os.fspath(filepath)
+        overrides = dict(self._edits)
+        order = list(self._order)
+        for name, df in (tables or {}).items():
+            section = TABLE_SECTIONS.get(name, name).upper()
+            overrides[section] = df.select(list(section_columns(section)))
+            if section not in order:
+                order.insert(order.index("END") if "END" in order else len(order), section)
+        if "END" not in order:
+            order.append("END")
+
+        # Write next to the target and swap in, so the mmap of the source
+        # file stays valid when writing over it
+        tmp_path = filepath + ".tmp"
+        with open(tmp_path, "wb") as fh:
+            for section in order:
+                fh.write(f"[{section}]\n".encode("ascii"))
+                if section in overrides:
+                    _write_section(fh, section, overrides[section], self.encoding)
+                    fh.write(b"\n")
+                else:
+                    body = self.section_bytes(section)
+                    fh.write(body)
+                    if body and not body.endswith(b"\n"):
+                        fh.write(b"\n")
+        os.replace(tmp_path, filepath)
+        return filepath
+
+    # ------------------------------------------------------------------
+    # Derived tables
+    # ------------------------------------------------------------------
+    def demand_categories(self):
+        """
+        Non-zero demand categories as ``id``, ``demand``, ``pattern``.
+
+        A junction listed in [DEMANDS] takes its categories from there,
+        otherwise its [JUNCTIONS] demand is used (EPANET's rule). A null
+        pattern means the default demand pattern.
+        """
+        junctions = self.table("JUNCTIONS", ["id", "demand", "pattern"])
+        demands = self.table("DEMANDS")
+        if demands.height:
+            listed = demands["id"].unique()
+            junctions = junctions.filter(~pl.col("id").is_in(listed.implode()))
+            junctions = pl.concat([junctions, demands.select("id", "demand", "pattern")])
+        return junctions.filter(pl.col("demand").fill_null(0.0) != 0.0)
+
+    # ------------------------------------------------------------------
+    # Counts
+    # ------------------------------------------------------------------
+    @property
+    def num_nodes(self):
+        return sum(self.table(s, ["id"]).height for s in NODE_SECTIONS)
+
+    @property
+    def num_links(self):
+        return sum(self.table(s, ["id"]).height for s in LINK_SECTIONS)
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def close(self):
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        self._buf = b""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f"LazyInpParser({self.filepath!r}, sections={len(self._order)}, cached={len(self._cache)})"
+
+
+PATTERN_VALUES_PER_LINE = 6
+
+
+def _write_section(fh, section, df, encoding):
+    """Serialise one section table with a tab-separated, no-quote policy."""
+    schema = section_columns(section)
+    if section == "PATTERNS":
+        # Long format back to INP lines of PATTERN_VALUES_PER_LINE multipliers
+        df = (
+            df.with_columns(
+                (pl.int_range(pl.len()).over("id") // PATTERN_VALUES_PER_LINE).alias("_chunk"),
+                pl.col("multiplier").cast(pl.Utf8),
+            )
+            .group_by(["id", "_chunk"], maintain_order=True)
+            .agg(pl.col("multiplier"))
+            .select("id", pl.col("multiplier").list.join("\t"))
+        )
+    if schema != ("line",):
+        fh.write((";" + "\t".join(schema) + "\n").encode(encoding))
+        df = _fill_inner_nulls(section, df)
+    # Nulls left are trailing, so they become empty trailing cells
+    df.write_csv(fh, include_header=False, separator="\t", null_value="",
+                 quote_style="never")
+
+
+def _fill_inner_nulls(section, df):
+    """
+    Write 0 for a numeric null followed by a non-null field in its row.
+    EPANET splits lines on whitespace, so an empty middle cell would shift
+    every later field one column left; a text null there cannot be written.
+    """
+    columns = df.columns
+    fills = []
+    for i, name in enumerate(columns[:-1]):
+        later = pl.any_horizontal([pl.col(c).is_not_null() for c in columns[i + 1:]])
+        inner = pl.col(name).is_null() & later
+        if not df.select(inner.any()).item():
+            continue
+        if name in STRING_COLUMNS:
+            row = df.select(inner.arg_max()).item()
+            raise ValueError(f"[{section}] row {row}: no {name!r} but later fields are set; "
+                             f"EPANET cannot read an empty middle field")
+        fills.append(pl.when(inner).then(0.0).otherwise(pl.col(name)).alias(name))
+    return df.with_columns(fills) if fills else df
+
+
+def _table_property(name):
+    def getter(self):
+        return self.table(TABLE_SECTIONS[name])
+    getter.__name__ = name
+    getter.__doc__ = f"[{TABLE_SECTIONS[name]}] table (parsed on first access)."
+    return property(getter)
+
+
+for _name in TABLE_SECTIONS:
+    setattr(LazyInpParser, _name, _table_property(_name))
+del _name
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    inp = sys.argv[1] if len(sys.argv) > 1 else "Net3.inp"
+    t0 = time.perf_counter()
+    model = LazyInpParser(inp, verbose=True)
+    print(f"Indexed in {time.perf_counter() - t0:.4f}s")
+    t0 = time.perf_counter()
+    print(model.table("pipes", ["id", "diameter"]).head())
+    print(f"Projected query in {time.perf_counter() - t0:.4f}s")
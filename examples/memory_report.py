@@ -0,0 +1,172 @@
+"""
+EPANET-Turbo Memory Report
+==========================
+
+Breaks the resident size of a process down by owner, for sizing services
+that hold huge networks in memory:
+
+* ``parser_tables``  - Polars tables of ``LazyInpParser`` / ``InpParser``
+* ``kernel``         - arrays the kernel malloc'd for the model and the open
+                       hydraulic / quality solvers (``ResidentProject``)
+* ``project_buffers``- NumPy scratch buffers of the projects
+* ``result_buffers`` - in-memory result arrays (``SimulationResult`` ...)
+* ``mapped_results`` - Protocol V2 memmaps (page cache, reclaimable)
+* ``unaccounted``    - RSS minus the above (interpreter, libraries, ...)
+
+The streaming path keeps result memory flat; on 400k-node models the
+parser tables and the kernel arrays dominate. ``compact=True`` parsing
+(Float32 / Categorical) roughly halves the tables, and ``clear_cache()``
+drops them once the kernel has opened the model.
+
+Usage:
+------
+    from memory_report import memory_report
+
+    model = LazyInpParser("city.inp", compact=True)
+    tanks = model.tanks
+    proj = ResidentProject("city.inp")
+    res = run_simulation(proj, nodes=sensors)
+
+    print(memory_report(parsers=[model], projects=[proj], results=[res]))
+    model.clear_cache()                       # tables no longer needed
+"""
+
+import mmap
+import os
+
+import numpy as np
+import polars as pl
+
+try:
+    from .lazy_parser import LazyInpParser
+except ImportError:
+    from lazy_parser import LazyInpParser
+
+CATEGORIES = ("parser_tables", "kernel", "project_buffers", "result_buffers", "mapped_results")
+
+
+def rss_bytes():
+    """Resident set size of this process (Linux), or None."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def table_bytes(obj):
+    """
+    Estimated bytes of the Polars tables held by ``obj``.
+
+    ``obj`` is a DataFrame, a dict of DataFrames, a ``LazyInpParser`` (its
+    cached tables) or any object with DataFrame attributes (``InpParser``).
+    """
+    if isinstance(obj, pl.DataFrame):
+        return obj.estimated_size()
+    if isinstance(obj, LazyInpParser):
+        return sum(obj.memory_usage().values())
+    values = obj.values() if isinstance(obj, dict) else vars(obj).values()
+    return sum(v.estimated_size() for v in values if isinstance(v, pl.DataFrame))
+
+
+def _root(array):
+    # Walk the view chain down to the array that owns the memory
+    mapped = isinstance(array, np.memmap)
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+        mapped = mapped or isinstance(array, np.memmap)
+    return array, mapped or isinstance(array.base, mmap.mmap)
+
+
+def _arrays(obj):
+    if isinstance(obj, np.ndarray):
+        yield obj
+    elif isinstance(obj, (list, tuple)):
+        for item in obj:
+            yield from _arrays(item)
+    elif isinstance(obj, dict):
+        for item in obj.values():
+            yield from _arrays(item)
+    elif hasattr(obj, "__dict__"):
+        for item in vars(obj).values():
+            if isinstance(item, (np.ndarray, list, tuple, dict)):
+                yield from _arrays(item)
+
+
+def array_bytes(obj):
+    """
+    ``(in_memory, mapped)`` bytes of the NumPy arrays held by ``obj``.
+
+    Views are charged to the array owning the memory, once; arrays backed
+    by a memory map count as mapped.
+    """
+    seen = {}
+    for array in _arrays(obj):
+        root, mapped = _root(array)
+        seen[id(root)] = (root.nbytes, mapped)
+    in_memory = sum(n for n, mapped in seen.values() if not mapped)
+    return in_memory, sum(n for n, mapped in seen.values() if mapped)
+
+
+class MemoryReport:
+    def __init__(self, usage, rss):
+        """Bytes per category (see ``CATEGORIES``) plus the process RSS."""
+        self.usage = dict(usage)
+        self.rss = rss
+
+    @property
+    def accounted(self):
+        # Mapped pages are reclaimable page cache, not counted against RSS
+        return sum(v for k, v in self.usage.items() if k != "mapped_results" and v is not None)
+
+    @property
+    def unaccounted(self):
+        return None if self.rss is None else max(self.rss - self.accounted, 0)
+
+    def as_dict(self):
+        out = dict(self.usage)
+        out.update(unaccounted=self.unaccounted, rss=self.rss)
+        return out
+
+    def summary(self):
+        lines = []
+        for name, value in self.as_dict().items():
+            text = "n/a" if value is None else f"{value / 1e6:10.1f} MB"
+            lines.append(f"{name:>16}: {text}")
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return "MemoryReport(\n" + self.summary() + "\n)"
+
+
+def memory_report(parsers=(), projects=(), results=()):
+    """
+    Account the memory held by parsers, resident projects and results.
+
+    Parameters
+    ----------
+    parsers : list
+        ``LazyInpParser`` / ``InpParser`` objects, DataFrames or dicts of them.
+    projects : list of ResidentProject
+    results : list
+        ``SimulationResult``, ``QualityResult``, ``StreamingResult`` or arrays.
+
+    Returns
+    -------
+    MemoryReport
+    """
+    kernel = 0
+    buffers = 0
+    for proj in projects:
+        usage = proj.memory_usage()
+        kernel = None if kernel is None or usage["kernel"] is None else kernel + usage["kernel"]
+        buffers += usage["buffers"]
+    in_memory, mapped = array_bytes(list(results))
+    usage = {
+        "parser_tables": sum(table_bytes(p) for p in parsers),
+        "kernel": kernel,
+        "project_buffers": buffers,
+        "result_buffers": in_memory,
+        "mapped_results": mapped,
+    }
+    return MemoryReport(usage, rss_bytes())
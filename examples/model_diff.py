@@ -0,0 +1,343 @@
+"""
+EPANET-Turbo Model Diff
+=======================
+
+Compare two versions of an INP model table-by-table with Polars joins and
+apply the resulting changeset to a live ``ResidentProject`` through the
+Batch API, so that nightly GIS exports do not force a full re-open.
+
+Usage:
+------
+    from lazy_parser import LazyInpParser
+    from model_diff import diff_models
+    from turbo_kernel import ResidentProject
+
+    proj = ResidentProject("network_2026-10-18.inp")
+
+    changes = diff_models(LazyInpParser("network_2026-10-18.inp"),
+                          LazyInpParser("network_2026-10-19.inp"))
+    print(changes.summary())
+
+    if changes.requires_reopen:
+        print(changes.reopen_reasons)       # structural edits: re-open the model
+    else:
+        changes.apply(proj)                 # in-place Batch API update
+"""
+
+import polars as pl
+
+try:
+    from .lazy_parser import NODE_SECTIONS, LINK_SECTIONS
+    from . import turbo_kernel as tk
+except ImportError:
+    from lazy_parser import NODE_SECTIONS, LINK_SECTIONS
+    import turbo_kernel as tk
+
+# Sections keyed by a unique element ID
+KEYED_SECTIONS = ("JUNCTIONS", "RESERVOIRS", "TANKS", "PIPES", "PUMPS", "VALVES",
+                  "EMITTERS", "QUALITY", "STATUS", "SOURCES", "MIXING")
+# Sections with several rows per ID, compared as ordered value lists
+GROUPED_SECTIONS = {"PATTERNS": ("multiplier",), "CURVES": ("x", "y"),
+                    "DEMANDS": ("demand", "pattern")}
+# Sections without hydraulic effect
+COSMETIC_SECTIONS = frozenset({"TITLE", "COORDINATES", "VERTICES", "LABELS",
+                               "TAGS", "BACKDROP", "REPORT", "END"})
+
+# (section, column) -> (element kind, kernel property) for in-place updates
+NODE_PROPS = {
+    ("JUNCTIONS", "elevation"): tk.EN_ELEVATION,
+    ("JUNCTIONS", "demand"): tk.EN_BASEDEMAND,
+    ("RESERVOIRS", "head"): tk.EN_ELEVATION,
+    ("TANKS", "elevation"): tk.EN_ELEVATION,
+    ("TANKS", "init_level"): tk.EN_TANKLEVEL,
+    ("TANKS", "min_level"): tk.EN_MINLEVEL,
+    ("TANKS", "max_level"): tk.EN_MAXLEVEL,
+    ("TANKS", "diameter"): tk.EN_TANKDIAM,
+    ("TANKS", "min_vol"): tk.EN_MINVOLUME,
+    ("EMITTERS", "coefficient"): tk.EN_EMITTER,
+    ("QUALITY", "init_qual"): tk.EN_INITQUAL,
+}
+LINK_PROPS = {
+    ("PIPES", "length"): tk.EN_LENGTH,
+    ("PIPES", "diameter"): tk.EN_DIAMETER,
+    ("PIPES", "roughness"): tk.EN_ROUGHNESS,
+    ("PIPES", "minor_loss"): tk.EN_MINORLOSS,
+    ("VALVES", "diameter"): tk.EN_DIAMETER,
+    ("VALVES", "setting"): tk.EN_INITSETTING,
+    ("VALVES", "minor_loss"): tk.EN_MINORLOSS,
+}
+# Pattern-reference columns (values are pattern IDs, resolved at apply time)
+PATTERN_COLUMNS = {("JUNCTIONS", "pattern"), ("RESERVOIRS", "pattern")}
+LINK_STATUS = {"OPEN": tk.EN_OPEN, "CLOSED": tk.EN_CLOSED}
+
+
+class SectionDiff:
+    def __init__(self, section, added, removed, modified):
+        """
+        Changes of one section.
+
+        ``added``/``removed`` hold full rows (removed rows with old values);
+        ``modified`` holds the new rows plus a ``changed`` list column naming
+        the columns whose value differs.
+        """
+        self.section = section
+        self.added = added
+        self.removed = removed
+        self.modified = modified
+
+    @property
+    def is_empty(self):
+        return self.added.height == 0 and self.removed.height == 0 and self.modified.height == 0
+
+    def __repr__(self):
+        return (f"SectionDiff([{self.section}] +{self.added.height} "
+                f"-{self.removed.height} ~{self.modified.height})")
+
+
+def _diff_keyed(section, old, new, key="id"):
+    values = [c for c in new.columns if c != key]
+    added = new.join(old.select(key), on=key, how="anti")
+    removed = old.join(new.select(key), on=key, how="anti")
+    joined = new.join(old, on=key, how="inner", suffix="__old")
+    if values:
+        flags = [pl.when(pl.col(c).ne_missing(pl.col(f"{c}__old"))).then(pl.lit(c)) for c in values]
+        modified = (
+            joined.with_columns(pl.concat_list(flags).list.drop_nulls().alias("changed"))
+            .filter(pl.col("changed").list.len() > 0)
+            .select([key, *values, "changed"])
+        )
+    else:
+        modified = joined.select(key).clear().with_columns(pl.lit([], dtype=pl.List(pl.Utf8)).alias("changed"))
+    return SectionDiff(section, added, removed, modified)
+
+
+def _diff_grouped(section, old, new, values):
+    agg = [pl.col(c) for c in values]
+    old_g = old.group_by("id", maintain_order=True).agg(agg)
+    new_g = new.group_by("id", maintain_order=True).agg(agg)
+    return _diff_keyed(section, old_g, new_g)
+
+
+def _rule_blocks(df):
+    # One row per rule: the block of lines from 'RULE <name>' to the next rule
+    block = pl.col("line").str.to_uppercase().str.starts_with("RULE ").cum_sum()
+    return (
+        df.with_columns(block.alias("_block"))
+        .filter(pl.col("_block") > 0)
+        .group_by("_block", maintain_order=True)
+        .agg(pl.col("line").first().str.split(" ").list.get(1).alias("id"),
+             pl.col("line").str.join("\n").alias("text"))
+        .drop("_block")
+    )
+
+
+def _diff_lines(section, old, new):
+    # Order-insensitive line diff for raw sections (controls, options, ...)
+    added = new.join(old, on="line", how="anti")
+    removed = old.join(new, on="line", how="anti")
+    return SectionDiff(section, added, removed, new.clear().with_columns(
+        pl.lit([], dtype=pl.List(pl.Utf8)).alias("changed")))
+
+
+def diff_tables(section, old, new):
+    """Diff one section given the old and new tables."""
+    section = section.upper()
+    if section in KEYED_SECTIONS:
+        return _diff_keyed(section, old, new)
+    if section in GROUPED_SECTIONS:
+        return _diff_grouped(section, old, new, GROUPED_SECTIONS[section])
+    if section == "RULES":
+        return _diff_keyed(section, _rule_blocks(old), _rule_blocks(new))
+    return _diff_lines(section, old, new)
+
+
+class ModelChangeset:
+    def __init__(self, sections, demand_listed=()):
+        """
+        Non-empty section diffs of two models. ``demand_listed`` holds the
+        junctions of the new model listed in [DEMANDS]: their [JUNCTIONS]
+        demand and pattern have no effect (EPANET's rule), so they are not
+        written.
+        """
+        self.sections = {d.section: d for d in sections if not d.is_empty}
+        self.demand_listed = list(demand_listed)
+
+    def __getitem__(self, section):
+        return self.sections[section.upper()]
+
+    def __contains__(self, section):
+        return section.upper() in self.sections
+
+    @property
+    def is_empty(self):
+        return not self.sections
+
+    def summary(self):
+        """Counts per section and change kind as a DataFrame."""
+        rows = [
+            {"section": s, "added": d.added.height, "removed": d.removed.height,
+             "modified": d.modified.height}
+            for s, d in self.sections.items()
+        ]
+        return pl.DataFrame(rows, schema={"section": pl.Utf8, "added": pl.Int64,
+                                          "removed": pl.Int64, "modified": pl.Int64})
+
+    @property
+    def reopen_reasons(self):
+        """Changes that cannot be applied to an open project in place."""
+        reasons = []
+        for section, d in self.sections.items():
+            if section in COSMETIC_SECTIONS:
+                continue
+            if section == "PATTERNS":
+                if d.removed.height:
+                    reasons.append(f"[PATTERNS] {d.removed.height} removed")
+                continue
+            if d.added.height or d.removed.height:
+                reasons.append(f"[{section}] +{d.added.height} -{d.removed.height}")
+            if d.modified.height == 0:
+                continue
+            if section not in NODE_SECTIONS + LINK_SECTIONS + ("EMITTERS", "QUALITY", "STATUS"):
+                reasons.append(f"[{section}] {d.modified.height} modified")
+                continue
+            supported = {col for (s, col) in NODE_PROPS if s == section}
+            supported |= {col for (s, col) in LINK_PROPS if s == section}
+            supported |= {col for (s, col) in PATTERN_COLUMNS if s == section}
+            if section in ("PIPES", "STATUS"):
+                supported.add("status")
+                unsupported = _unsupported_status(d.modified.filter(pl.col("changed").list.contains("status")))
+                if unsupported.height:
+                    reasons.append(f"[{section}] status {sorted(set(unsupported['status'].to_list()))} "
+                                   f"on {unsupported.height} links")
+            other = (
+                d.modified.select(pl.col("changed").explode().unique().drop_nulls())
+                .filter(~pl.col("changed").is_in(list(supported)))["changed"].to_list()
+            )
+            if other:
+                reasons.append(f"[{section}] changed columns {sorted(other)}")
+        return reasons
+
+    @property
+    def requires_reopen(self):
+        return bool(self.reopen_reasons)
+
+    def apply(self, project, strict=True):
+        """
+        Push the changeset into an open ``ResidentProject``.
+
+        Each (property, element kind) is written with one Batch API call;
+        pattern edits go through ``EN_setpattern``.
+
+        Parameters
+        ----------
+        project : ResidentProject
+        strict : bool
+            Raise when the changeset contains structural edits instead of
+            applying the supported subset.
+
+        Returns
+        -------
+        dict : number of values written per kernel property group
+        """
+        reasons = self.reopen_reasons
+        if reasons and strict:
+            raise ValueError("changeset needs a full re-open: " + "; ".join(reasons))
+
+        written = {}
+        # Patterns first, so new pattern references resolve
+        if "PATTERNS" in self.sections:
+            d = self.sections["PATTERNS"]
+            for df in (d.added, d.modified):
+                for pid, factors in df.select("id", "multiplier").iter_rows():
+                    project.set_pattern(pid, factors, create=True)
+                    written["PATTERNS"] = written.get("PATTERNS", 0) + 1
+
+        for section, d in self.sections.items():
+            if d.modified.height == 0 or section in COSMETIC_SECTIONS:
+                continue
+            changed = d.modified.explode("changed")
+            for col in changed["changed"].unique().drop_nulls().to_list():
+                rows = changed.filter(pl.col("changed") == col)
+                if section == "JUNCTIONS" and col in ("demand", "pattern") and self.demand_listed:
+                    rows = rows.filter(~pl.col("id").is_in(self.demand_listed))
+                ids = rows["id"].to_list()
+                n_written = len(ids)
+                if not n_written:
+                    continue
+                if (section, col) in NODE_PROPS:
+                    project.set_node_values(project.node_index(ids), NODE_PROPS[section, col],
+                                            rows[col].to_numpy())
+                elif (section, col) in LINK_PROPS:
+                    project.set_link_values(project.link_index(ids), LINK_PROPS[section, col],
+                                            rows[col].to_numpy())
+                elif (section, col) in PATTERN_COLUMNS:
+                    values = [0 if p is None else project.pattern_index(p) for p in rows[col].to_list()]
+                    project.set_node_values(project.node_index(ids), tk.EN_PATTERN, values)
+                elif col == "status":
+                    n_written = self._apply_status(project, section, rows)
+                else:
+                    continue
+                if n_written:
+                    key = f"{section}.{col}"
+                    written[key] = written.get(key, 0) + n_written
+        return written
+
+    @staticmethod
+    def _apply_status(project, section, rows):
+        """Write OPEN/CLOSED and numeric statuses; returns the number of links written."""
+        status = rows["status"].str.to_uppercase()
+        is_status = status.is_in(list(LINK_STATUS))
+        fixed = rows.filter(is_status)
+        if fixed.height:
+            codes = fixed["status"].str.to_uppercase().replace_strict(LINK_STATUS, return_dtype=pl.Float64)
+            project.set_link_values(project.link_index(fixed["id"].to_list()), tk.EN_INITSTATUS, codes.to_numpy())
+        # STATUS entries may also carry a numeric setting (pump speed, valve setting)
+        numeric = rows.filter(~is_status).with_columns(pl.col("status").cast(pl.Float64, strict=False))
+        numeric = numeric.filter(pl.col("status").is_not_null())
+        if numeric.height:
+            project.set_link_values(project.link_index(numeric["id"].to_list()), tk.EN_INITSETTING,
+                                    numeric["status"].to_numpy())
+        # Anything else (CV) changes the link type and is a reopen reason
+        return fixed.height + numeric.height
+
+    def __repr__(self):
+        parts = ", ".join(repr(d) for d in self.sections.values())
+        return f"ModelChangeset({parts or 'no changes'})"
+
+
+def _unsupported_status(rows):
+    # Statuses that are neither OPEN/CLOSED nor a numeric setting (e.g. CV)
+    status = pl.col("status").cast(pl.Utf8).str.strip_chars()
+    return rows.filter(status.is_not_null() & ~status.str.to_uppercase().is_in(list(LINK_STATUS))
+                       & status.cast(pl.Float64, strict=False).is_null())
+
+
+def diff_models(old, new, sections=None):
+    """
+    Diff two ``LazyInpParser`` models.
+
+    Parameters
+    ----------
+    old, new : LazyInpParser
+    sections : list of str, optional
+        Sections to compare (default: every section present in either model).
+
+    Returns
+    -------
+    ModelChangeset
+    """
+    if sections is None:
+        sections = list(dict.fromkeys(old.sections + new.sections))
+    diffs = []
+    for section in sections:
+        section = section.upper()
+        if section in COSMETIC_SECTIONS:
+            continue
+        # Identical bytes cannot produce a diff; skip the parse entirely
+        if old.section_bytes(section) == new.section_bytes(section):
+            continue
+        diffs.append(diff_tables(section, old.table(section), new.table(section)))
+    demand_listed = ()
+    if any(d.section == "JUNCTIONS" for d in diffs) and new.has_section("DEMANDS"):
+        demand_listed = new.table("DEMANDS", ["id"])["id"].unique().to_list()
+    return ModelChangeset(diffs, demand_listed)
@@ -0,0 +1,580 @@
+"""
+EPANET-Turbo Partitioned Solve
+==============================
+
+Domain decomposition of one huge network across worker processes, for
+machines where a single OpenMP solve stops scaling (multi-socket boxes).
+
+The nodes are split into ``parts`` groups and every link joining two
+groups (a cut link) is kept in both subnetworks. Each subnetwork is
+written as its own INP file in which the far end of every cut link is a
+"ghost" reservoir, and is solved by the regular kernel in its own
+process. The unknowns are the heads of the cut-link end nodes: one
+exchange round sets every ghost to the head its owning part computed in
+the previous round and re-solves all parts in parallel (block Jacobi,
+warm-started). Anderson acceleration over the last ``memory`` rounds
+turns the slow exchange into a few dozen to a few hundred rounds; the
+final heads of all parts agree to ``tol`` and match the single-model
+solve to the kernel accuracy.
+
+Partitioning uses recursive coordinate bisection when every node has
+coordinates, otherwise breadth-first level sets. Valve ends and the
+elements of each control/rule are kept in one part.
+
+Scope: hydraulic snapshots (demand-driven) at the requested times, with
+the model's initial tank levels and link status; extended-period
+simulation stays with ``run_simulation``.
+
+Usage:
+------
+    from partitioned_solve import PartitionedModel, partitioned_solve
+
+    res = partitioned_solve("region.inp", parts=8)          # snapshot at t = 0
+    res.pressures, res.flows, res.iterations
+
+    with PartitionedModel("region.inp", parts=8, total_threads=64) as pm:
+        print(pm.boundary_size, pm.part_sizes)
+        res = pm.solve(times=[0, 7 * 3600, 18 * 3600])      # warm-started from each other
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import polars as pl
+
+try:
+    from .concurrent_projects import partition_threads
+    from .lazy_parser import LazyInpParser
+    from .turbo_kernel import (EN_ACCURACY, EN_DURATION, EN_ELEVATION, EN_FLOW, EN_HEAD, EN_INITFLOW,
+                               EN_PATTERNSTART, EN_PRESSURE, ResidentProject)
+except ImportError:
+    from concurrent_projects import partition_threads
+    from lazy_parser import LazyInpParser
+    from turbo_kernel import (EN_ACCURACY, EN_DURATION, EN_ELEVATION, EN_FLOW, EN_HEAD, EN_INITFLOW,
+                              EN_PATTERNSTART, EN_PRESSURE, ResidentProject)
+
+NODE_KEYWORDS = frozenset({"NODE", "JUNCTION", "TANK", "RESERVOIR"})
+LINK_KEYWORDS = frozenset({"LINK", "PIPE", "PUMP", "VALVE"})
+
+# Raw sections split between the parts (each line or rule goes where its elements are)
+SPLIT_SECTIONS = ("CONTROLS", "RULES", "ENERGY", "REACTIONS")
+
+# Node / link tables filtered to the elements of each part
+NODE_TABLES = ("DEMANDS", "EMITTERS", "QUALITY", "SOURCES", "MIXING", "COORDINATES")
+LINK_TABLES = ("STATUS", "VERTICES")
+
+
+# ----------------------------------------------------------------------
+# Topology
+# ----------------------------------------------------------------------
+def _references(section, text):
+    """``(node_ids, link_ids)`` named in one control line, rule or option line."""
+    nodes, links = set(), set()
+    for line in text.splitlines():
+        tokens = line.split(";", 1)[0].split()
+        if section == "REACTIONS":
+            if len(tokens) == 3 and tokens[0].upper() in ("BULK", "WALL"):
+                links.add(tokens[1])
+            elif len(tokens) == 3 and tokens[0].upper() == "TANK":
+                nodes.add(tokens[1])
+            continue
+        for keyword, value in zip(tokens, tokens[1:]):
+            if keyword.upper() in NODE_KEYWORDS:
+                nodes.add(value)
+            elif keyword.upper() in LINK_KEYWORDS:
+                links.add(value)
+    return nodes, links
+
+
+def _units(model, section):
+    """Lines of a raw section, with [RULES] grouped into one unit per rule."""
+    if not model.has_section(section):
+        return []
+    lines = [line for line in model.section_bytes(section).decode(model.encoding, errors="replace").splitlines()
+             if line.split(";", 1)[0].strip()]
+    if section != "RULES":
+        return lines
+    rules = []
+    for line in lines:
+        if line.split()[0].upper() == "RULE" or not rules:
+            rules.append(line)
+        else:
+            rules[-1] += "\n" + line
+    return rules
+
+
+class _Topology:
+    """Node and link arrays of the whole model (0-based, kernel order per section)."""
+
+    def __init__(self, model):
+        junctions = model.table("JUNCTIONS", ["id"])
+        reservoirs = model.table("RESERVOIRS", ["id"])
+        tanks = model.table("TANKS", ["id"])
+        self.node_ids = junctions["id"].to_list() + reservoirs["id"].to_list() + tanks["id"].to_list()
+        self.node_lookup = {nid: k for k, nid in enumerate(self.node_ids)}
+
+        self.link_ids, n1, n2, self.link_section = [], [], [], []
+        for section in ("PIPES", "PUMPS", "VALVES"):
+            table = model.table(section, ["id", "node1", "node2"])
+            self.link_ids += table["id"].to_list()
+            n1 += table["node1"].to_list()
+            n2 += table["node2"].to_list()
+            self.link_section += [section] * table.height
+        self.link_lookup = {lid: k for k, lid in enumerate(self.link_ids)}
+        self.n1 = np.array([self.node_lookup[v] for v in n1], dtype=np.int64)
+        self.n2 = np.array([self.node_lookup[v] for v in n2], dtype=np.int64)
+        self.link_section = np.array(self.link_section)
+
+        # Elements that must share a part: valve ends, and the elements of each control / rule
+        self.groups = [[self.n1[k], self.n2[k]] for k in np.flatnonzero(self.link_section == "VALVES")]
+        for section in ("CONTROLS", "RULES"):
+            for unit in _units(model, section):
+                nodes, links = _references(section, unit)
+                members = [self.node_lookup[n] for n in nodes if n in self.node_lookup]
+                for lid in links:
+                    k = self.link_lookup.get(lid)
+                    if k is not None:
+                        members += [self.n1[k], self.n2[k]]
+                if members:
+                    self.groups.append(members)
+
+        coords = model.table("COORDINATES", ["id", "x", "y"]) if model.has_section("COORDINATES") else None
+        self.xy = None
+        if coords is not None and coords.height:
+            xy = pl.DataFrame({"id": self.node_ids}).join(coords, on="id", how="left", maintain_order="left")
+            if xy["x"].null_count() == 0:
+                self.xy = np.column_stack([xy["x"].to_numpy(), xy["y"].to_numpy()]).astype(np.float64)
+
+    def csr(self):
+        ends = np.concatenate([self.n1, self.n2])
+        nbrs = np.concatenate([self.n2, self.n1])
+        order = np.argsort(ends, kind="stable")
+        indptr = np.zeros(len(self.node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ends, minlength=len(self.node_ids)), out=indptr[1:])
+        return indptr, nbrs[order]
+
+
+def _bisect(idx, xy, parts, first, out):
+    # Recursive coordinate bisection, splitting the longer extent by node count
+    if parts == 1:
+        out[idx] = first
+        return
+    left = parts // 2
+    axis = int(np.argmax(np.ptp(xy[idx], axis=0)))
+    cut = idx.size * left // parts
+    order = np.argpartition(xy[idx, axis], cut)
+    _bisect(idx[order[:cut]], xy, left, first, out)
+    _bisect(idx[order[cut:]], xy, parts - left, first + left, out)
+
+
+def _bfs_order(indptr, nbrs, start, n):
+    seen = np.zeros(n, dtype=bool)
+    order = []
+    for root in [start] + list(range(n)):
+        if seen[root]:
+            continue
+        frontier = np.array([root])
+        seen[root] = True
+        while frontier.size:
+            order.append(frontier)
+            starts, counts = indptr[frontier], indptr[frontier + 1] - indptr[frontier]
+            offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            nxt = nbrs[offsets]
+            nxt = np.unique(nxt[~seen[nxt]])
+            seen[nxt] = True
+            frontier = nxt
+    return np.concatenate(order)
+
+
+def _merge_groups(part, groups):
+    # Union-find over the group members; each set moves to the part of its root
+    parent = {}
+
+    def find(a):
+        while parent.setdefault(a, a) != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    for members in groups:
+        root = find(int(members[0]))
+        for m in members[1:]:
+            parent[find(int(m))] = root
+    for node in parent:
+        part[node] = part[find(node)]
+    return part
+
+
+def partition_nodes(topology, parts):
+    """Part number (0 .. parts-1) of every node."""
+    n = len(topology.node_ids)
+    part = np.zeros(n, dtype=np.int64)
+    if topology.xy is not None:
+        _bisect(np.arange(n), topology.xy, parts, 0, part)
+    else:
+        indptr, nbrs = topology.csr()
+        # Start from the far end of a BFS to get long, thin level sets
+        start = int(_bfs_order(indptr, nbrs, 0, n)[-1])
+        order = _bfs_order(indptr, nbrs, start, n)
+        part[order] = np.arange(n) * parts // n
+    return _merge_groups(part, topology.groups)
+
+
+def cut_links(topology, part):
+    """Links whose two ends lie in different parts."""
+    return np.flatnonzero(part[topology.n1] != part[topology.n2])
+
+
+# ----------------------------------------------------------------------
+# Worker process
+# ----------------------------------------------------------------------
+def _serve(conn, inp_path, ghosts, boundary, num_threads, openmp, options):
+    """Solve loop of one part: set the ghost heads, solve, report the boundary heads."""
+    proj = None
+    try:
+        proj = ResidentProject(inp_path, openmp=openmp, num_threads=num_threads)
+        for option, value in options.items():
+            proj.set_option(option, value)
+        base_start = proj.get_time_param(EN_PATTERNSTART)
+        proj.set_time_param(EN_DURATION, 0)
+        ghost_idx = proj.node_index(ghosts)
+        boundary_idx = proj.node_index(boundary)
+        conn.send(("ready", proj.node_ids, proj.link_ids))
+
+        flag, clock = EN_INITFLOW, None
+        while True:
+            msg = conn.recv()
+            if msg[0] == "solve":
+                _, t, ghost_heads = msg
+                if t != clock:
+                    proj.set_time_param(EN_PATTERNSTART, base_start + t)
+                    clock = t
+                proj.set_node_values(ghost_idx, EN_ELEVATION, ghost_heads)
+                # Flag 0 after the first solve: warm start from the previous flows
+                proj.init_hydraulics(flag)
+                flag = 0
+                proj.run_step()
+                conn.send(("solved", proj.get_node_values(EN_HEAD, indices=boundary_idx), proj.last_warning))
+            elif msg[0] == "result":
+                conn.send(("result", proj.get_node_values(EN_HEAD), proj.get_node_values(EN_PRESSURE),
+                           proj.get_link_values(EN_FLOW)))
+            elif msg[0] == "close":
+                break
+    except Exception as exc:  # reported to the coordinator, which raises it
+        conn.send(("error", f"{type(exc).__name__}: {exc}"))
+    finally:
+        if proj is not None:
+            proj.close()
+        conn.close()
+
+
+class PartitionedResult:
+    def __init__(self, times, node_ids, link_ids, heads, pressures, flows, iterations, residuals):
+        """
+        Snapshot results, one row per time: ``heads``/``pressures`` (T, nodes),
+        ``flows`` (T, links), plus the exchange rounds and the final largest
+        boundary head mismatch per time.
+        """
+        self.times = np.asarray(times)
+        self.node_ids = node_ids
+        self.link_ids = link_ids
+        self.heads = heads
+        self.pressures = pressures
+        self.flows = flows
+        self.iterations = iterations
+        self.residuals = residuals
+
+    @property
+    def n_steps(self):
+        return len(self.times)
+
+    def __repr__(self):
+        return (f"PartitionedResult(steps={self.n_steps}, nodes={len(self.node_ids)}, "
+                f"links={len(self.link_ids)}, iterations={self.iterations})")
+
+
+class PartitionedModel:
+    def __init__(self, inp_path, parts=None, total_threads=None, openmp=True, workdir=None,
+                 accuracy=1e-8, mp_context=None):
+        """
+        Split a model and start one solver process per part.
+
+        Parameters
+        ----------
+        inp_path : str
+        parts : int, optional
+            Number of subnetworks / processes (default: one per core).
+        total_threads : int, optional
+            OpenMP threads shared out between the processes (default: cores).
+        workdir : str, optional
+            Where the subnetwork INP files go (default: a temporary
+            directory removed by ``close()``).
+        accuracy : float or None
+            ACCURACY option of the part solves. The exchange only converges
+            to what the parts resolve, so the default is much tighter than
+            EPANET's 0.001; None keeps the model's value.
+        mp_context : multiprocessing context, optional
+        """
+        self.inp_path = os.fspath(inp_path)
+        self.parts = parts or os.cpu_count() or 1
+        self._own_workdir = workdir is None
+        self.workdir = tempfile.mkdtemp(prefix="epanet_parts_") if workdir is None else workdir
+        os.makedirs(self.workdir, exist_ok=True)
+        self._procs = []
+        self._conns = []
+        try:
+            with LazyInpParser(self.inp_path) as model:
+                self._build(model)
+            self._start(total_threads, openmp, accuracy, mp_context or multiprocessing.get_context())
+        except BaseException:
+            self.close()
+            raise
+
+    # ------------------------------------------------------------------
+    def _build(self, model):
+        topo = _Topology(model)
+        part = partition_nodes(topo, self.parts)
+        cut = cut_links(topo, part)
+        boundary = np.unique(np.concatenate([topo.n1[cut], topo.n2[cut]]))
+        position = np.full(len(topo.node_ids), -1, dtype=np.int64)
+        position[boundary] = np.arange(boundary.size)
+
+        self.node_ids = topo.node_ids
+        self.link_ids = topo.link_ids
+        self.boundary_ids = [topo.node_ids[k] for k in boundary]
+        self.cut_link_ids = [topo.link_ids[k] for k in cut]
+
+        # Initial boundary heads: mean head of the fixed-head nodes
+        fixed = model.table("RESERVOIRS", ["head"])["head"].to_list()
+        tanks = model.table("TANKS", ["elevation", "init_level"])
+        fixed += (tanks["elevation"] + tanks["init_level"]).to_list()
+        self._x = np.full(boundary.size, float(np.mean(fixed)) if fixed else 0.0)
+
+        self.part_sizes = []
+        self._specs = []
+        for p in range(self.parts):
+            own = np.flatnonzero(part == p)
+            # Links inside the part plus every cut link touching it; the far
+            # end of a cut link is a ghost reservoir holding the other part's head
+            links = np.flatnonzero((part[topo.n1] == p) | (part[topo.n2] == p))
+            ends = np.concatenate([topo.n1[links], topo.n2[links]])
+            ghosts = np.unique(ends[part[ends] != p])
+            mine = boundary[part[boundary] == p]
+            path = os.path.join(self.workdir, f"part{p:03d}.inp")
+            self._write_part(model, topo, own, links, ghosts, path)
+            self.part_sizes.append(int(own.size))
+            self._specs.append({
+                "path": path,
+                "ghosts": [topo.node_ids[g] for g in ghosts],
+                "ghost_pos": position[ghosts],
+                "boundary": [topo.node_ids[b] for b in mine],
+                "boundary_pos": position[mine],
+                # Results: the part's own nodes, and links owned through node1
+                "links": links[part[topo.n1[links]] == p],
+            })
+
+    def _write_part(self, model, topo, own, links, ghosts, path):
+        node_set = pl.Series([topo.node_ids[k] for k in own], dtype=pl.Utf8)
+        ghost_ids = [topo.node_ids[g] for g in ghosts]
+        link_set = pl.Series([topo.link_ids[k] for k in links], dtype=pl.Utf8)
+        in_nodes = pl.col("id").is_in(node_set.implode())
+        in_links = pl.col("id").is_in(link_set.implode())
+
+        ghost_rows = pl.DataFrame(
+            {"id": ghost_ids, "head": np.full(len(ghost_ids), self._x[0] if self._x.size else 0.0),
+             "pattern": [None] * len(ghost_ids)},
+            schema={"id": pl.Utf8, "head": pl.Float64, "pattern": pl.Utf8})
+        tables = {
+            "JUNCTIONS": model.junctions.filter(in_nodes),
+            "RESERVOIRS": pl.concat([model.reservoirs.filter(in_nodes), ghost_rows]),
+            "TANKS": model.tanks.filter(in_nodes),
+            "PIPES": model.pipes.filter(in_links),
+            "PUMPS": model.pumps.filter(in_links),
+            "VALVES": model.valves.filter(in_links),
+            "REPORT": pl.DataFrame({"line": []}, schema={"line": pl.Utf8}),
+        }
+        if model.has_section("OPTIONS"):
+            # Parts only solve hydraulics: a trace node or a hydraulics file would not fit them
+            keyword = pl.col("line").str.extract(r"^\s*(\S+)").str.to_uppercase()
+            tables["OPTIONS"] = model.options.filter(~keyword.is_in(["QUALITY", "HYDRAULICS"]))
+        for section in NODE_TABLES:
+            if model.has_section(section):
+                nodes = node_set if section != "COORDINATES" else pl.concat([node_set, pl.Series(ghost_ids)])
+                tables[section] = model.table(section).filter(pl.col("id").is_in(nodes.implode()))
+        for section in LINK_TABLES:
+            if model.has_section(section):
+                tables[section] = model.table(section).filter(in_links)
+        if model.has_section("TAGS"):
+            tables["TAGS"] = model.table("TAGS").filter(in_nodes | in_links)
+        if model.has_section("LABELS"):
+            tables["LABELS"] = model.labels.clear()
+
+        own_nodes, own_links = set(node_set.to_list()), set(link_set.to_list())
+        for section in SPLIT_SECTIONS:
+            if not model.has_section(section):
+                continue
+            kept = []
+            for unit in _units(model, section):
+                nodes, unit_links = _references(section, unit)
+                local = len(nodes & own_nodes) + len(unit_links & own_links)
+                if local and local < len(nodes) + len(unit_links):
+                    raise ValueError(f"[{section}] entry spans several parts: {unit.splitlines()[0]!r}")
+                if local or not (nodes or unit_links):
+                    kept.extend(unit.splitlines())
+            tables[section] = pl.DataFrame({"line": kept}, schema={"line": pl.Utf8})
+        model.write_inp(path, tables=tables)
+
+    def _start(self, total_threads, openmp, accuracy, ctx):
+        shares = partition_threads(self.parts, total_threads)
+        options = {} if accuracy is None else {EN_ACCURACY: accuracy}
+        for spec, threads in zip(self._specs, shares):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_serve, daemon=True, args=(
+                child, spec["path"], spec["ghosts"], spec["boundary"], threads, openmp, options))
+            proc.start()
+            child.close()
+            self._procs.append(proc)
+            self._conns.append(parent)
+        node_lookup = {nid: k for k, nid in enumerate(self.node_ids)}
+        for conn, spec in zip(self._conns, self._specs):
+            _, node_ids, link_ids = self._receive(conn, "ready")
+            # Where the part's own nodes / owned links land in the full arrays
+            ghosts = set(spec["ghosts"])
+            own = [k for k, nid in enumerate(node_ids) if nid not in ghosts]
+            local_link = {lid: k for k, lid in enumerate(link_ids)}
+            spec["node_rows"] = np.array(own, dtype=np.int64)
+            spec["node_cols"] = np.array([node_lookup[node_ids[k]] for k in own], dtype=np.int64)
+            spec["link_rows"] = np.array([local_link[self.link_ids[k]] for k in spec["links"]], dtype=np.int64)
+
+    @staticmethod
+    def _receive(conn, expected):
+        msg = conn.recv()
+        if msg[0] == "error":
+            raise RuntimeError(f"partition worker failed: {msg[1]}")
+        if msg[0] != expected:
+            raise RuntimeError(f"partition worker sent {msg[0]!r}, expected {expected!r}")
+        return msg
+
+    @property
+    def boundary_size(self):
+        return len(self.boundary_ids)
+
+    def _exchange(self, t, x):
+        """Solve every part with ghost heads from ``x``; the boundary heads they return."""
+        for conn, spec in zip(self._conns, self._specs):
+            conn.send(("solve", t, x[spec["ghost_pos"]]))
+        out = np.empty_like(x)
+        for conn, spec in zip(self._conns, self._specs):
+            out[spec["boundary_pos"]] = self._receive(conn, "solved")[1]
+        return out
+
+    def solve(self, times=(0,), tol=1e-5, max_rounds=1000, memory=50):
+        """
+        Hydraulic snapshots at ``times`` (seconds into the pattern cycle).
+
+        Parameters
+        ----------
+        tol : float
+            Convergence: largest mismatch between a boundary head and the
+            ghost head the other parts used (model head units).
+        max_rounds : int
+            Exchange rounds per time; a time that does not converge within
+            them raises ``RuntimeError``.
+        memory : int
+            Anderson acceleration depth (0 = plain block-Jacobi exchange).
+
+        Returns
+        -------
+        PartitionedResult
+        """
+        times = list(times)
+        n, m = len(self.node_ids), len(self.link_ids)
+        heads = np.empty((len(times), n))
+        pressures = np.empty((len(times), n))
+        flows = np.empty((len(times), m))
+        iterations, residuals = [], []
+        for row, t in enumerate(times):
+            x, rounds, mismatch = self._iterate(t, self._x.copy(), tol, max_rounds, memory)
+            self._x = x
+            iterations.append(rounds)
+            residuals.append(mismatch)
+            # The last round solved every part at x; gather their full state
+            for conn in self._conns:
+                conn.send(("result",))
+            for conn, spec in zip(self._conns, self._specs):
+                _, h, p, q = self._receive(conn, "result")
+                heads[row, spec["node_cols"]] = h[spec["node_rows"]]
+                pressures[row, spec["node_cols"]] = p[spec["node_rows"]]
+                flows[row, spec["links"]] = q[spec["link_rows"]]
+        return PartitionedResult(times, self.node_ids, self.link_ids, heads, pressures, flows,
+                                 iterations, residuals)
+
+    def _iterate(self, t, x, tol, max_rounds, memory):
+        # Fixed point x = F(x) (block Jacobi over the parts) with Anderson
+        # acceleration on g = F(x) - x. Parts without a source only pin their
+        # heads through the boundary, so a small mismatch g can hide a large
+        # error; the accelerated step estimates the error and must be small too.
+        dx_hist, dg_hist = [], []
+        x_prev = g_prev = None
+        for rounds in range(1, max_rounds + 1):
+            g = self._exchange(t, x) - x
+            mismatch = float(np.abs(g).max(initial=0.0))
+            if x_prev is not None and memory:
+                dx_hist.append(x - x_prev)
+                dg_hist.append(g - g_prev)
+                del dx_hist[:-memory], dg_hist[:-memory]
+            x_prev, g_prev = x, g
+            if dg_hist:
+                dg = np.column_stack(dg_hist)
+                gamma = np.linalg.lstsq(dg, g, rcond=None)[0]
+                x_next = x + g - (np.column_stack(dx_hist) + dg) @ gamma
+            else:
+                x_next = x + g
+            if mismatch <= tol and np.abs(x_next - x).max(initial=0.0) <= tol:
+                return x, rounds, mismatch
+            x = x_next
+        raise RuntimeError(f"boundary heads did not converge at t={t} s within {max_rounds} rounds "
+                           f"(largest mismatch {mismatch:.3g})")
+
+    # ------------------------------------------------------------------
+    def close(self):
+        for conn in self._conns:
+            try:
+                conn.send(("close",))
+            except (OSError, BrokenPipeError):
+                pass
+        for proc in self._procs:
+            proc.join(timeout=10)
+            if proc.is_alive():
+                proc.terminate()
+        for conn in self._conns:
+            conn.close()
+        self._procs, self._conns = [], []
+        if self._own_workdir and self.workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+            self.workdir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return (f"PartitionedModel({self.inp_path!r}, parts={self.parts}, "
+                f"boundary={self.boundary_size}, sizes={self.part_sizes})")
+
+
+def partitioned_solve(inp_path, parts=None, times=(0,), **kwargs):
+    """
+    One-shot partitioned snapshot solve; ``kwargs`` go to ``PartitionedModel``
+    (``total_threads``, ``openmp``, ``workdir``, ``accuracy``) and ``solve``
+    (``tol``, ``max_rounds``, ``memory``).
+    """
+    solve_keys = ("tol", "max_rounds", "memory")
+    solve_kwargs = {k: kwargs.pop(k) for k in solve_keys if k in kwargs}
+    with PartitionedModel(inp_path, parts=parts, **kwargs) as pm:
+        return pm.solve(times, **solve_kwargs)
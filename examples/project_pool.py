@@ -0,0 +1,315 @@
+"""
+EPANET-Turbo Project Pool
+=========================
+
+Thread-safe pool of resident ``ResidentProject`` handles for services that
+serve many models (e.g. one per DMA) from one process.
+
+* Keyed by the SHA-256 of the INP content, so renamed or copied files
+  share handles and an edited file gets fresh ones.
+* Idle handles are evicted least-recently-used first once the estimated
+  resident size exceeds ``memory_budget`` (checked-out handles are never
+  evicted).
+* Every change made through the project API is undone on check-in
+  (``ResidentProject.reset``), so the next borrower starts from the INP state.
+* ``metrics()`` reports hits, misses, evictions and open latency.
+
+Usage:
+------
+    from project_pool import ProjectPool
+
+    pool = ProjectPool(memory_budget=4 * 1024**3)
+
+    with pool.project("dma_017.inp") as proj:          # checkout ... checkin
+        proj.set_demand_multiplier(1.2)
+        res = run_simulation(proj, nodes=sensors)
+
+    print(pool.metrics())
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    from . import turbo_kernel as tk
+except ImportError:
+    import turbo_kernel as tk
+
+# Resident size estimate when RSS cannot be measured (bytes per INP byte,
+# measured with hydraulics open on 2k-40k node grids: 8-14x)
+FALLBACK_BYTES_PER_INP_BYTE = 10
+# Paths whose content hash is remembered (least recently used dropped first)
+DIGEST_CACHE_SIZE = 1024
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _Entry:
+    __slots__ = ("key", "project", "nbytes", "last_used")
+
+    def __init__(self, key, project, nbytes):
+        self.key = key
+        self.project = project
+        self.nbytes = nbytes
+        self.last_used = time.monotonic()
+
+
+class ProjectPool:
+    def __init__(self, memory_budget=None, max_per_model=None, openmp=True):
+        """
+        Parameters
+        ----------
+        memory_budget : int, optional
+            Soft limit (bytes) for the estimated size of all resident
+            handles. Idle handles are evicted LRU-first above it.
+        max_per_model : int, optional
+            Maximum concurrent handles per model; further checkouts wait.
+        openmp : bool
+            Kernel flavour passed to ``ResidentProject``.
+        """
+        self.memory_budget = memory_budget
+        self.max_per_model = max_per_model
+        self.openmp = openmp
+
+        self._cond = threading.Condition()
+        self._open_lock = threading.Lock()       # serialises opens for RSS accounting
+        self._idle = OrderedDict()               # id(entry) -> entry, oldest first
+        self._out = {}                           # id(project) -> entry
+        self._count = {}                         # key -> handles (idle + out + opening)
+        self._digests = OrderedDict()            # path -> (mtime, size, key), oldest first
+        self._resident = 0
+        self._closed = False
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "discarded": 0, "waits": 0,
+                       "open_seconds_total": 0.0, "open_seconds_max": 0.0}
+
+    # ------------------------------------------------------------------
+    def key_for(self, inp_path):
+        """Content hash of an INP file (cached per path, mtime and size)."""
+        path = os.path.realpath(inp_path)
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._cond:
+            cached = self._digests.get(path)
+            if cached is not None and cached[:2] == stamp:
+                self._digests.move_to_end(path)
+                return cached[2]
+        # Hash outside the lock; one entry per path, so an edited file
+        # replaces its old hash
+        key = file_digest(path)
+        with self._cond:
+            self._digests[path] = stamp + (key,)
+            self._digests.move_to_end(path)
+            while len(self._digests) > DIGEST_CACHE_SIZE:
+                self._digests.popitem(last=False)
+        return key
+
+    def checkout(self, inp_path, timeout=None):
+        """
+        Borrow a handle for ``inp_path``; return it with ``checkin``.
+
+        Raises
+        ------
+        TimeoutError
+            When ``max_per_model`` handles are busy for longer than ``timeout``.
+        """
+        key = self.key_for(inp_path)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("pool is closed")
+                entry = self._take_idle(key)
+                if entry is not None:
+                    self._stats["hits"] += 1
+                    self._out[id(entry.project)] = entry
+                    return entry.project
+                if self.max_per_model is None or self._count.get(key, 0) < self.max_per_model:
+                    self._count[key] = self._count.get(key, 0) + 1
+                    self._stats["misses"] += 1
+                    break
+                self._stats["waits"] += 1
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"no free handle for {inp_path} within {timeout}s")
+                self._cond.wait(remaining)
+
+        try:
+            entry = self._open(key, inp_path)
+        except BaseException:
+            with self._cond:
+                self._release_slot(key)
+            raise
+        with self._cond:
+            self._out[id(entry.project)] = entry
+            self._resident += entry.nbytes
+            victims = self._evict()
+        self._close_all(victims)
+        return entry.project
+
+    def checkin(self, project):
+        """Return a borrowed handle; its tracked changes are reset first."""
+        with self._cond:
+            entry = self._out.pop(id(project), None)
+        if entry is None:
+            raise ValueError("project was not checked out from this pool")
+        try:
+            project.reset()
+        except Exception:
+            self._drop(entry)
+            raise
+        with self._cond:
+            if self._closed:
+                victims = [entry]
+                self._resident -= entry.nbytes
+                self._release_slot(entry.key)
+            else:
+                entry.last_used = time.monotonic()
+                self._idle[id(entry)] = entry
+                victims = self._evict()
+                self._cond.notify_all()
+        self._close_all(victims)
+
+    def discard(self, project):
+        """Close a borrowed handle instead of returning it (e.g. after a kernel error)."""
+        with self._cond:
+            entry = self._out.pop(id(project), None)
+        if entry is None:
+            raise ValueError("project was not checked out from this pool")
+        self._drop(entry)
+
+    @contextmanager
+    def project(self, inp_path, timeout=None):
+        """``with pool.project(path) as proj:`` - checkout and guaranteed checkin."""
+        proj = self.checkout(inp_path, timeout=timeout)
+        try:
+            yield proj
+        except tk.EPANETError:
+            self.discard(proj)
+            raise
+        except BaseException:
+            self.checkin(proj)
+            raise
+        else:
+            self.checkin(proj)
+
+    # ------------------------------------------------------------------
+    def metrics(self):
+        """Snapshot of the pool counters."""
+        with self._cond:
+            stats = dict(self._stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats.update(
+                hit_rate=stats["hits"] / lookups if lookups else 0.0,
+                open_seconds_mean=stats["open_seconds_total"] / stats["misses"] if stats["misses"] else 0.0,
+                resident_bytes=self._resident,
+                memory_budget=self.memory_budget,
+                idle=len(self._idle),
+                checked_out=len(self._out),
+                models=sum(1 for n in self._count.values() if n),
+            )
+        return stats
+
+    def clear(self):
+        """Close all idle handles."""
+        with self._cond:
+            victims = list(self._idle.values())
+            self._idle.clear()
+            for entry in victims:
+                self._resident -= entry.nbytes
+                self._release_slot(entry.key)
+        self._close_all(victims)
+
+    def close(self):
+        """Close idle handles now; borrowed handles are closed on checkin."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        m = self.metrics()
+        return (f"ProjectPool(models={m['models']}, idle={m['idle']}, out={m['checked_out']}, "
+                f"resident={m['resident_bytes'] / 1e6:.1f} MB)")
+
+    # ------------------------------------------------------------------
+    def _take_idle(self, key):
+        # Most recently used idle handle of this model
+        for eid in reversed(self._idle):
+            entry = self._idle[eid]
+            if entry.key == key:
+                del self._idle[eid]
+                return entry
+        return None
+
+    def _open(self, key, inp_path):
+        with self._open_lock:
+            before = _rss_bytes()
+            t0 = time.perf_counter()
+            project = tk.ResidentProject(inp_path, openmp=self.openmp, track_changes=True)
+            elapsed = time.perf_counter() - t0
+            after = _rss_bytes()
+        estimate = os.path.getsize(inp_path) * FALLBACK_BYTES_PER_INP_BYTE
+        measured = after - before if before is not None and after is not None else 0
+        with self._cond:
+            self._stats["open_seconds_total"] += elapsed
+            self._stats["open_seconds_max"] = max(self._stats["open_seconds_max"], elapsed)
+        # The solver allocates more on first use, so never go below the estimate
+        return _Entry(key, project, max(measured, estimate))
+
+    def _evict(self):
+        # Caller holds the lock; returns entries to close outside it
+        victims = []
+        if self.memory_budget is None:
+            return victims
+        while self._resident > self.memory_budget and self._idle:
+            _, entry = self._idle.popitem(last=False)
+            self._resident -= entry.nbytes
+            self._release_slot(entry.key)
+            self._stats["evictions"] += 1
+            victims.append(entry)
+        return victims
+
+    def _release_slot(self, key):
+        self._count[key] -= 1
+        if not self._count[key]:
+            del self._count[key]
+        self._cond.notify_all()
+
+    def _drop(self, entry):
+        with self._cond:
+            self._resident -= entry.nbytes
+            self._release_slot(entry.key)
+            self._stats["discarded"] += 1
+        self._close_all([entry])
+
+    @staticmethod
+    def _close_all(entries):
+        for entry in entries:
+            try:
+                entry.project.close()
+            except Exception:
+                pass
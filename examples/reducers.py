@@ -0,0 +1,303 @@
+"""
+EPANET-Turbo Streaming Reducers
+===============================
+
+Online per-element statistics updated on every recorded step with
+vectorised NumPy, so compliance figures (minimum pressure, time below a
+threshold, maximum velocity, percentiles) can be produced without writing
+or rescanning the full Protocol V2 stream. Memory is O(elements), not
+O(elements x steps).
+
+Percentiles use the P-square estimator (Jain & Chlamtac, 1985): five
+markers per element and quantile, updated in lock-step for all elements.
+
+Usage:
+------
+    from reducers import MinReducer, MaxReducer, ExceedanceReducer, PercentileReducer
+    from turbo_simulation import run_simulation
+
+    res = run_simulation("network.inp", record=False, reducers=[
+        MinReducer("pressure"),
+        ExceedanceReducer("pressure", threshold=20.0, below=True),
+        MaxReducer("velocity"),
+        PercentileReducer("pressure", q=[5, 50, 95]),
+    ])
+    res.reductions["min_pressure"]           # (N,) array; percentiles as "p95_pressure"
+    res.reductions_frame("node")             # Polars: id + one column per statistic
+"""
+
+import numpy as np
+
+try:
+    from . import turbo_kernel as tk
+except ImportError:
+    import turbo_kernel as tk
+
+# channel -> (element kind, kernel property)
+REDUCER_CHANNELS = {
+    "pressure": ("node", tk.EN_PRESSURE),
+    "head": ("node", tk.EN_HEAD),
+    "demand": ("node", tk.EN_DEMAND),
+    "quality": ("node", tk.EN_QUALITY),
+    "flow": ("link", tk.EN_FLOW),
+    "velocity": ("link", tk.EN_VELOCITY),
+    "headloss": ("link", tk.EN_HEADLOSS),
+}
+
+
+class Reducer:
+    """
+    Base class: ``start`` once, ``update`` per recorded step, ``result`` at the end.
+
+    Subclasses implement the statistic; ``update`` receives the step's
+    float64 buffer (one value per selected element), which is reused by the
+    caller and must not be kept.
+    """
+
+    stat = "reducer"
+
+    def __init__(self, channel="pressure", name=None):
+        if channel not in REDUCER_CHANNELS:
+            raise ValueError(f"unknown channel {channel!r}, expected one of {sorted(REDUCER_CHANNELS)}")
+        self.channel = channel
+        self.kind, self.prop = REDUCER_CHANNELS[channel]
+        self.name = name or f"{self.stat}_{channel}"
+        self.n_steps = 0
+
+    def start(self, n_elements, interval):
+        """Allocate state for ``n_elements`` series sampled every ``interval`` seconds."""
+        self.n_elements = n_elements
+        self.interval = interval
+        self.n_steps = 0
+
+    def update(self, t, values):
+        self.n_steps += 1
+
+    def result(self):
+        raise NotImplementedError
+
+    def labels(self):
+        """Result keys; one per row when ``result`` is 2-D."""
+        return [self.name]
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r}, steps={self.n_steps})"
+
+
+class MinReducer(Reducer):
+    stat = "min"
+
+    def start(self, n_elements, interval):
+        super().start(n_elements, interval)
+        self._acc = np.full(n_elements, np.inf)
+
+    def update(self, t, values):
+        np.minimum(self._acc, values, out=self._acc)
+        self.n_steps += 1
+
+    def result(self):
+        return self._acc
+
+
+class MaxReducer(Reducer):
+    stat = "max"
+
+    def start(self, n_elements, interval):
+        super().start(n_elements, interval)
+        self._acc = np.full(n_elements, -np.inf)
+
+    def update(self, t, values):
+        np.maximum(self._acc, values, out=self._acc)
+        self.n_steps += 1
+
+    def result(self):
+        return self._acc
+
+
+class MeanReducer(Reducer):
+    stat = "mean"
+
+    def start(self, n_elements, interval):
+        super().start(n_elements, interval)
+        self._acc = np.zeros(n_elements)
+
+    def update(self, t, values):
+        self._acc += values
+        self.n_steps += 1
+
+    def result(self):
+        return self._acc / max(self.n_steps, 1)
+
+
+class ExceedanceReducer(Reducer):
+    stat = "exceed"
+
+    def __init__(self, channel="pressure", threshold=0.0, below=True, name=None):
+        """
+        Time (s) each element spends below (``below=True``) or above a threshold.
+
+        Every recorded step counts for one sampling interval; ``counts``
+        holds the number of steps.
+        """
+        self.threshold = float(threshold)
+        self.below = below
+        default = f"{'below' if below else 'above'}_{threshold:g}_{channel}"
+        super().__init__(channel, name or default)
+
+    def start(self, n_elements, interval):
+        super().start(n_elements, interval)
+        self.counts = np.zeros(n_elements, dtype=np.int64)
+        self._mask = np.empty(n_elements, dtype=bool)
+
+    def update(self, t, values):
+        if self.below:
+            np.less(values, self.threshold, out=self._mask)
+        else:
+            np.greater(values, self.threshold, out=self._mask)
+        self.counts += self._mask
+        self.n_steps += 1
+
+    def result(self):
+        return self.counts * float(self.interval)
+
+
+class PercentileReducer(Reducer):
+    stat = "p"
+
+    def __init__(self, channel="pressure", q=50, name=None):
+        """
+        Streaming percentile estimate(s) with the P-square algorithm.
+
+        Parameters
+        ----------
+        q : float or list of float
+            Percentile(s) in [0, 100]. ``result`` is (N,) for a scalar,
+            (len(q), N) for a list.
+        """
+        self.scalar = np.ndim(q) == 0
+        self.q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if np.any((self.q < 0) | (self.q > 100)):
+            raise ValueError("percentiles must be within [0, 100]")
+        self._custom_name = name is not None
+        label = "_".join(f"{v:g}" for v in self.q)
+        super().__init__(channel, name or f"p{label}_{channel}")
+
+    def labels(self):
+        if self.scalar:
+            return [self.name]
+        if self._custom_name:
+            return [f"{self.name}_{v:g}" for v in self.q]
+        return [f"p{v:g}_{self.channel}" for v in self.q]
+
+    def start(self, n_elements, interval):
+        super().start(n_elements, interval)
+        p = self.q / 100.0
+        k = len(p)
+        self._heights = np.empty((k, 5, n_elements))
+        self._pos = np.tile(np.arange(5, dtype=np.float64)[None, :, None], (k, 1, n_elements))
+        self._desired = np.stack([np.zeros_like(p), 2 * p, 4 * p, 2 + 2 * p, np.full_like(p, 4.0)], axis=1)
+        self._incr = np.stack([np.zeros_like(p), p / 2, p, (1 + p) / 2, np.ones_like(p)], axis=1)
+        self._first = np.empty((5, n_elements))
+
+    def update(self, t, values):
+        if self.n_steps < 5:
+            self._first[self.n_steps] = values
+            self.n_steps += 1
+            if self.n_steps == 5:
+                self._heights[:] = np.sort(self._first, axis=0)[None]
+            return
+        self.n_steps += 1
+        for j in range(len(self.q)):
+            self._update_one(self._heights[j], self._pos[j], j, values)
+
+    def _update_one(self, q, n, j, x):
+        # Extend the extreme markers, then shift positions above the cell of x
+        np.minimum(q[0], x, out=q[0])
+        np.maximum(q[4], x, out=q[4])
+        n[1:] += x[None, :] < q[1:]
+        n[4] = self.n_steps - 1
+        self._desired[j] += self._incr[j]
+        nd = self._desired[j]
+
+        for i in (1, 2, 3):
+            d = nd[i] - n[i]
+            up = (d >= 1) & (n[i + 1] - n[i] > 1)
+            down = (d <= -1) & (n[i - 1] - n[i] < -1)
+            move = up | down
+            if not move.any():
+                continue
+            s = np.where(up, 1.0, -1.0)
+            span = n[i + 1] - n[i - 1]
+            right = n[i + 1] - n[i]
+            left = n[i] - n[i - 1]
+            parabolic = q[i] + s / span * (
+                (left + s) * (q[i + 1] - q[i]) / right + (right - s) * (q[i] - q[i - 1]) / left
+            )
+            q_adj = np.where(up, q[i + 1], q[i - 1])
+            n_adj = np.where(up, n[i + 1], n[i - 1])
+            linear = q[i] + s * (q_adj - q[i]) / (n_adj - n[i])
+            ok = (q[i - 1] < parabolic) & (parabolic < q[i + 1])
+            new = np.where(ok, parabolic, linear)
+            q[i] = np.where(move, new, q[i])
+            n[i] += np.where(move, s, 0.0)
+
+    def result(self):
+        if self.n_steps == 0:
+            out = np.full((len(self.q), getattr(self, "n_elements", 0)), np.nan)
+        elif self.n_steps < 5:
+            out = np.percentile(self._first[:self.n_steps], self.q, axis=0)
+        else:
+            out = self._heights[:, 2, :].copy()
+        return out[0] if self.scalar else out
+
+
+class ReducerSet:
+    def __init__(self, reducers):
+        """Feeds a group of reducers, extracting every extra channel once per step."""
+        self.reducers = list(reducers)
+        names = [label for r in self.reducers for label in r.labels()]
+        duplicates = {n for n in names if names.count(n) > 1}
+        if duplicates:
+            raise ValueError(f"duplicate reducer names: {sorted(duplicates)}")
+        self.channels = list(dict.fromkeys(r.channel for r in self.reducers))
+        self._buffers = {}
+
+    def start(self, n_nodes, n_links, interval):
+        sizes = {"node": n_nodes, "link": n_links}
+        for r in self.reducers:
+            r.start(sizes[r.kind], interval)
+        self._buffers = {c: np.empty(sizes[REDUCER_CHANNELS[c][0]]) for c in self.channels}
+
+    def update(self, proj, t, node_idx=None, link_idx=None, known=None):
+        """
+        Extract the needed channels for the current step and update all reducers.
+
+        ``known`` maps channel names to buffers the caller already filled
+        (e.g. the recorded pressures/flows), which are used as-is.
+        """
+        known = known or {}
+        for channel in self.channels:
+            values = known.get(channel)
+            if values is None:
+                kind, prop = REDUCER_CHANNELS[channel]
+                values = self._buffers[channel]
+                if kind == "node":
+                    proj.get_node_values(prop, out=values, indices=node_idx)
+                else:
+                    proj.get_link_values(prop, out=values, indices=link_idx)
+            for r in self.reducers:
+                if r.channel == channel:
+                    r.update(t, values)
+
+    def results(self):
+        out = {}
+        for r in self.reducers:
+            values, labels = r.result(), r.labels()
+            if len(labels) == 1:
+                out[labels[0]] = values
+            else:
+                out.update(zip(labels, values))
+        return out
+
+    def kinds(self):
+        return {label: r.kind for r in self.reducers for label in r.labels()}
@@ -0,0 +1,458 @@
+"""
+EPANET-Turbo SCADA Ingestion
+============================
+
+Turns SCADA series (tank levels, pump states, reservoir heads, zone
+demands, ...) into boundary conditions of a resident project, without
+writing INP patterns or controls:
+
+1. ``read_scada`` scans CSV / Parquet files with Polars, in long
+   (``tag, time, value``) or wide (``time, <tag>, <tag>, ...``) layout,
+   keeping only the mapped tags.
+2. ``boundary_conditions`` resamples every tag onto the hydraulic time
+   grid in one vectorised pass and maps tags to kernel indices.
+3. The ``BoundaryConditions`` are pushed with one ``ENT_set_node_values`` /
+   ``ENT_set_link_values`` call per (object, property) group whenever the
+   run enters a new grid interval (``run_simulation(..., boundaries=bc)``),
+   or installed once as time patterns (``install_patterns``) for demands
+   and reservoir heads.
+
+Tag table: one row per (tag, element) with columns ``tag``, ``element``
+(node / link ID), ``kind`` (see ``KINDS``) and optional ``scale`` and
+``offset`` (pushed value = raw * scale + offset). A demand tag mapped to
+several junctions without a scale is a zone demand: it is split in
+proportion to the junctions' base demands.
+
+Usage:
+------
+    import polars as pl
+    from scada_ingest import boundary_conditions, read_scada
+    from turbo_simulation import run_simulation
+
+    tags = pl.DataFrame({
+        "tag":     ["T1_LVL", "P10_RUN", "LAKE_HD", "ZONE_A", "ZONE_A"],
+        "element": ["1", "10", "Lake", "15", "35"],
+        "kind":    ["tank_level", "pump_status", "reservoir_head", "demand", "demand"],
+    })
+    series = read_scada("scada_june.parquet", tags=tags["tag"], start="2024-06-01 00:00")
+    bc = boundary_conditions(proj, series, tags)
+    res = run_simulation(proj, boundaries=bc, nodes=sensors)
+"""
+
+import os
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+
+try:
+    from .turbo_kernel import (EN_BASEDEMAND, EN_DURATION, EN_ELEVATION, EN_FCV, EN_GPV, EN_HYDSTEP, EN_JUNCTION,
+                               EN_PATTERN, EN_PATTERNSTART, EN_PATTERNSTEP, EN_PBV, EN_PRV, EN_PSV, EN_PUMP,
+                               EN_RESERVOIR, EN_SETTING, EN_STATUS, EN_TANK, EN_TANKLEVEL, EN_TCV)
+except ImportError:
+    from turbo_kernel import (EN_BASEDEMAND, EN_DURATION, EN_ELEVATION, EN_FCV, EN_GPV, EN_HYDSTEP, EN_JUNCTION,
+                              EN_PATTERN, EN_PATTERNSTART, EN_PATTERNSTEP, EN_PBV, EN_PRV, EN_PSV, EN_PUMP,
+                              EN_RESERVOIR, EN_SETTING, EN_STATUS, EN_TANK, EN_TANKLEVEL, EN_TCV)
+
+VALVE_TYPES = (EN_PRV, EN_PSV, EN_PBV, EN_FCV, EN_TCV, EN_GPV)
+
+# kind -> (object, property, allowed element types or None, resampling method)
+#   "last": latest sample at or before the grid time (levels, heads, states)
+#   "mean": mean over the grid interval, held through empty ones (rates)
+KINDS = {
+    "tank_level": ("node", EN_TANKLEVEL, (EN_TANK,), "last"),
+    "reservoir_head": ("node", EN_ELEVATION, (EN_RESERVOIR,), "last"),
+    "demand": ("node", EN_BASEDEMAND, (EN_JUNCTION,), "mean"),
+    "pump_status": ("link", EN_STATUS, (EN_PUMP,), "last"),
+    "pump_speed": ("link", EN_SETTING, (EN_PUMP,), "last"),
+    "valve_setting": ("link", EN_SETTING, VALVE_TYPES, "last"),
+    "link_status": ("link", EN_STATUS, None, "last"),
+}
+# Kinds whose element pattern is replaced by FLAT_PATTERN so the pushed value
+# is absolute, and which ``install_patterns`` can turn into time patterns
+PATTERN_KINDS = ("demand", "reservoir_head")
+FLAT_PATTERN = "SCADA_FLAT"
+# State words accepted as values (anything else must be numeric)
+STATE_KEYWORDS = {"ON": 1.0, "OFF": 0.0, "OPEN": 1.0, "CLOSED": 0.0, "RUN": 1.0, "STOP": 0.0,
+                  "TRUE": 1.0, "FALSE": 0.0}
+
+TAG_COLUMNS = ("tag", "element", "kind", "scale", "offset")
+
+
+def _scan(source):
+    if isinstance(source, pl.LazyFrame):
+        return source
+    if isinstance(source, pl.DataFrame):
+        return source.lazy()
+    paths = [source] if isinstance(source, (str, os.PathLike)) else list(source)
+    frames = []
+    for path in map(os.fspath, paths):
+        if path.lower().endswith((".parquet", ".pq")):
+            frames.append(pl.scan_parquet(path))
+        else:
+            frames.append(pl.scan_csv(path, try_parse_dates=True))
+    return frames[0] if len(frames) == 1 else pl.concat(frames, how="diagonal_relaxed")
+
+
+def _as_float(name, dtype):
+    column = pl.col(name)
+    if dtype == pl.Utf8:
+        text = column.str.strip_chars()
+        keyword = text.str.to_uppercase().replace_strict(STATE_KEYWORDS, default=None, return_dtype=pl.Float64)
+        return text.cast(pl.Float64, strict=False).fill_null(keyword)
+    return column.cast(pl.Float64)
+
+
+def read_scada(source, tags=None, start=None, time="time", tag="tag", value="value"):
+    """
+    Read SCADA series into a long frame of seconds since ``start``.
+
+    Parameters
+    ----------
+    source : str, list of str, DataFrame or LazyFrame
+        CSV / Parquet path(s) (by extension) or an in-memory frame. Files
+        are scanned lazily, so only the wanted tags (rows in long layout,
+        columns in wide layout) are materialised.
+    tags : iterable of str, optional
+        Keep only these tags.
+    start : datetime or str, optional
+        Timestamp of simulation time 0. Defaults to the first timestamp;
+        numeric time columns are taken as seconds and ``start`` is
+        subtracted when it is a number.
+    time, tag, value : str
+        Column names. Without ``tag`` and ``value`` columns the source is
+        read as wide (one column per tag).
+
+    Returns
+    -------
+    DataFrame
+        Columns ``tag`` (Utf8), ``t`` (Float64, s) and ``value``
+        (Float64; state words such as ON/OFF/OPEN/CLOSED become 1/0),
+        sorted by tag and time, without null values.
+    """
+    lf = _scan(source)
+    schema = lf.collect_schema()
+    if time not in schema:
+        raise ValueError(f"no {time!r} column in SCADA source (columns: {list(schema)[:10]})")
+    wanted = None if tags is None else [str(t) for t in tags]
+    if tag in schema and value in schema:
+        lf = lf.select(pl.col(tag).cast(pl.Utf8).alias("tag"), pl.col(time).alias("time"),
+                       _as_float(value, schema[value]).alias("value"))
+        if wanted is not None:
+            lf = lf.filter(pl.col("tag").is_in(wanted))
+    else:
+        columns = [c for c in schema if c != time]
+        if wanted is not None:
+            keep = set(wanted)
+            columns = [c for c in columns if c in keep]
+        lf = (lf.select(pl.col(time).alias("time"), *(_as_float(c, schema[c]).alias(c) for c in columns))
+              .unpivot(index="time", on=columns, variable_name="tag", value_name="value"))
+
+    dtype = schema[time]
+    stamps = pl.col("time")
+    if dtype == pl.Utf8:
+        stamps = stamps.str.to_datetime()
+        dtype = pl.Datetime("us")
+    if dtype.is_temporal():
+        if start is None:
+            start = lf.select(stamps.min()).collect().item()
+        elif isinstance(start, str):
+            start = datetime.fromisoformat(start)
+        seconds = (stamps - pl.lit(start).cast(dtype)).dt.total_microseconds() / 1e6
+    else:
+        seconds = stamps.cast(pl.Float64) - float(start or 0)
+    return (lf.select("tag", seconds.alias("t"), "value")
+            .drop_nulls()
+            .sort("tag", "t")
+            .collect())
+
+
+def _fill(matrix, backward=False):
+    # Forward (or backward) fill NaNs along axis 1
+    if backward:
+        return _fill(matrix[:, ::-1])[:, ::-1]
+    pos = np.where(np.isnan(matrix), 0, np.arange(matrix.shape[1]))
+    np.maximum.accumulate(pos, axis=1, out=pos)
+    return np.take_along_axis(matrix, pos, axis=1)
+
+
+def resample(series, tags, methods, times):
+    """
+    Resample long-format series onto a time grid.
+
+    Parameters
+    ----------
+    series : DataFrame
+        ``tag``, ``t``, ``value`` (see ``read_scada``).
+    tags : list of str
+        Output column order.
+    methods : list of str
+        ``"last"`` or ``"mean"`` per tag (see ``KINDS``).
+    times : ndarray
+        Increasing grid times (s); row k covers ``[times[k], times[k+1])``.
+
+    Returns
+    -------
+    ndarray
+        (T, len(tags)) float64. Gaps before the first sample are filled
+        with it; tags without any sample are all-NaN.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    n, n_times = len(tags), times.size
+    columns = pl.DataFrame({"tag": list(tags), "col": np.arange(n, dtype=np.int64)})
+    data = (series.lazy().join(columns.lazy(), on="tag")
+            .select("col", "t", "value").sort("col", "t").collect())
+    col, t, value = (data[name].to_numpy() for name in ("col", "t", "value"))
+
+    # Latest sample at or before each grid time: bucket every sample under
+    # the first grid time >= t, keep the last one per bucket, then carry it
+    bucket = np.searchsorted(times, t, side="left")
+    inside = bucket < n_times
+    key = col[inside] * n_times + bucket[inside]
+    last = np.full(n * n_times, np.nan)
+    last[key] = value[inside]                    # sorted by time: the last write wins
+    matrix = _fill(last.reshape(n, n_times))
+
+    mean_cols = np.flatnonzero(np.asarray(methods) == "mean")
+    if mean_cols.size:
+        # Interval means; empty intervals keep the latest sample
+        interval = np.searchsorted(times, t, side="right") - 1
+        end = times[-1] + (times[-1] - times[-2] if n_times > 1 else 1.0)
+        inside = (interval >= 0) & (t < end)
+        key = col[inside] * n_times + interval[inside]
+        counts = np.bincount(key, minlength=n * n_times).reshape(n, n_times)
+        sums = np.bincount(key, weights=value[inside], minlength=n * n_times).reshape(n, n_times)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+        matrix[mean_cols] = np.where(counts[mean_cols] > 0, means[mean_cols], matrix[mean_cols])
+    return np.ascontiguousarray(_fill(matrix, backward=True).T)
+
+
+class BoundaryConditions:
+    """
+    Time-gridded values pushed into a resident project.
+
+    Attributes
+    ----------
+    times : ndarray of int64
+        Grid times (s); row k holds from ``times[k]`` to ``times[k+1]``.
+    columns : DataFrame
+        One row per pushed value: ``tag``, ``element``, ``kind``,
+        ``object``, ``property``, ``index`` (1-based), ``scale``, ``offset``.
+    values : ndarray
+        (T, n_columns) float64 values in model units.
+    missing : list of str
+        Mapped tags without samples in the window (not pushed).
+    """
+
+    def __init__(self, times, columns, values, missing=()):
+        self.times = np.asarray(times, dtype=np.int64)
+        self.columns = columns
+        self.values = values
+        self.missing = list(missing)
+        self._row = None
+        self._groups = []
+        keys = columns.select("object", "property").unique(maintain_order=True).iter_rows()
+        for obj, prop in keys:
+            cols = columns.with_row_index("col").filter((pl.col("object") == obj) & (pl.col("property") == prop))
+            pos = cols["col"].to_numpy()
+            self._groups.append((obj, prop, cols["index"].to_numpy().astype(np.int32),
+                                 np.ascontiguousarray(values[:, pos])))
+
+    @property
+    def n_columns(self):
+        return self.columns.height
+
+    def row(self, t):
+        """Grid row in force at simulation time ``t``."""
+        return int(np.clip(np.searchsorted(self.times, t, side="right") - 1, 0, self.times.size - 1))
+
+    def start(self, proj):
+        """
+        Prepare ``proj`` for a run: demand and reservoir elements get a
+        flat pattern, so their pushed values are absolute.
+        """
+        self._row = None
+        pattern_cols = self.columns.filter(pl.col("kind").is_in(PATTERN_KINDS))
+        if pattern_cols.height:
+            # Pattern 0 would mean the default demand pattern, not "none"
+            flat = proj.set_pattern(FLAT_PATTERN, [1.0])
+            proj.set_node_values(pattern_cols["index"].to_numpy(), EN_PATTERN, float(flat))
+
+    def apply(self, proj, row):
+        """Push grid row ``row``: one bulk setter call per (object, property)."""
+        for obj, prop, idx, block in self._groups:
+            setter = proj.set_node_values if obj == "node" else proj.set_link_values
+            setter(idx, prop, block[row])
+        self._row = row
+
+    def update(self, proj, t):
+        """
+        Push the row in force at ``t`` if the run entered a new grid
+        interval; returns whether anything was pushed.
+        """
+        row = self.row(t)
+        if row == self._row:
+            return False
+        self.apply(proj, row)
+        return True
+
+    def install_patterns(self, proj, prefix="SCADA_"):
+        """
+        Install demand and reservoir-head columns as time patterns.
+
+        Each element gets its own pattern (``{prefix}{index}``); demands
+        get base demand 1, reservoirs keep their elevation (1 when it is
+        0) with the head expressed as multipliers. The grid step must equal
+        the model's pattern step. Patterns need no per-step work and also
+        hold for ``EN_solveH``, quality runs and the batch runner.
+
+        Returns
+        -------
+        BoundaryConditions
+            The remaining (per-step) columns, e.g. tank levels and pumps.
+        """
+        step = int(self.times[1] - self.times[0]) if self.times.size > 1 else None
+        pattern_step = proj.get_time_param(EN_PATTERNSTEP)
+        if step is not None and step != pattern_step:
+            raise ValueError(f"grid step {step} s differs from the pattern step {pattern_step} s; "
+                             f"build the conditions with step={pattern_step}")
+        is_pattern = self.columns["kind"].is_in(PATTERN_KINDS).to_numpy()
+        cols = self.columns.filter(pl.Series(is_pattern))
+        if cols.height:
+            # Pattern period p covers simulation time p * pattern_step - pattern_start
+            pattern_start = proj.get_time_param(EN_PATTERNSTART)
+            n_periods = (pattern_start + int(self.times[-1])) // pattern_step + 1
+            period_t = np.arange(n_periods) * pattern_step - pattern_start
+            rows = np.clip(np.searchsorted(self.times, period_t, side="right") - 1, 0, self.times.size - 1)
+            factors = self.values[np.ix_(rows, np.flatnonzero(is_pattern))]
+
+            idx = cols["index"].to_numpy().astype(np.int32)
+            base = np.ones(idx.size)
+            heads = (cols["kind"] == "reservoir_head").to_numpy()
+            if heads.any():
+                elevation = proj.get_node_values(EN_ELEVATION, indices=idx[heads])
+                elevation[elevation == 0] = 1.0
+                base[heads] = elevation
+                proj.set_node_values(idx[heads], EN_ELEVATION, elevation)
+            demands = ~heads
+            if demands.any():
+                proj.set_node_values(idx[demands], EN_BASEDEMAND, 1.0)
+            patterns = [proj.set_pattern(f"{prefix}{i}", factors[:, j] / base[j]) for j, i in enumerate(idx.tolist())]
+            proj.set_node_values(idx, EN_PATTERN, np.asarray(patterns, dtype=np.float64))
+        rest = ~is_pattern
+        return BoundaryConditions(self.times, self.columns.filter(pl.Series(rest)),
+                                  self.values[:, rest], self.missing)
+
+    def to_frame(self):
+        """Long frame ``time``, ``tag``, ``element``, ``kind``, ``value`` (for checks and plots)."""
+        n_times = self.times.size
+        return pl.DataFrame({
+            "time": np.repeat(self.times, self.n_columns),
+            "tag": np.tile(self.columns["tag"].to_numpy(), n_times),
+            "element": np.tile(self.columns["element"].to_numpy(), n_times),
+            "kind": np.tile(self.columns["kind"].to_numpy(), n_times),
+            "value": self.values.ravel(),
+        })
+
+    def __repr__(self):
+        return (f"BoundaryConditions({self.times.size} steps x {self.n_columns} values, "
+                f"{len(self._groups)} setter groups, {len(self.missing)} missing tags)")
+
+
+def _tag_frame(tags):
+    df = tags if isinstance(tags, pl.DataFrame) else pl.DataFrame(tags)
+    for name in ("tag", "element", "kind"):
+        if name not in df.columns:
+            raise ValueError(f"tag table needs a {name!r} column")
+    unknown = set(df.columns) - set(TAG_COLUMNS)
+    if unknown:
+        raise ValueError(f"unknown columns {sorted(unknown)}; expected some of {list(TAG_COLUMNS)}")
+    df = df.with_columns(pl.col("tag").cast(pl.Utf8), pl.col("element").cast(pl.Utf8),
+                         pl.col("kind").cast(pl.Utf8).str.to_lowercase())
+    for name in ("scale", "offset"):
+        df = df.with_columns((pl.col(name) if name in df.columns else pl.lit(None)).cast(pl.Float64).alias(name))
+    bad = df.filter(~pl.col("kind").is_in(list(KINDS)))
+    if bad.height:
+        raise ValueError(f"tag {bad['tag'][0]!r}: unknown kind {bad['kind'][0]!r}; expected one of {list(KINDS)}")
+    return df
+
+
+def boundary_conditions(proj, series, tags, step=None, start=0, end=None):
+    """
+    Resample SCADA series and map them onto project elements.
+
+    Parameters
+    ----------
+    proj : ResidentProject
+    series : DataFrame
+        Long series from ``read_scada``.
+    tags : DataFrame or dict
+        Tag table (``tag``, ``element``, ``kind``, optional ``scale`` /
+        ``offset``), see the module docstring.
+    step : int, optional
+        Grid step (s); defaults to the hydraulic time step.
+    start, end : int, optional
+        Simulation window (s); ``end`` defaults to the duration.
+
+    Returns
+    -------
+    BoundaryConditions
+    """
+    df = _tag_frame(tags)
+    step = int(step or proj.get_time_param(EN_HYDSTEP))
+    end = proj.get_time_param(EN_DURATION) if end is None else int(end)
+    if step <= 0 or end < start:
+        raise ValueError(f"empty grid (start={start}, end={end}, step={step})")
+    times = np.arange(int(start), end + 1, step, dtype=np.int64)
+
+    spec = pl.DataFrame({"kind": list(KINDS),
+                         "object": [k[0] for k in KINDS.values()],
+                         "property": [k[1] for k in KINDS.values()],
+                         "method": [k[3] for k in KINDS.values()]})
+    df = df.join(spec, on="kind", how="left", maintain_order="left")
+    index = np.zeros(df.height, dtype=np.int32)
+    for obj, lookup, types in (("node", proj.node_index, proj.node_types),
+                               ("link", proj.link_index, proj.link_types)):
+        rows = np.flatnonzero((df["object"] == obj).to_numpy())
+        if not rows.size:
+            continue
+        index[rows] = lookup(df["element"].gather(rows).to_list())
+        kinds = df["kind"].gather(rows).to_numpy()
+        found = types(index[rows])
+        for kind in np.unique(kinds):
+            allowed = KINDS[kind][2]
+            wrong = (kinds == kind) & ~np.isin(found, allowed) if allowed is not None else None
+            if wrong is not None and wrong.any():
+                element = df["element"][int(rows[np.argmax(wrong)])]
+                raise ValueError(f"{kind} tag mapped to {obj} {element!r} of the wrong type")
+    df = df.with_columns(pl.Series("index", index))
+    dup = df.filter(pl.struct("object", "property", "index").is_duplicated())
+    if dup.height:
+        raise ValueError(f"{dup['object'][0]} {dup['element'][0]!r} gets {dup['kind'][0]} from several tags")
+
+    # Zone demands: unscaled demand tags on several junctions are split by base demand
+    zone = (pl.col("kind") == "demand") & pl.col("scale").is_null() & (pl.len().over("tag") > 1)
+    zone_rows = np.flatnonzero(df.select(zone).to_series().to_numpy())
+    if zone_rows.size:
+        base = np.zeros(df.height)
+        base[zone_rows] = proj.get_node_values(EN_BASEDEMAND, indices=index[zone_rows])
+        df = df.with_columns(pl.Series("base", base)).with_columns(
+            pl.when(zone).then(
+                pl.when(pl.col("base").sum().over("tag") != 0)
+                .then(pl.col("base") / pl.col("base").sum().over("tag"))
+                .otherwise(1.0 / pl.len().over("tag")))
+            .otherwise(pl.col("scale")).alias("scale")).drop("base")
+    df = df.with_columns(pl.col("scale").fill_null(1.0), pl.col("offset").fill_null(0.0))
+
+    tag_methods = df.group_by("tag", maintain_order=True).agg(pl.col("method").first())
+    raw = resample(series, tag_methods["tag"].to_list(), tag_methods["method"].to_list(), times)
+    empty = np.isnan(raw).all(axis=0)
+    missing = tag_methods["tag"].filter(pl.Series(empty)).to_list()
+    df = df.filter(~pl.col("tag").is_in(missing))
+    position = df.join(tag_methods.with_row_index("pos"), on="tag", how="left", maintain_order="left")["pos"]
+    values = raw[:, position.to_numpy()] * df["scale"].to_numpy() + df["offset"].to_numpy()
+    status = (df["property"] == EN_STATUS).to_numpy() & (df["object"] == "link").to_numpy()
+    values[:, status] = values[:, status] != 0
+    columns = df.select("tag", "element", "kind", "object", "property", "index", "scale", "offset")
+    return BoundaryConditions(times, columns, np.ascontiguousarray(values), missing)
@@ -0,0 +1,597 @@
+"""
+EPANET-Turbo Scenario Broker
+============================
+
+Spreads a scenario batch over worker processes on one or several machines
+without an external queue: a small broker (TCP or Unix socket, standard
+library ``multiprocessing.connection``) hands out scenario specs to
+workers that keep one resident project each, and collects compact results.
+
+* Scenarios are the ``run_batch`` dicts (``node_values``, ``link_values``,
+  ``options``, ``controls``, ...). Workers run them with ``run_scenario``
+  under the batch ``ConvergencePolicy``, so convergence retries happen on
+  the worker.
+* Results: a Protocol V2 slab of the selected nodes/links per scenario
+  (``slabs/{name}.out``, float32) and/or the reducer outputs
+  (``reductions/{name}.npz``).
+* Every finished scenario is appended to ``journal.jsonl`` after its files
+  are written. A broker restarted on the same output directory skips the
+  journaled scenarios, so an interrupted batch resumes where it stopped.
+* A scenario whose worker disconnects (or exceeds ``task_timeout``) is
+  handed to another worker, up to ``max_dispatch`` times in total.
+* Connections are authenticated with an HMAC challenge on a shared key
+  before any message is unpickled. The broker sends the INP text once per
+  worker, so workers need no shared filesystem.
+
+Usage:
+------
+    from scenario_broker import run_distributed
+
+    res = run_distributed("Net3.inp", scenarios, "mc_out", workers=4, nodes=sensors)
+    print(res.summary())                    # {'ok': 998, 'retried': 2, ...}
+    res.slab("mc_17").pressures             # memmap (T, n_nodes)
+
+    # Across machines: broker on one host, workers anywhere
+    broker = Broker("Net3.inp", scenarios, "mc_out", address=("0.0.0.0", 5000))
+    broker.start()                          # key: broker.authkey.hex()
+    #   EPANET_BROKER_AUTHKEY=<key> python scenario_broker.py worker --connect host:5000
+    res = broker.wait_result()
+"""
+
+import argparse
+import collections
+import copy
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener, answer_challenge, deliver_challenge
+
+import numpy as np
+
+try:
+    from . import turbo_kernel as tk
+    from .batch_runner import (STATUS_ERROR, STATUS_NAMES, STATUS_OK, STATUS_RETRIED, ConvergencePolicy,
+                               run_scenario)
+    from .reducers import ReducerSet
+    from .streaming_v2 import StreamingWriter, load_streaming_result
+    from .turbo_simulation import report_times, resolve_selection
+except ImportError:
+    import turbo_kernel as tk
+    from batch_runner import (STATUS_ERROR, STATUS_NAMES, STATUS_OK, STATUS_RETRIED, ConvergencePolicy,
+                              run_scenario)
+    from reducers import ReducerSet
+    from streaming_v2 import StreamingWriter, load_streaming_result
+    from turbo_simulation import report_times, resolve_selection
+
+AUTHKEY_ENV = "EPANET_BROKER_AUTHKEY"
+JOURNAL_FILE = "journal.jsonl"
+SLAB_DIR = "slabs"
+REDUCTION_DIR = "reductions"
+# Reducers see the recorded rows only, so they are limited to these channels
+RECORDED_CHANNELS = ("pressure", "flow")
+
+
+def parse_address(text):
+    """``host:port`` -> (host, port); anything with a path separator -> Unix socket path."""
+    if isinstance(text, tuple) or os.sep in text:
+        return text
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def format_address(address):
+    return address if isinstance(address, str) else f"{address[0]}:{address[1]}"
+
+
+def _file_stem(name):
+    return re.sub(r"[^\w.-]", "_", name)
+
+
+def read_journal(output_dir):
+    """Rows of ``journal.jsonl`` (a torn last line of a killed broker is ignored)."""
+    path = os.path.join(os.fspath(output_dir), JOURNAL_FILE)
+    rows = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                if not line.endswith("\n"):
+                    break
+                rows.append(json.loads(line))
+    return rows
+
+
+class BrokerResult:
+    def __init__(self, output_dir, rows):
+        """Journal rows of a batch, one per scenario, plus access to their files."""
+        self.output_dir = output_dir
+        self.rows = rows
+        self._by_name = {row["name"]: row for row in rows}
+
+    @property
+    def names(self):
+        return [row["name"] for row in self.rows]
+
+    def summary(self):
+        counts = dict.fromkeys(STATUS_NAMES.values(), 0)
+        for row in self.rows:
+            counts[STATUS_NAMES[row["status"]]] += 1
+        return counts
+
+    def slab(self, name):
+        """``StreamingResult`` of one scenario's recorded pressures/flows."""
+        path = self._by_name[name]["slab"]
+        return None if path is None else load_streaming_result(os.path.join(self.output_dir, path))
+
+    def reductions(self, name):
+        path = self._by_name[name]["reductions"]
+        if path is None:
+            return None
+        with np.load(os.path.join(self.output_dir, path)) as data:
+            return dict(data)
+
+    def __repr__(self):
+        return f"BrokerResult({self.output_dir!r}, {self.summary()})"
+
+
+class Broker:
+    def __init__(self, inp_path, scenarios, output_dir, address=("127.0.0.1", 0), authkey=None,
+                 policy=None, nodes=None, links=None, start=None, end=None, every=1, reducers=None,
+                 record=True, max_dispatch=3, task_timeout=None, resume=True):
+        """
+        Scenario broker; ``start()`` listens, workers connect and pull work.
+
+        Parameters
+        ----------
+        inp_path : str
+            Model sent to every worker.
+        scenarios : list of dict
+            ``run_batch`` scenario dicts; names (``name`` key, default
+            ``scenario_{i}``) must be unique, they key the journal.
+        output_dir : str
+            Slabs, reductions and the journal.
+        address : tuple or str
+            ``(host, port)`` (port 0 = any free port) or a Unix socket path.
+        authkey : bytes, optional
+            Shared key (default: random, see ``authkey``).
+        policy : ConvergencePolicy, optional
+        nodes, links, start, end, every
+            Recorded elements and reporting window, see ``run_simulation``.
+        reducers : list of Reducer, optional
+            Pressure/flow reducers computed on the worker per scenario.
+        record : bool
+            Write the slab of each scenario (False: reductions only).
+        max_dispatch : int
+            Times a scenario is handed out before it is given up (status
+            error) because its workers keep disappearing.
+        task_timeout : float, optional
+            Seconds after which a running scenario is handed to another
+            worker as well; the first result wins.
+        resume : bool
+            Skip scenarios already in the journal (False: start a new journal).
+        """
+        self.inp_path = os.fspath(inp_path)
+        self.output_dir = os.fspath(output_dir)
+        self.address = parse_address(address)
+        self.authkey = authkey or os.urandom(32)
+        self.max_dispatch = int(max_dispatch)
+        self.task_timeout = task_timeout
+        reducers = list(reducers or [])
+        bad = [r.name for r in reducers if r.channel not in RECORDED_CHANNELS]
+        if bad:
+            raise ValueError(f"reducers {bad}: brokered batches reduce {RECORDED_CHANNELS} only")
+        if not record and not reducers:
+            raise ValueError("nothing to collect: record=False needs reducers")
+        self.job = {"policy": policy or ConvergencePolicy(), "nodes": nodes, "links": links, "start": start,
+                    "end": end, "every": every, "reducers": reducers, "record": record}
+
+        self._specs = {}
+        for i, sc in enumerate(scenarios):
+            name = str(sc.get("name", f"scenario_{i}"))
+            if name in self._specs:
+                raise ValueError(f"duplicate scenario name {name!r}")
+            self._specs[name] = sc
+        stems = collections.Counter(_file_stem(name) for name in self._specs)
+        clashes = [stem for stem, n in stems.items() if n > 1]
+        if clashes:
+            raise ValueError(f"scenario names map to the same file name: {clashes[:5]}")
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        journal = os.path.join(self.output_dir, JOURNAL_FILE)
+        rows = read_journal(self.output_dir) if resume else []
+        self._done = {row["name"]: row for row in rows if row["name"] in self._specs}
+        self._journal = open(journal, "a" if resume else "w", encoding="utf-8")
+        self._pending = collections.deque(name for name in self._specs if name not in self._done)
+        self._inflight = {}                 # name -> (worker, deadline)
+        self._writing = set()
+        self._dispatches = collections.Counter()
+        self._cond = threading.Condition()
+        self._listener = None
+        self._threads = []
+        self._handlers = []
+        self._conns = {}
+        self._closed = False
+        self.resumed = len(self._done)
+        self.workers_seen = 0
+        self.worker_errors = []             # (worker, message) of workers that could not open the model
+
+    # ------------------------------------------------------------------
+    def start(self):
+        """Listen and serve workers from background threads; returns self."""
+        family = "AF_UNIX" if isinstance(self.address, str) else "AF_INET"
+        # Authentication runs per connection (see _handle), so a stalled
+        # client cannot block the accept loop
+        self._listener = Listener(self.address, family=family)
+        self.address = self._listener.address
+        for target in (self._accept_loop, self._watchdog):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    @property
+    def finished(self):
+        with self._cond:
+            return len(self._done) == len(self._specs)
+
+    def wait(self, timeout=None, procs=None):
+        """
+        Block until every scenario is journaled; False on timeout.
+
+        ``procs`` are the worker processes serving this broker (see
+        ``spawn_workers``): once all of them have exited with scenarios
+        left, RuntimeError is raised with the workers' startup errors.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while len(self._done) < len(self._specs):
+                if procs is not None and all(proc.poll() is not None for proc in procs):
+                    raise RuntimeError(self._workers_gone(len(procs)))
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                # Wake up now and then to poll the workers
+                self._cond.wait(0.5 if remaining is None else min(remaining, 0.5))
+            return True
+
+    def wait_result(self, timeout=None, procs=None):
+        """``wait`` then ``close``; returns the ``BrokerResult``."""
+        try:
+            finished = self.wait(timeout, procs)
+        except RuntimeError:
+            self.close()
+            raise
+        if not finished:
+            self.close()
+            raise TimeoutError(f"batch incomplete after {timeout} s ({len(self._done)}/{len(self._specs)} done)")
+        self.close()
+        return self.result()
+
+    def _workers_gone(self, n_procs):
+        # Caller holds the lock
+        msg = (f"all {n_procs} workers exited with {len(self._specs) - len(self._done)}/{len(self._specs)} "
+               f"scenarios unfinished")
+        if self.worker_errors:
+            worker, error = self.worker_errors[-1]
+            msg += f"; worker {worker} could not open the model: {error}"
+        return msg
+
+    def result(self):
+        with self._cond:
+            return BrokerResult(self.output_dir, [self._done[name] for name in self._specs if name in self._done])
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._listener is not None:
+            self._listener.close()
+            self._wake_accept()
+        with self._cond:
+            conns = list(self._conns.values())
+            self._cond.notify_all()
+        for conn in conns:
+            _shutdown(conn)
+        for thread in self._handlers:
+            thread.join(timeout=5)
+        with self._cond:
+            self._journal.close()
+
+    def _wake_accept(self):
+        # A blocked accept() does not notice the listener closing; poke it
+        try:
+            family = socket.AF_UNIX if isinstance(self.address, str) else socket.AF_INET
+            with socket.socket(family, socket.SOCK_STREAM) as sock:
+                sock.settimeout(1.0)
+                sock.connect(self.address)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return (f"Broker({format_address(self.address)}, scenarios={len(self._specs)}, "
+                f"done={len(self._done)}, running={len(self._inflight)})")
+
+    # ------------------------------------------------------------------
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                if self._closed:
+                    return
+                continue
+            if self._closed:
+                conn.close()
+                return
+            thread = threading.Thread(target=self._handle, args=(conn,), daemon=True)
+            thread.start()
+            self._handlers.append(thread)
+
+    def _watchdog(self):
+        while not self._closed and self.task_timeout is not None:
+            time.sleep(min(1.0, self.task_timeout / 4))
+            now = time.monotonic()
+            with self._cond:
+                for name, (_, deadline) in list(self._inflight.items()):
+                    if deadline is not None and now > deadline:
+                        del self._inflight[name]
+                        self._pending.appendleft(name)
+
+    def _handle(self, conn):
+        worker = None
+        try:
+            deliver_challenge(conn, self.authkey)
+            answer_challenge(conn, self.authkey)
+            kind, worker, pid, host = conn.recv()
+            if kind != "hello":
+                return
+            worker = f"{worker or host}:{pid}"
+            with self._cond:
+                self._conns[worker] = conn
+                self.workers_seen += 1
+            with open(self.inp_path, "rb") as fh:
+                conn.send(("model", os.path.basename(self.inp_path), fh.read(), self.job))
+            msg = conn.recv()
+            if msg[0] == "error":
+                with self._cond:
+                    self.worker_errors.append((worker, msg[1]))
+                    self._cond.notify_all()
+                return
+            _, node_ids, link_ids, interval = msg
+            while not self._closed:
+                msg = conn.recv()
+                if msg[0] == "result":
+                    self._store(worker, msg[1], msg[2], msg[3], node_ids, link_ids, interval)
+                reply = self._next_task(worker)
+                conn.send(reply)
+                if reply[0] == "done":
+                    break
+        except (EOFError, OSError, AuthenticationError):
+            pass                            # worker gone, or failed authentication
+        finally:
+            with self._cond:
+                self._conns.pop(worker, None)
+                # Hand its running scenario to the next worker
+                for name, (owner, _) in list(self._inflight.items()):
+                    if owner == worker:
+                        del self._inflight[name]
+                        self._pending.appendleft(name)
+            conn.close()
+
+    def _next_task(self, worker):
+        with self._cond:
+            while self._pending:
+                name = self._pending.popleft()
+                if name in self._done or name in self._writing:
+                    continue
+                if self._dispatches[name] >= self.max_dispatch:
+                    self._journal_row(self._row(name, None, worker, error=(
+                        f"given up after {self._dispatches[name]} dispatches (workers lost or timed out)")))
+                    continue
+                self._dispatches[name] += 1
+                deadline = None if self.task_timeout is None else time.monotonic() + self.task_timeout
+                self._inflight[name] = (worker, deadline)
+                return ("task", name, self._specs[name])
+            if len(self._done) == len(self._specs):
+                return ("done",)
+            return ("wait", 0.2)
+
+    def _row(self, name, outcome, worker, error=None):
+        status, attempt, iterations, warning, elapsed, run_error = outcome or (STATUS_ERROR, -1, 0, 0, 0.0, error)
+        return {"name": name, "status": int(status), "status_name": STATUS_NAMES[int(status)],
+                "attempt": int(attempt), "iterations": int(iterations), "warning": int(warning),
+                "elapsed": float(elapsed), "error": run_error, "worker": worker,
+                "dispatches": self._dispatches[name], "slab": None, "reductions": None}
+
+    def _journal_row(self, row):
+        # Caller holds the lock
+        self._journal.write(json.dumps(row) + "\n")
+        self._journal.flush()
+        self._done[row["name"]] = row
+        self._inflight.pop(row["name"], None)
+        self._cond.notify_all()
+
+    def _store(self, worker, name, outcome, payload, node_ids, link_ids, interval):
+        with self._cond:
+            if self._closed or name in self._done or name in self._writing or name not in self._specs:
+                return                      # a duplicate of a re-dispatched scenario
+            self._writing.add(name)
+        try:
+            row = self._row(name, outcome, worker)
+            stem = _file_stem(name)
+            if payload.get("pressures") is not None:
+                row["slab"] = os.path.join(SLAB_DIR, stem + ".out")
+                os.makedirs(os.path.join(self.output_dir, SLAB_DIR), exist_ok=True)
+                with StreamingWriter(os.path.join(self.output_dir, row["slab"]), node_ids, link_ids,
+                                     rpt_step=interval, config={"scenario": name}) as sink:
+                    for t, p, q in zip(payload["times"], payload["pressures"], payload["flows"]):
+                        sink.write_block(int(t), pressure=p, flow=q)
+            if payload.get("reductions"):
+                row["reductions"] = os.path.join(REDUCTION_DIR, stem + ".npz")
+                os.makedirs(os.path.join(self.output_dir, REDUCTION_DIR), exist_ok=True)
+                np.savez(os.path.join(self.output_dir, row["reductions"]), **payload["reductions"])
+            with self._cond:
+                if not self._closed:
+                    self._journal_row(row)
+        finally:
+            with self._cond:
+                self._writing.discard(name)
+
+
+def _shutdown(conn):
+    # Wakes a thread blocked in conn.recv() with EOF; it closes the connection itself
+    try:
+        with socket.socket(fileno=os.dup(conn.fileno())) as sock:
+            sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+# ----------------------------------------------------------------------
+# Worker
+# ----------------------------------------------------------------------
+def _connect(address, authkey, attempts, delay):
+    for attempt in range(attempts):
+        try:
+            return Client(address, family="AF_UNIX" if isinstance(address, str) else "AF_INET",
+                          authkey=authkey)
+        except (ConnectionRefusedError, FileNotFoundError):
+            if attempt == attempts - 1:
+                raise
+            time.sleep(delay)
+
+
+def _run_task(proj, job, scenario, times, node_idx, link_idx, p_out, q_out, interval):
+    outcome = run_scenario(proj, scenario, job["policy"], times, node_idx, link_idx, p_out, q_out)
+    payload = {"times": np.asarray(times, dtype=np.int64)}
+    if job["record"]:
+        payload["pressures"] = p_out.astype(np.float32)
+        payload["flows"] = q_out.astype(np.float32)
+    if job["reducers"] and outcome[0] in (STATUS_OK, STATUS_RETRIED):
+        stats = ReducerSet(copy.deepcopy(job["reducers"]))
+        stats.start(p_out.shape[1], q_out.shape[1], interval)
+        for k, t in enumerate(times):
+            stats.update(proj, t, known={"pressure": p_out[k], "flow": q_out[k]})
+        payload["reductions"] = stats.results()
+    return outcome, payload
+
+
+def run_worker(address, authkey, name=None, num_threads=None, openmp=True, connect_attempts=30,
+               retry_delay=1.0):
+    """
+    Serve one broker until it reports the batch done; returns the number
+    of scenarios run.
+    """
+    conn = _connect(parse_address(address), authkey, connect_attempts, retry_delay)
+    workdir = tempfile.mkdtemp(prefix="epanet_worker_")
+    proj = None
+    n_done = 0
+    try:
+        conn.send(("hello", name, os.getpid(), socket.gethostname()))
+        _, filename, data, job = conn.recv()
+        inp_path = os.path.join(workdir, os.path.basename(filename))
+        with open(inp_path, "wb") as fh:
+            fh.write(data)
+        try:
+            proj = tk.ResidentProject(inp_path, openmp=openmp, num_threads=num_threads)
+            times = report_times(proj, job["start"], job["end"], job["every"])
+            node_idx, node_ids = resolve_selection(proj, job["nodes"], "node")
+            link_idx, link_ids = resolve_selection(proj, job["links"], "link")
+            interval = proj.get_time_param(tk.EN_REPORTSTEP) * int(job["every"])
+        except Exception as exc:
+            conn.send(("error", f"{type(exc).__name__}: {exc}"))
+            raise
+        conn.send(("ready", node_ids, link_ids, interval))
+        p_out = np.empty((len(times), len(node_ids)))
+        q_out = np.empty((len(times), len(link_ids)))
+
+        request = ("next",)
+        while True:
+            conn.send(request)
+            msg = conn.recv()
+            if msg[0] == "done":
+                return n_done
+            if msg[0] == "wait":
+                time.sleep(msg[1])
+                request = ("next",)
+                continue
+            _, task, scenario = msg
+            outcome, payload = _run_task(proj, job, scenario, times, node_idx, link_idx, p_out, q_out, interval)
+            request = ("result", task, outcome, payload)
+            n_done += 1
+    except (EOFError, ConnectionError):
+        return n_done                       # broker closed
+    finally:
+        conn.close()
+        if proj is not None:
+            proj.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def spawn_workers(address, authkey, n, num_threads=None, openmp=True):
+    """Start ``n`` worker processes of this module on the local machine (key passed via the environment)."""
+    env = dict(os.environ, **{AUTHKEY_ENV: authkey.hex()})
+    cmd = [sys.executable, os.path.abspath(__file__), "worker", "--connect", format_address(address)]
+    if num_threads:
+        cmd += ["--threads", str(num_threads)]
+    if not openmp:
+        cmd.append("--no-openmp")
+    return [subprocess.Popen(cmd + ["--name", f"local{i}"], env=env) for i in range(n)]
+
+
+def run_distributed(inp_path, scenarios, output_dir, workers=None, timeout=None, **kwargs):
+    """
+    Run a batch through a localhost broker and ``workers`` local worker
+    processes (default: one per core); ``kwargs`` go to ``Broker``.
+    """
+    workers = workers or os.cpu_count() or 1
+    broker = Broker(inp_path, scenarios, output_dir, **kwargs).start()
+    procs = [] if broker.finished else spawn_workers(broker.address, broker.authkey, workers)
+    try:
+        return broker.wait_result(timeout, procs)
+    finally:
+        broker.close()
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EPANET-Turbo scenario broker worker")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker = sub.add_parser("worker", help="pull scenarios from a broker until the batch is done")
+    worker.add_argument("--connect", required=True, help="host:port or Unix socket path of the broker")
+    worker.add_argument("--name", default=None)
+    worker.add_argument("--threads", type=int, default=None, help="OpenMP threads of this worker")
+    worker.add_argument("--no-openmp", action="store_true")
+    worker.add_argument("--connect-attempts", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    key = os.environ.get(AUTHKEY_ENV)
+    if not key:
+        parser.error(f"set {AUTHKEY_ENV} to the broker's key (Broker.authkey.hex())")
+    try:
+        n = run_worker(args.connect, bytes.fromhex(key), name=args.name, num_threads=args.threads,
+                       openmp=not args.no_openmp, connect_attempts=args.connect_attempts)
+    except (ConnectionRefusedError, FileNotFoundError):
+        sys.exit(f"no broker at {args.connect}")
+    print(f"worker {args.name or os.getpid()}: {n} scenarios")
+
+
+if __name__ == "__main__":
+    main()
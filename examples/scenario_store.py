@@ -0,0 +1,446 @@
+"""
+EPANET-Turbo Scenario Store
+===========================
+
+Monte Carlo / what-if results as sparse deltas against one baseline run.
+Most scenarios move only a small part of the network away from the
+baseline, yet a Protocol V2 file per scenario costs T x (N + M) float32.
+The store keeps the baseline as a regular Protocol V2 stream and, for
+every scenario step, only the elements whose value differs from the
+baseline by more than the channel tolerance (indices + float32 values).
+
+Layout of a store directory::
+
+    baseline.out / baseline.meta.json   Protocol V2 stream of the baseline
+    {channel}.idx / {channel}.val       int32 element indices / float32 values,
+                                        appended scenario by scenario
+    rows.bin                            per scenario step: t, end offset per channel
+    scenarios.jsonl                     one line per completed scenario
+    store.json                          channels, tolerances, element counts
+
+Reconstructed values are exact where a delta was stored and within the
+tolerance of the scenario's value elsewhere. A scenario that fails while
+being written is cut off again, and completed scenarios stay readable
+when the writing process dies (``scenarios.jsonl`` is append-only).
+
+Usage:
+------
+    from scenario_store import ScenarioStoreWriter, load_scenario_store
+
+    with ScenarioStoreWriter("mc_store", node_ids, link_ids, rpt_step=3600,
+                             tolerance={"pressure": 0.01, "flow": 0.05}) as store:
+        store.write_result(run_simulation(proj))                 # the baseline
+        for k, draw in enumerate(draws):
+            with store.scenario(f"mc_{k}") as sink:
+                for t, p, q in proj.iter_steps():
+                    sink.write_block(t, pressure=p, flow=q)
+
+    st = load_scenario_store("mc_store")
+    p = st.get("mc_17")                      # (T, N) pressures of one scenario
+    p_node = st.series("J-1024")             # (scenarios, T) pressures of one node
+    st.stats()                               # stored vs dense bytes
+"""
+
+import json
+import os
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    from .streaming_v2 import CH_LEGACY, CHANNELS, StreamingWriter, load_streaming_result
+except ImportError:
+    from streaming_v2 import CH_LEGACY, CHANNELS, StreamingWriter, load_streaming_result
+
+STORE_VERSION = 1
+BASELINE_FILE = "baseline.out"
+ROWS_FILE = "rows.bin"
+SCENARIOS_FILE = "scenarios.jsonl"
+MANIFEST_FILE = "store.json"
+INDEX_DTYPE = np.dtype("<i4")
+VALUE_DTYPE = np.dtype("<f4")
+
+
+def rows_dtype(channels):
+    """Record of one scenario step: ``t`` and the end offset of each channel's deltas."""
+    return np.dtype([("t", "<i4")] + [(name, "<i8") for name in channels], align=False)
+
+
+def _channel_names(channels):
+    return [name for bit, name, _ in CHANNELS if channels & bit]
+
+
+class _ScenarioSink:
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+        self.n_steps = 0
+
+    def write_block(self, t, **values):
+        """Record the deltas of the next step (same keywords as ``StreamingWriter.write_block``)."""
+        self.store._write_deltas(self.n_steps, t, values)
+        self.n_steps += 1
+
+
+class ScenarioStoreWriter:
+    def __init__(self, path, node_ids, link_ids, rpt_step, tolerance=1e-3, channels=CH_LEGACY,
+                 start_ts=0, config=None):
+        """
+        Create (or overwrite) a scenario store.
+
+        Parameters
+        ----------
+        path : str
+            Store directory.
+        node_ids, link_ids : list of str
+            Recorded elements, the same for the baseline and every scenario.
+        rpt_step : int
+            Reporting step (s) of the baseline stream.
+        tolerance : float or dict
+            Largest absolute difference from the baseline that is not
+            stored, for all channels or per channel name (``pressure``,
+            ``flow``, ``node_quality``, ``link_quality``). 0 keeps every
+            changed float32 value (lossless).
+        channels : int
+            Bitmask of ``streaming_v2.CH_*`` channels.
+        start_ts : int
+        config : dict, optional
+            Extra entries for the baseline sidecar.
+        """
+        self.path = os.fspath(path)
+        os.makedirs(self.path, exist_ok=True)
+        self.node_ids = list(node_ids)
+        self.link_ids = list(link_ids)
+        self.channels = int(channels)
+        self.names = _channel_names(self.channels)
+        if isinstance(tolerance, dict):
+            unknown = set(tolerance) - set(self.names)
+            if unknown:
+                raise ValueError(f"tolerance for unknown channels {sorted(unknown)}")
+            self.tolerance = {name: float(tolerance.get(name, 0.0)) for name in self.names}
+        else:
+            self.tolerance = {name: float(tolerance) for name in self.names}
+        self.scenario_names = []
+
+        self._baseline_writer = StreamingWriter(os.path.join(self.path, BASELINE_FILE), self.node_ids,
+                                                self.link_ids, rpt_step, start_ts=start_ts,
+                                                channels=self.channels, config=config)
+        self._baseline = None
+        self._rows_dtype = rows_dtype(self.names)
+        self._row = np.zeros(1, dtype=self._rows_dtype)
+        self._counts = dict.fromkeys(self.names, 0)
+        self._n_rows = 0
+        self._active = None
+        self._files = {}
+        for name in self.names:
+            self._files[name, "idx"] = open(os.path.join(self.path, f"{name}.idx"), "wb")
+            self._files[name, "val"] = open(os.path.join(self.path, f"{name}.val"), "wb")
+        self._files["rows"] = open(os.path.join(self.path, ROWS_FILE), "wb")
+        self._files["scenarios"] = open(os.path.join(self.path, SCENARIOS_FILE), "w", encoding="utf-8")
+        self._write_manifest()
+
+    def _write_manifest(self):
+        manifest = {
+            "version": STORE_VERSION,
+            "channels": self.names,
+            "tolerance": self.tolerance,
+            "nodes": len(self.node_ids),
+            "links": len(self.link_ids),
+            "baseline": BASELINE_FILE,
+        }
+        tmp = os.path.join(self.path, MANIFEST_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh)
+        os.replace(tmp, os.path.join(self.path, MANIFEST_FILE))
+
+    # ------------------------------------------------------------------
+    # Baseline
+    # ------------------------------------------------------------------
+    def write_baseline(self, t, **values):
+        """Append one baseline step; all baseline steps come before the first scenario."""
+        if self._baseline_writer is None:
+            raise RuntimeError("the baseline is complete once the first scenario has been started")
+        self._baseline_writer.write_block(t, **values)
+
+    def _finish_baseline(self):
+        if self._baseline_writer is not None:
+            self._baseline_writer.close()
+            self._baseline_writer = None
+            self._baseline = load_streaming_result(os.path.join(self.path, BASELINE_FILE))
+
+    # ------------------------------------------------------------------
+    # Scenarios
+    # ------------------------------------------------------------------
+    @contextmanager
+    def scenario(self, name):
+        """
+        Write one scenario step by step; yields a sink with ``write_block``.
+
+        Steps are matched to the baseline by position and must carry the
+        same times; a scenario may stop early. When the block raises, the
+        scenario's partial deltas are discarded.
+        """
+        if self._active is not None:
+            raise RuntimeError(f"scenario {self._active.name!r} is still being written")
+        self._finish_baseline()
+        sink = _ScenarioSink(self, str(name))
+        start_counts, start_rows = dict(self._counts), self._n_rows
+        self._active = sink
+        try:
+            yield sink
+        except BaseException:
+            self._truncate(start_counts, start_rows)
+            raise
+        finally:
+            self._active = None
+        for fh in self._files.values():
+            fh.flush()
+        # Completed scenarios are appended last, so a crash never lists partial data
+        record = {"name": sink.name, "first_row": start_rows, "n_steps": sink.n_steps}
+        self._files["scenarios"].write(json.dumps(record) + "\n")
+        self._files["scenarios"].flush()
+        self.scenario_names.append(sink.name)
+
+    def write_result(self, result, name=None):
+        """
+        Write a ``SimulationResult`` (or anything with ``times``,
+        ``pressures`` and ``flows``) as the baseline, or as scenario ``name``.
+        Only stores with the classic pressure/flow channels.
+        """
+        if self.channels != CH_LEGACY:
+            raise ValueError("write_result needs a pressure/flow store; use write_block for other channels")
+        if name is None:
+            for k, t in enumerate(result.times):
+                self.write_baseline(int(t), pressure=result.pressures[k], flow=result.flows[k])
+            return
+        with self.scenario(name) as sink:
+            for k, t in enumerate(result.times):
+                sink.write_block(int(t), pressure=result.pressures[k], flow=result.flows[k])
+
+    def _write_deltas(self, step, t, values):
+        base = self._baseline
+        if step >= base.n_steps:
+            raise ValueError(f"scenario has more steps than the baseline ({base.n_steps})")
+        if int(base.times[step]) != int(t):
+            raise ValueError(f"scenario step {step} is at t={t} s, the baseline at t={int(base.times[step])} s")
+        row = self._row[0]
+        row["t"] = t
+        for name in self.names:
+            given = values.get(name)
+            if given is None:
+                raise ValueError(f"store has a '{name}' channel but no values were given")
+            current = np.asarray(given, dtype=VALUE_DTYPE)
+            # NaN compares unequal, so a failed value is always stored
+            changed = np.flatnonzero(~(np.abs(current - base.blocks[name][step]) <= self.tolerance[name]))
+            if changed.size:
+                self._files[name, "idx"].write(changed.astype(INDEX_DTYPE).data)
+                self._files[name, "val"].write(current[changed].data)
+                self._counts[name] += changed.size
+            row[name] = self._counts[name]
+        self._files["rows"].write(self._row.data)
+        self._n_rows += 1
+
+    def _truncate(self, counts, n_rows):
+        for name in self.names:
+            for kind, dtype in (("idx", INDEX_DTYPE), ("val", VALUE_DTYPE)):
+                fh = self._files[name, kind]
+                fh.flush()
+                fh.truncate(counts[name] * dtype.itemsize)
+                fh.seek(0, os.SEEK_END)
+        fh = self._files["rows"]
+        fh.flush()
+        fh.truncate(n_rows * self._rows_dtype.itemsize)
+        fh.seek(0, os.SEEK_END)
+        self._counts, self._n_rows = dict(counts), n_rows
+
+    # ------------------------------------------------------------------
+    def close(self):
+        if not self._files:
+            return
+        self._finish_baseline()
+        for fh in self._files.values():
+            fh.close()
+        self._files = {}
+        self._baseline = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f"ScenarioStoreWriter({self.path!r}, scenarios={len(self.scenario_names)}, channels={self.names})"
+
+
+class ScenarioStore:
+    def __init__(self, path, manifest, baseline, scenarios, rows, deltas):
+        """Read side of a store, see ``load_scenario_store``."""
+        self.path = path
+        self.manifest = manifest
+        self.baseline = baseline
+        self.channels = manifest["channels"]
+        self.tolerance = manifest["tolerance"]
+        self.names = [s["name"] for s in scenarios]
+        self.first_rows = np.array([s["first_row"] for s in scenarios], dtype=np.int64)
+        self.scenario_steps = np.array([s["n_steps"] for s in scenarios], dtype=np.int64)
+        self.rows = rows
+        self.deltas = deltas
+        self._lookup = {name: k for k, name in enumerate(self.names)}
+        self._node_lookup = None
+        self._link_lookup = None
+
+    @property
+    def node_ids(self):
+        return self.baseline.node_ids
+
+    @property
+    def link_ids(self):
+        return self.baseline.link_ids
+
+    @property
+    def times(self):
+        return self.baseline.times
+
+    @property
+    def n_scenarios(self):
+        return len(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _scenario(self, scenario):
+        if isinstance(scenario, str):
+            try:
+                return self._lookup[scenario]
+            except KeyError:
+                raise KeyError(f"unknown scenario {scenario!r}") from None
+        return int(scenario)
+
+    def _channel(self, channel):
+        if channel not in self.channels:
+            raise KeyError(f"store has no {channel!r} channel (channels: {self.channels})")
+        return channel
+
+    def _row_range(self, channel, first, last):
+        # Delta offsets [start, end) of rows first..last-1
+        ends = self.rows[channel]
+        start = int(ends[first - 1]) if first > 0 else 0
+        return start, int(ends[last - 1]) if last > first else start
+
+    def get_deltas(self, scenario, channel="pressure"):
+        """
+        Raw deltas of one scenario: ``(indptr, indices, values)`` with
+        ``indptr`` of length steps + 1 (CSR over the steps).
+        """
+        channel = self._channel(channel)
+        k = self._scenario(scenario)
+        first, n = int(self.first_rows[k]), int(self.scenario_steps[k])
+        start, end = self._row_range(channel, first, first + n)
+        ends = np.asarray(self.rows[channel][first:first + n], dtype=np.int64)
+        indptr = np.concatenate([[0], ends - start])
+        idx, val = self.deltas[channel]
+        return indptr, idx[start:end], val[start:end]
+
+    def get(self, scenario, channel="pressure"):
+        """Reconstructed (steps, elements) float32 array of one scenario."""
+        indptr, idx, val = self.get_deltas(scenario, channel)
+        n = indptr.size - 1
+        out = np.array(self.baseline.blocks[channel][:n])
+        steps = np.repeat(np.arange(n), np.diff(indptr))
+        out[steps, idx] = val
+        return out
+
+    def _element(self, element, channel):
+        kind = dict((name, kind) for _, name, kind in CHANNELS)[channel]
+        if not isinstance(element, str):
+            return int(element)
+        if kind == "nodes":
+            if self._node_lookup is None:
+                self._node_lookup = {nid: i for i, nid in enumerate(self.node_ids)}
+            lookup = self._node_lookup
+        else:
+            if self._link_lookup is None:
+                self._link_lookup = {lid: i for i, lid in enumerate(self.link_ids)}
+            lookup = self._link_lookup
+        try:
+            return lookup[element]
+        except KeyError:
+            raise KeyError(f"unknown {kind[:-1]} ID {element!r}") from None
+
+    def series(self, element, channel="pressure"):
+        """
+        One element across all scenarios: (scenarios, steps) float32, NaN
+        after the last step of a scenario that stopped early.
+
+        ``element`` is an ID or a 0-based position in the recorded elements.
+        One vectorised scan over the channel's delta indices.
+        """
+        channel = self._channel(channel)
+        j = self._element(element, channel)
+        base = np.asarray(self.baseline.blocks[channel][:, j])
+        out = np.tile(base, (self.n_scenarios, 1))
+        out[np.arange(base.size) >= self.scenario_steps[:, None]] = np.nan
+        idx, val = self.deltas[channel]
+        hits = np.flatnonzero(idx == j)
+        if hits.size:
+            rows = np.searchsorted(self.rows[channel], hits, side="right")
+            k = np.searchsorted(self.first_rows, rows, side="right") - 1
+            out[k, rows - self.first_rows[k]] = val[hits]
+        return out
+
+    def changed(self, scenario, channel="pressure"):
+        """Positions of the elements a scenario moves beyond the tolerance at any step."""
+        _, idx, _ = self.get_deltas(scenario, channel)
+        return np.unique(idx)
+
+    def stats(self):
+        """Stored bytes against one dense Protocol V2 file per scenario."""
+        block = self.baseline.blocks.dtype.itemsize
+        entries = {name: int(self.deltas[name][0].size) for name in self.channels}
+        stored = sum(entries.values()) * (INDEX_DTYPE.itemsize + VALUE_DTYPE.itemsize) + self.rows.nbytes
+        dense = int(self.scenario_steps.sum()) * block
+        return {"scenarios": self.n_scenarios, "entries": entries, "stored_bytes": stored,
+                "dense_bytes": dense, "ratio": dense / stored if stored else float("inf")}
+
+    def __repr__(self):
+        return f"ScenarioStore({self.path!r}, scenarios={self.n_scenarios}, channels={self.channels})"
+
+
+def _map(path, dtype):
+    size = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+    if size == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(size,))
+
+
+def load_scenario_store(path):
+    """
+    Open a scenario store for reading; delta arrays are read-only memmaps.
+
+    Only scenarios listed in ``scenarios.jsonl`` are visible, so a store
+    that is still being written (or whose writer died) can be read.
+    """
+    path = os.fspath(path)
+    with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as fh:
+        manifest = json.load(fh)
+    if manifest.get("version") != STORE_VERSION:
+        raise ValueError(f"{path}: unsupported scenario store version {manifest.get('version')}")
+    baseline = load_streaming_result(os.path.join(path, manifest["baseline"]))
+
+    scenarios = []
+    with open(os.path.join(path, SCENARIOS_FILE), encoding="utf-8") as fh:
+        for line in fh:
+            if not line.endswith("\n"):
+                break                   # torn last line of a running writer
+            scenarios.append(json.loads(line))
+    rows = _map(os.path.join(path, ROWS_FILE), rows_dtype(manifest["channels"]))
+    n_rows = scenarios[-1]["first_row"] + scenarios[-1]["n_steps"] if scenarios else 0
+    rows = rows[:n_rows]
+
+    deltas = {}
+    for name in manifest["channels"]:
+        n = int(rows[name][-1]) if n_rows else 0
+        deltas[name] = (_map(os.path.join(path, f"{name}.idx"), INDEX_DTYPE)[:n],
+                        _map(os.path.join(path, f"{name}.val"), VALUE_DTYPE)[:n])
+    return ScenarioStore(path, manifest, baseline, scenarios, rows, deltas)
@@ -0,0 +1,484 @@
+"""
+EPANET-Turbo Network Skeletonisation
+====================================
+
+Vectorised model reduction on the parser tables, for studies that only
+need the trunk mains of an all-mains model:
+
+* **Dead ends** - junctions hanging on a single pipe are removed and their
+  demand moves to the neighbour (repeated until no branch is left).
+* **Series pipes** - a junction joining exactly two pipes is removed and
+  the pipes become one with the same total head loss.
+* **Parallel pipes** - pipes joining the same two nodes become one with
+  the same total conductance.
+
+Only open pipes with ``diameter <= max_diameter`` are touched. Tanks,
+reservoirs, pump/valve nodes and every element named in controls, rules,
+status, source, emitter, mixing or reaction entries are kept, as are the
+IDs in ``keep`` (e.g. sensors). Initial quality of removed nodes is
+dropped like their coordinates (``stats`` counts the pinned elements).
+
+Equivalent pipes use the resistance per unit length of the model's head
+loss formula, ``r(D, C) = C^-1.852 D^-4.871`` (H-W), ``D^-5`` (D-W, same
+friction factor) or ``n^2 D^-5.33`` (C-M): series pipes keep the diameter
+and roughness of the largest pipe and get the equivalent length;
+parallel pipes keep the length and roughness of the largest pipe and get
+the equivalent diameter.
+
+Usage:
+------
+    from skeleton import skeletonize, check_accuracy
+
+    sk = skeletonize("city.inp", "city_trunk.inp", max_diameter=300, keep=sensor_ids)
+    print(sk.stats)            # nodes/links before and after, per-operation counts
+    sk.node_map                # original_id -> reduced_id (where its demand went), action
+    sk.link_map                # original_id -> reduced_id (equivalent pipe) or null, action
+
+    acc = check_accuracy("city.inp", sk)
+    print(acc["summary"])      # max / mean / p95 absolute pressure error at retained nodes
+"""
+
+import numpy as np
+import polars as pl
+
+try:
+    from .lazy_parser import LazyInpParser
+    from .turbo_simulation import run_simulation
+except ImportError:
+    from lazy_parser import LazyInpParser
+    from turbo_simulation import run_simulation
+
+# Head loss formula -> (flow exponent, diameter exponent, roughness exponent)
+# so that r = C^c * D^-d and h = r * L * Q^n
+HEADLOSS_EXPONENTS = {
+    "H-W": (1.852, 4.871, -1.852),
+    "D-W": (2.0, 5.0, 0.0),
+    "C-M": (2.0, 5.33, 2.0),
+}
+
+# Sections whose ID tokens must survive the reduction
+PROTECTING_SECTIONS = ("CONTROLS", "RULES", "STATUS", "SOURCES", "EMITTERS", "MIXING", "REACTIONS")
+
+NODE_KEPT = "kept"
+NODE_DEAD_END = "dead_end"
+NODE_SERIES = "series"
+LINK_KEPT = "kept"
+LINK_DEAD_END = "dead_end"
+LINK_SERIES = "series"
+LINK_PARALLEL = "parallel"
+
+
+def headloss_formula(model):
+    """Head loss formula of a model (``"H-W"``, ``"D-W"`` or ``"C-M"``)."""
+    for line in model.options["line"]:
+        tokens = line.split()
+        if len(tokens) >= 2 and tokens[0].upper() == "HEADLOSS":
+            return tokens[1].upper()
+    return "H-W"
+
+
+def _section_tokens(model, section):
+    """Tokens of each data line of a raw section (comments stripped)."""
+    text = model.section_bytes(section).decode(model.encoding, errors="replace")
+    lines = (line.split(";", 1)[0].split() for line in text.splitlines())
+    return [tokens for tokens in lines if tokens]
+
+
+def _quality_ranges(model):
+    # "ID1 ID2 value" lines set a range of nodes; they cannot be filtered
+    # per node, so their end nodes are kept instead
+    return model.has_section("QUALITY") and any(len(t) > 2 for t in _section_tokens(model, "QUALITY"))
+
+
+def _priority(n):
+    # Deterministic pseudo-random order (Knuth multiplicative hash)
+    return (np.arange(n, dtype=np.uint64) * np.uint64(2654435761)) % np.uint64(2 ** 32)
+
+
+class _Network:
+    """Node/link arrays the reduction works on (0-based node numbers)."""
+
+    def __init__(self, model, max_diameter, keep, exponents):
+        junctions = model.junctions
+        others = [model.reservoirs["id"], model.tanks["id"]]
+        self.node_ids = np.array(junctions["id"].to_list() + [i for s in others for i in s.to_list()], dtype=object)
+        self.n_junctions = junctions.height
+        lookup = {nid: k for k, nid in enumerate(self.node_ids)}
+
+        pipes = model.pipes
+        self.pipe_ids = np.array(pipes["id"].to_list(), dtype=object)
+        self.n1 = np.array([lookup[v] for v in pipes["node1"].to_list()], dtype=np.int64)
+        self.n2 = np.array([lookup[v] for v in pipes["node2"].to_list()], dtype=np.int64)
+        self.length = pipes["length"].to_numpy().astype(np.float64)
+        self.diameter = pipes["diameter"].to_numpy().astype(np.float64)
+        self.rough = pipes["roughness"].to_numpy().astype(np.float64)
+        self.minor = pipes["minor_loss"].fill_null(0.0).to_numpy().astype(np.float64)
+        status = pipes["status"].fill_null("OPEN").str.to_uppercase()
+        self.flow_exp, self.d_exp, self.c_exp = exponents
+
+        n_nodes = len(self.node_ids)
+        self.alive_node = np.ones(n_nodes, dtype=bool)
+        self.alive_pipe = np.ones(len(self.pipe_ids), dtype=bool)
+        self.modified = np.zeros(len(self.pipe_ids), dtype=bool)
+        # Where each removed node's demand went, and which pipe absorbed each removed pipe
+        self.node_target = np.arange(n_nodes)
+        self.node_action = np.full(n_nodes, NODE_KEPT, dtype=object)
+        self.pipe_target = np.arange(len(self.pipe_ids))
+        self.pipe_action = np.full(len(self.pipe_ids), LINK_KEPT, dtype=object)
+
+        # Pipes the reduction may change; other links only pin their nodes
+        self.eligible = (status == "OPEN").to_numpy()
+        if max_diameter is not None:
+            self.eligible &= self.diameter <= max_diameter
+
+        removable = np.zeros(n_nodes, dtype=bool)
+        removable[:self.n_junctions] = True
+        pinned = set(keep or ())
+        for table in (model.pumps, model.valves):
+            pinned.update(table["node1"].to_list())
+            pinned.update(table["node2"].to_list())
+        protected_tokens = set()
+        sections = PROTECTING_SECTIONS + (("QUALITY",) if _quality_ranges(model) else ())
+        for section in sections:
+            if model.has_section(section):
+                protected_tokens.update(tok for tokens in _section_tokens(model, section) for tok in tokens)
+        pinned |= protected_tokens
+        for nid in pinned:
+            k = lookup.get(nid)
+            if k is not None:
+                removable[k] = False
+        pipe_pinned = np.array([pid in protected_tokens for pid in self.pipe_ids], dtype=bool)
+        self.eligible &= ~pipe_pinned
+        self.removable = removable
+        self.pinned_junctions = int((~removable[:self.n_junctions]).sum())
+        self.pinned_pipes = int(pipe_pinned.sum())
+
+        # Pumps and valves count towards node degree but are never merged
+        fixed = [np.array([lookup[v] for v in t["node1"].to_list() + t["node2"].to_list()], dtype=np.int64)
+                 for t in (model.pumps, model.valves)]
+        self.fixed_degree = np.bincount(np.concatenate(fixed), minlength=n_nodes) if fixed else 0
+
+    def resistance(self, diameter, rough):
+        return rough ** self.c_exp * diameter ** -self.d_exp
+
+    def degree(self):
+        ends = np.concatenate([self.n1[self.alive_pipe], self.n2[self.alive_pipe]])
+        return np.bincount(ends, minlength=len(self.node_ids)) + self.fixed_degree
+
+    def incidence(self):
+        """(node, pipe) pairs of alive pipes, sorted by node."""
+        pipes = np.flatnonzero(self.alive_pipe)
+        nodes = np.concatenate([self.n1[pipes], self.n2[pipes]])
+        pipes = np.concatenate([pipes, pipes])
+        order = np.argsort(nodes, kind="stable")
+        return nodes[order], pipes[order]
+
+    def other_end(self, pipes, nodes):
+        return np.where(self.n1[pipes] == nodes, self.n2[pipes], self.n1[pipes])
+
+    # ------------------------------------------------------------------
+    def trim_dead_ends(self):
+        deg = self.degree()
+        nodes, pipes = self.incidence()
+        leaf_rows = np.flatnonzero(self.removable[nodes] & self.alive_node[nodes] & (deg[nodes] == 1))
+        leaf, pipe = nodes[leaf_rows], pipes[leaf_rows]
+        ok = self.eligible[pipe]
+        leaf, pipe = leaf[ok], pipe[ok]
+        other = self.other_end(pipe, leaf)
+        # An isolated two-junction pipe would lose both ends; keep it. Only
+        # junctions take over demand, so leaves on a tank or reservoir stay
+        ok = ~((deg[other] == 1) & self.removable[other]) & (other < self.n_junctions)
+        leaf, pipe, other = leaf[ok], pipe[ok], other[ok]
+        if not leaf.size:
+            return 0
+        self.alive_node[leaf] = False
+        self.alive_pipe[pipe] = False
+        self.node_target[leaf] = other
+        self.node_action[leaf] = NODE_DEAD_END
+        self.pipe_target[pipe] = -1
+        self.pipe_action[pipe] = LINK_DEAD_END
+        return leaf.size
+
+    def merge_series(self):
+        deg = self.degree()
+        nodes, pipes = self.incidence()
+        first = np.searchsorted(nodes, np.arange(len(self.node_ids)))
+        cand = self.removable & self.alive_node & (deg == 2) & (np.bincount(nodes, minlength=len(deg)) == 2)
+        v = np.flatnonzero(cand)
+        a, b = pipes[first[v]], pipes[first[v] + 1]
+        ua, ub = self.other_end(a, v), self.other_end(b, v)
+        ok = self.eligible[a] & self.eligible[b] & (ua != ub) & (ua != v) & (ub != v)
+        ok &= (ua < self.n_junctions) | (ub < self.n_junctions)
+        v, a, b, ua, ub = v[ok], a[ok], b[ok], ua[ok], ub[ok]
+        if not v.size:
+            return 0
+        # Independent set: a candidate wins unless a candidate neighbour has higher priority
+        is_cand = np.zeros(len(deg), dtype=bool)
+        is_cand[v] = True
+        prio = _priority(len(deg))
+        win = ((~is_cand[ua]) | (prio[v] > prio[ua])) & ((~is_cand[ub]) | (prio[v] > prio[ub]))
+        v, a, b, ua, ub = v[win], a[win], b[win], ua[win], ub[win]
+
+        # Demand goes to the end across the shorter original pipe, or to the
+        # only junction end
+        junction_a, junction_b = ua < self.n_junctions, ub < self.n_junctions
+        target = np.where(junction_a & junction_b, np.where(self.length[a] <= self.length[b], ua, ub),
+                          np.where(junction_a, ua, ub))
+
+        # Keep the larger pipe (its diameter and roughness), fold the other into its length
+        keep_a = self.diameter[a] >= self.diameter[b]
+        k = np.where(keep_a, a, b)
+        d = np.where(keep_a, b, a)
+        r_k = self.resistance(self.diameter[k], self.rough[k])
+        r_d = self.resistance(self.diameter[d], self.rough[d])
+        self.length[k] = self.length[k] + self.length[d] * (r_d / r_k)
+        self.minor[k] = self.minor[k] + self.minor[d]
+        self.n1[k] = ua
+        self.n2[k] = ub
+        self.modified[k] = True
+        self.alive_pipe[d] = False
+        self.pipe_target[d] = k
+        self.pipe_action[d] = LINK_SERIES
+        self.pipe_action[k] = LINK_SERIES
+        self.alive_node[v] = False
+        self.node_target[v] = target
+        self.node_action[v] = NODE_SERIES
+        return v.size
+
+    def merge_parallel(self):
+        pipes = np.flatnonzero(self.alive_pipe & self.eligible & (self.n1 != self.n2))
+        if pipes.size < 2:
+            return 0
+        lo = np.minimum(self.n1[pipes], self.n2[pipes])
+        hi = np.maximum(self.n1[pipes], self.n2[pipes])
+        _, group, counts = np.unique(lo * len(self.node_ids) + hi, return_inverse=True, return_counts=True)
+        multi = counts[group] > 1
+        pipes, group = pipes[multi], group[multi]
+        if not pipes.size:
+            return 0
+        # Largest diameter of each group is kept
+        order = np.lexsort((-self.diameter[pipes], group))
+        pipes, group = pipes[order], group[order]
+        head = np.ones(pipes.size, dtype=bool)
+        head[1:] = group[1:] != group[:-1]
+        keeper = pipes[head][np.cumsum(head) - 1]
+
+        # Sum of conductances (r L)^(-1/n), then the diameter giving that conductance
+        n = self.flow_exp
+        conductance = (self.resistance(self.diameter[pipes], self.rough[pipes]) * self.length[pipes]) ** (-1.0 / n)
+        total = np.zeros(pipes.size)
+        np.add.at(total, np.cumsum(head) - 1, conductance)
+        k = pipes[head]
+        total = total[:k.size]
+        r_eq = total ** (-n) / self.length[k]
+        self.diameter[k] = (self.rough[k] ** self.c_exp / r_eq) ** (1.0 / self.d_exp)
+        self.modified[k] = True
+        self.pipe_action[k] = LINK_PARALLEL
+
+        dropped = ~head
+        d = pipes[dropped]
+        self.alive_pipe[d] = False
+        self.pipe_target[d] = keeper[dropped]
+        self.pipe_action[d] = LINK_PARALLEL
+        return d.size
+
+
+def _resolve(target):
+    # Follow target chains (removed -> removed -> kept) to their end
+    target = target.copy()
+    while True:
+        valid = target >= 0
+        nxt = np.where(valid, target[np.where(valid, target, 0)], -1)
+        if np.array_equal(nxt, target):
+            return target
+        target = nxt
+
+
+class SkeletonResult:
+    def __init__(self, output, node_map, link_map, stats):
+        """
+        Reduced model path plus mapping tables.
+
+        ``node_map``: ``original_id``, ``reduced_id`` (the retained node that
+        represents it / received its demand), ``action``.
+        ``link_map``: ``original_id``, ``reduced_id`` (equivalent pipe, null for
+        removed dead ends), ``action``.
+        """
+        self.output = output
+        self.node_map = node_map
+        self.link_map = link_map
+        self.stats = stats
+
+    @property
+    def retained_nodes(self):
+        return self.node_map.filter(pl.col("original_id") == pl.col("reduced_id"))["original_id"].to_list()
+
+    def write_mapping(self, path):
+        """One CSV with ``kind`` (node/link), ``original_id``, ``reduced_id``, ``action``."""
+        frames = [df.select(pl.lit(kind).alias("kind"), pl.all())
+                  for kind, df in (("node", self.node_map), ("link", self.link_map))]
+        pl.concat(frames).write_csv(path)
+        return path
+
+    def __repr__(self):
+        s = self.stats
+        return (f"SkeletonResult({self.output!r}, nodes {s['nodes_before']} -> {s['nodes_after']}, "
+                f"links {s['links_before']} -> {s['links_after']})")
+
+
+def skeletonize(inp_path, output, max_diameter=None, keep=None, dead_ends=True, series=True,
+                parallel=True, max_rounds=100, mapping_path=None):
+    """
+    Write a reduced model of ``inp_path`` to ``output``.
+
+    Parameters
+    ----------
+    max_diameter : float, optional
+        Only pipes up to this diameter (model units) are merged or removed.
+        Default: every open pipe.
+    keep : list of str, optional
+        Node IDs that must be retained (sensors, points of interest).
+    dead_ends, series, parallel : bool
+        Operations to apply; they are repeated until nothing changes.
+    mapping_path : str, optional
+        Also write the mapping table as CSV (``SkeletonResult.write_mapping``).
+
+    Returns
+    -------
+    SkeletonResult
+    """
+    model = LazyInpParser(inp_path)
+    try:
+        formula = headloss_formula(model)
+        if formula not in HEADLOSS_EXPONENTS:
+            raise ValueError(f"unsupported head loss formula {formula!r}")
+        net = _Network(model, max_diameter, keep, HEADLOSS_EXPONENTS[formula])
+        counts = {"dead_end_nodes": 0, "series_nodes": 0, "parallel_pipes": 0, "rounds": 0}
+        for _ in range(max_rounds):
+            changed = 0
+            if dead_ends:
+                n = net.trim_dead_ends()
+                counts["dead_end_nodes"] += n
+                changed += n
+            if parallel:
+                n = net.merge_parallel()
+                counts["parallel_pipes"] += n
+                changed += n
+            if series:
+                n = net.merge_series()
+                counts["series_nodes"] += n
+                changed += n
+            counts["rounds"] += 1
+            if not changed:
+                break
+
+        node_target = _resolve(net.node_target)
+        pipe_target = _resolve(net.pipe_target)
+        node_map = pl.DataFrame({
+            "original_id": net.node_ids.tolist(),
+            "reduced_id": net.node_ids[node_target].tolist(),
+            "action": net.node_action.tolist(),
+        })
+        link_map = pl.DataFrame({
+            "original_id": net.pipe_ids.tolist(),
+            "reduced_id": [net.pipe_ids[t] if t >= 0 else None for t in pipe_target.tolist()],
+            "action": net.pipe_action.tolist(),
+        }, schema={"original_id": pl.Utf8, "reduced_id": pl.Utf8, "action": pl.Utf8})
+        _write_reduced(model, net, node_map, output)
+        other_links = model.pumps.height + model.valves.height
+    finally:
+        model.close()
+
+    stats = dict(counts, nodes_before=len(net.node_ids), nodes_after=int(net.alive_node.sum()),
+                 links_before=net.alive_pipe.size + other_links,
+                 links_after=int(net.alive_pipe.sum()) + other_links, headloss=formula,
+                 pinned_junctions=net.pinned_junctions, pinned_pipes=net.pinned_pipes)
+    result = SkeletonResult(output, node_map, link_map, stats)
+    if mapping_path is not None:
+        result.write_mapping(mapping_path)
+    return result
+
+
+def _write_reduced(model, net, node_map, output):
+    alive_nodes = pl.Series(net.node_ids[net.alive_node].tolist(), dtype=pl.Utf8)
+    alive_pipes = np.flatnonzero(net.alive_pipe)
+    removed_links = set(net.pipe_ids[~net.alive_pipe].tolist())
+    reshaped = set(net.pipe_ids[net.modified & net.alive_pipe].tolist())
+
+    # Demands follow their node to the retained representative
+    demands = (
+        model.demand_categories()
+        .join(node_map.select(pl.col("original_id").alias("id"), "reduced_id"), on="id", how="left")
+        .select(pl.col("reduced_id").alias("id"), "demand", "pattern")
+    )
+    junctions = (
+        model.junctions.filter(pl.col("id").is_in(alive_nodes.implode()))
+        .with_columns(pl.lit(0.0).alias("demand"), pl.lit(None, dtype=pl.Utf8).alias("pattern"))
+    )
+    pipes = model.pipes[alive_pipes].with_columns(
+        pl.Series("node1", net.node_ids[net.n1[alive_pipes]].tolist(), dtype=pl.Utf8),
+        pl.Series("node2", net.node_ids[net.n2[alive_pipes]].tolist(), dtype=pl.Utf8),
+        pl.Series("length", net.length[alive_pipes]),
+        pl.Series("diameter", net.diameter[alive_pipes]),
+        pl.Series("minor_loss", net.minor[alive_pipes]),
+    )
+    tables = {"JUNCTIONS": junctions, "PIPES": pipes, "DEMANDS": demands}
+    if model.has_section("COORDINATES"):
+        tables["COORDINATES"] = model.coordinates.filter(pl.col("id").is_in(alive_nodes.implode()))
+    if model.has_section("VERTICES"):
+        gone = pl.Series(sorted(removed_links | reshaped), dtype=pl.Utf8)
+        tables["VERTICES"] = model.vertices.filter(~pl.col("id").is_in(gone.implode()))
+    if model.has_section("QUALITY") and not _quality_ranges(model):
+        tables["QUALITY"] = model.table("QUALITY").filter(pl.col("id").is_in(alive_nodes.implode()))
+    if model.has_section("TAGS"):
+        removed = pl.Series(net.node_ids[~net.alive_node].tolist() + sorted(removed_links), dtype=pl.Utf8)
+        tables["TAGS"] = model.table("TAGS").filter(~pl.col("id").is_in(removed.implode()))
+    model.write_inp(output, tables=tables)
+
+
+def check_accuracy(full_inp, reduced, nodes=None, openmp=True):
+    """
+    Compare reduced vs. full model pressures at retained nodes.
+
+    Parameters
+    ----------
+    full_inp : str
+    reduced : SkeletonResult or str
+        Reduced model (a path compares every node both models share).
+    nodes : list of str, optional
+        Subset of retained nodes to compare.
+
+    Returns
+    -------
+    dict with ``summary`` (max/mean/p95 absolute error, worst node and
+    time) and ``per_node`` (Polars frame: id, max_abs_error, mean_abs_error).
+    """
+    reduced_path = reduced.output if isinstance(reduced, SkeletonResult) else reduced
+    if nodes is None:
+        if isinstance(reduced, SkeletonResult):
+            nodes = reduced.retained_nodes
+        else:
+            with LazyInpParser(full_inp) as a, LazyInpParser(reduced_path) as b:
+                ids = lambda m: set().union(*(m.table(s, ["id"])["id"].to_list()
+                                              for s in ("JUNCTIONS", "RESERVOIRS", "TANKS")))
+                nodes = sorted(ids(a) & ids(b))
+    full = run_simulation(full_inp, nodes=nodes, openmp=openmp)
+    red = run_simulation(reduced_path, nodes=nodes, openmp=openmp)
+    steps = min(full.n_steps, red.n_steps)
+    err = np.abs(red.pressures[:steps] - full.pressures[:steps])
+    worst = np.unravel_index(np.argmax(err), err.shape) if err.size else (0, 0)
+    summary = {
+        "nodes": len(nodes),
+        "steps": steps,
+        "max_abs_error": float(err.max()) if err.size else 0.0,
+        "mean_abs_error": float(err.mean()) if err.size else 0.0,
+        "p95_abs_error": float(np.percentile(err, 95)) if err.size else 0.0,
+        "worst_node": nodes[worst[1]] if err.size else None,
+        "worst_time": int(full.times[worst[0]]) if err.size else None,
+    }
+    per_node = pl.DataFrame({
+        "id": list(nodes),
+        "max_abs_error": err.max(axis=0) if err.size else np.zeros(len(nodes)),
+        "mean_abs_error": err.mean(axis=0) if err.size else np.zeros(len(nodes)),
+    })
+    return {"summary": summary, "per_node": per_node}
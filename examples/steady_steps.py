@@ -0,0 +1,159 @@
+"""
+EPANET-Turbo Steady-Step Skipping
+=================================
+
+Long extended-period runs with a short hydraulic step spend most solves
+on steps whose inputs are the same as at the previous solve (flat night
+demands, a pattern step of 1 h over a hydraulic step of 5 min).
+``SteadySteps`` lets ``run_simulation`` skip ``EN_runH`` on such steps and
+carry the last converged solution forward. A step is steady when, compared
+with the last solved step:
+
+* every time pattern has the same multiplier (same pattern period, or equal
+  factors in both periods), and the demand multiplier is unchanged;
+* every link has the same status and setting (so no rule action fired
+  in ``EN_nextH``), and no boundary-condition row was pushed;
+* no simple control is due: no timer / time-of-day control at this time,
+  and no tank-level control whose condition holds and would change its link;
+* every tank level is within ``tank_tol`` of its level at that solve.
+
+``EN_nextH`` keeps advancing tanks with the carried flows, so tank levels,
+energy and time stepping stay those of the kernel; junction heads and
+flows lag by at most the change that ``tank_tol`` allows.
+
+Usage:
+------
+    from steady_steps import SteadySteps
+    from turbo_simulation import run_simulation
+
+    res = run_simulation("big_5min.inp", steady=SteadySteps(tank_tol=0.005))
+    res.profile        # {'hydraulic_steps': 289, 'solved_steps': 53, 'skipped_steps': 236, ...}
+"""
+
+import numpy as np
+
+try:
+    from .turbo_kernel import (EN_DEMANDMULT, EN_ELEVATION, EN_HEAD, EN_HILEVEL, EN_LOWLEVEL, EN_PATCOUNT,
+                               EN_PATTERNSTART, EN_PATTERNSTEP, EN_PIPE, EN_SETTING, EN_STARTTIME, EN_STATUS, EN_TANK,
+                               EN_TANKCOUNT, EN_TIMEOFDAY, EN_TIMER)
+except ImportError:
+    from turbo_kernel import (EN_DEMANDMULT, EN_ELEVATION, EN_HEAD, EN_HILEVEL, EN_LOWLEVEL, EN_PATCOUNT,
+                              EN_PATTERNSTART, EN_PATTERNSTEP, EN_PIPE, EN_SETTING, EN_STARTTIME, EN_STATUS, EN_TANK,
+                              EN_TANKCOUNT, EN_TIMEOFDAY, EN_TIMER)
+
+SECONDS_PER_DAY = 86400
+# EN_getcontrol reports pipe status settings as +/- this sentinel
+STATUS_SENTINEL = 1e9
+
+
+class SteadySteps:
+    def __init__(self, tank_tol=0.01):
+        """
+        Detect hydraulic steps whose inputs did not change since the last solve.
+
+        Parameters
+        ----------
+        tank_tol : float
+            Largest tank level change (model length units) since the last
+            solve for which a step still counts as steady. 0 skips only
+            steps without any tank movement.
+        """
+        self.tank_tol = float(tank_tol)
+        self.solved_steps = 0
+        self.skipped_steps = 0
+
+    def start(self, proj):
+        """Read the static inputs of ``proj`` (patterns, controls, tanks) before a run."""
+        self.solved_steps = 0
+        self.skipped_steps = 0
+        self._last = None
+
+        n_patterns = proj.count(EN_PATCOUNT)
+        factors = [proj.get_pattern(i) for i in range(1, n_patterns + 1)]
+        self._lengths = np.array([max(f.size, 1) for f in factors], dtype=np.int64)
+        self._factors = np.ones((n_patterns, int(self._lengths.max()) if n_patterns else 1))
+        for i, f in enumerate(factors):
+            self._factors[i, :f.size] = f
+        self._pattern_step = max(proj.get_time_param(EN_PATTERNSTEP), 1)
+        self._pattern_start = proj.get_time_param(EN_PATTERNSTART)
+        self._clock_start = proj.get_time_param(EN_STARTTIME)
+
+        # Tanks and reservoirs are the last EN_TANKCOUNT nodes
+        storage = np.arange(proj.num_nodes - proj.count(EN_TANKCOUNT) + 1, proj.num_nodes + 1, dtype=np.int32)
+        self._tanks = storage[proj.node_types(storage) == EN_TANK]
+        self._tank_elevation = proj.get_node_values(EN_ELEVATION, indices=self._tanks)
+
+        types, links, settings, ctl_nodes, levels = proj.get_controls()
+        self._timer_times = levels[types == EN_TIMER].astype(np.int64)
+        self._clock_times = levels[types == EN_TIMEOFDAY].astype(np.int64) % SECONDS_PER_DAY
+        level = ((types == EN_LOWLEVEL) | (types == EN_HILEVEL)) & np.isin(ctl_nodes, self._tanks)
+        self._level_controls = (types[level], links[level], settings[level],
+                                np.searchsorted(self._tanks, ctl_nodes[level]), levels[level])
+        self._level_link_is_pipe = proj.link_types(links[level]) <= EN_PIPE if level.any() else np.zeros(0, bool)
+        self._status = np.empty(proj.num_links)
+        self._setting = np.empty(proj.num_links)
+
+    def _period_factors(self, t):
+        period = (t + self._pattern_start) // self._pattern_step
+        return self._factors[np.arange(self._lengths.size), period % self._lengths]
+
+    def _levels(self, proj):
+        return proj.get_node_values(EN_HEAD, indices=self._tanks) - self._tank_elevation
+
+    def _links(self, proj):
+        proj.get_link_values(EN_STATUS, out=self._status)
+        proj.get_link_values(EN_SETTING, out=self._setting)
+
+    def _control_due(self, t, levels):
+        if np.any(self._timer_times == t) or np.any(self._clock_times == (t + self._clock_start) % SECONDS_PER_DAY):
+            return True
+        kinds, links, settings, tanks, thresholds = self._level_controls
+        if not kinds.size:
+            return False
+        level = levels[tanks]
+        holds = np.where(kinds == EN_LOWLEVEL, level <= thresholds + self.tank_tol,
+                         level >= thresholds - self.tank_tol)
+        # Would the control change its link? (status first, then pump speed / valve setting)
+        closed = self._status[links - 1] == 0
+        ctl_closed = settings <= 0
+        ctl_value = (np.abs(settings) < STATUS_SENTINEL) & ~self._level_link_is_pipe & ~ctl_closed
+        changes = (closed != ctl_closed) | (ctl_value & ~np.isclose(self._setting[links - 1], settings))
+        return bool(np.any(holds & changes))
+
+    def is_steady(self, proj, t, pushed=False):
+        """
+        True when the step about to be solved at ``t`` may reuse the last
+        solution; counts it as skipped. ``pushed`` marks a step on which
+        new boundary values were set.
+        """
+        if self._last is None or pushed:
+            return False
+        factors, mult, levels, status, setting = self._last
+        # Cheapest checks first; link states need two full sweeps
+        now_levels = self._levels(proj)
+        if now_levels.size and np.abs(now_levels - levels).max() > self.tank_tol:
+            return False
+        if proj.get_option(EN_DEMANDMULT) != mult or not np.array_equal(self._period_factors(t), factors):
+            return False
+        self._links(proj)
+        if not (np.array_equal(self._status, status) and np.array_equal(self._setting, setting)):
+            return False
+        if self._control_due(t, now_levels):
+            return False
+        self.skipped_steps += 1
+        return True
+
+    def solved(self, proj, t):
+        """Remember the inputs of the step just solved at ``t``."""
+        self.solved_steps += 1
+        self._links(proj)
+        self._last = (self._period_factors(t), proj.get_option(EN_DEMANDMULT), self._levels(proj),
+                      self._status.copy(), self._setting.copy())
+
+    def stats(self):
+        total = self.solved_steps + self.skipped_steps
+        return {"solved_steps": self.solved_steps, "skipped_steps": self.skipped_steps,
+                "skipped_fraction": self.skipped_steps / total if total else 0.0}
+
+    def __repr__(self):
+        return f"SteadySteps(tank_tol={self.tank_tol}, solved={self.solved_steps}, skipped={self.skipped_steps})"
@@ -0,0 +1,310 @@
+"""
+EPANET-Turbo Parallel Stream Queries
+====================================
+
+Scans Protocol V2 ``.out`` files with a thread pool instead of one NumPy
+call over the whole memmap. Every query is split into chunks of whole
+time-step blocks (``chunk_bytes`` each). Workers reduce their chunks with
+NumPy, which releases the GIL in its loops, so page faults and arithmetic
+overlap across threads. The partial results are then combined.
+
+* ``reduce``     - per-element min / max / mean / sum / std over a time range
+* ``extract``    - (T, k) float32 array of a node / link subset
+* ``exceedance`` - per-element threshold scan: steps beyond the threshold,
+                   first time it happened, worst value
+
+The file is mapped once (``mmap``). The mapping is advised
+``MADV_SEQUENTIAL``, each chunk ``MADV_WILLNEED`` before it is read (so
+the kernel reads it ahead in large requests), and ``MADV_DONTNEED`` after
+it is reduced (``release=True``). The resident set then stays near
+``workers x chunk_bytes`` even for files far larger than RAM. Platforms
+without ``madvise`` simply skip the hints.
+
+Usage:
+------
+    from stream_query import StreamQuery
+
+    with StreamQuery("big.out", workers=8) as q:
+        low = q.reduce("pressure", "min", start=6 * 3600, end=18 * 3600)      # (N,) float64
+        sensors = q.extract("pressure", elements=sensor_ids)                  # (T, k) float32
+        scan = q.exceedance("pressure", 20.0, below=True)
+        scan["count"], scan["first_time"], scan["worst"]
+"""
+
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    from .streaming_v2 import CHANNELS, HEADER_SIZE, block_dtype, load_streaming_result
+except ImportError:
+    from streaming_v2 import CHANNELS, HEADER_SIZE, block_dtype, load_streaming_result
+
+# Bytes of blocks per work item: large enough for long sequential reads,
+# small enough to spread a file over all workers
+CHUNK_BYTES = 64 << 20
+STATS = ("min", "max", "sum", "mean", "std")
+_PAGE = getattr(mmap, "ALLOCATIONGRANULARITY", mmap.PAGESIZE)
+_KINDS = {name: kind for _, name, kind in CHANNELS}
+
+
+class StreamQuery:
+    def __init__(self, filepath, workers=None, chunk_bytes=CHUNK_BYTES, release=True):
+        """
+        Map a Protocol V2 stream for parallel chunked queries.
+
+        Parameters
+        ----------
+        filepath : str
+            ``.out`` file (the ``.meta.json`` sidecar provides element IDs).
+        workers : int, optional
+            Threads; defaults to the CPU count.
+        chunk_bytes : int
+            Target size of one work item, rounded to whole blocks.
+        release : bool
+            Drop each chunk's pages from the mapping once it is processed.
+        """
+        result = load_streaming_result(filepath)     # header, sidecar and checks
+        self.filepath = result.filepath
+        self.meta = result.meta
+        self.rpt_step = result.rpt_step
+        self.dtype = block_dtype(result.n_nodes, result.n_links, result.channels)
+        self.n_steps = result.n_steps
+        self.workers = max(int(workers or os.cpu_count() or 1), 1)
+        self.chunk_steps = max(int(chunk_bytes) // self.dtype.itemsize, 1)
+        self.release = release
+        self._pool = None
+        self._lookup = {}
+        self._mm = None
+        if self.n_steps:
+            with open(self.filepath, "rb") as fh:
+                self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            self._advise("MADV_SEQUENTIAL", 0, len(self._mm))
+            self.blocks = np.frombuffer(self._mm, dtype=self.dtype, count=self.n_steps, offset=HEADER_SIZE)
+        else:
+            self.blocks = np.zeros(0, dtype=self.dtype)
+
+    # ------------------------------------------------------------------
+    # Layout
+    # ------------------------------------------------------------------
+    @property
+    def channels(self):
+        return [name for name in self.dtype.names if name != "t"]
+
+    @property
+    def node_ids(self):
+        return self.meta.get("ids", {}).get("nodes")
+
+    @property
+    def link_ids(self):
+        return self.meta.get("ids", {}).get("links")
+
+    @property
+    def times(self):
+        """Strided view of the block times (touches one page per block when read)."""
+        return self.blocks["t"]
+
+    def rows(self, start=None, end=None):
+        """Block range ``[lo, hi)`` covering times ``start <= t <= end`` (binary search)."""
+        times = self.times
+        lo = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+        hi = self.n_steps if end is None else int(np.searchsorted(times, end, side="right"))
+        return lo, max(hi, lo)
+
+    def element_index(self, channel, elements):
+        """0-based columns of ``elements`` (IDs or 0-based positions) in ``channel``; None = all."""
+        if elements is None:
+            return None
+        elements = list(elements) if not isinstance(elements, np.ndarray) else elements
+        if len(elements) and isinstance(elements[0], str):
+            kind = _KINDS[channel]
+            if kind not in self._lookup:
+                ids = self.node_ids if kind == "nodes" else self.link_ids
+                if ids is None:
+                    raise ValueError(f"{self.filepath} has no sidecar IDs; select {kind} by position")
+                self._lookup[kind] = {eid: i for i, eid in enumerate(ids)}
+            try:
+                return np.fromiter((self._lookup[kind][e] for e in elements), dtype=np.intp)
+            except KeyError as e:
+                raise KeyError(f"unknown {kind[:-1]} ID {e.args[0]!r}") from None
+        return np.asarray(elements, dtype=np.intp)
+
+    def _check_channel(self, channel):
+        if channel not in self.channels:
+            raise KeyError(f"no {channel!r} channel in {self.filepath} (has {self.channels})")
+
+    # ------------------------------------------------------------------
+    # Chunked execution
+    # ------------------------------------------------------------------
+    def _advise(self, option, start, length):
+        flag = getattr(mmap, option, None)
+        if flag is None or self._mm is None or not hasattr(self._mm, "madvise"):
+            return
+        begin = start - start % _PAGE
+        length = min(start + length, len(self._mm)) - begin
+        if length > 0:
+            self._mm.madvise(flag, begin, length)
+
+    def _chunk(self, fn, lo, hi):
+        start = HEADER_SIZE + lo * self.dtype.itemsize
+        length = (hi - lo) * self.dtype.itemsize
+        self._advise("MADV_WILLNEED", start, length)
+        try:
+            return fn(lo, self.blocks[lo:hi])
+        finally:
+            if self.release:
+                self._advise("MADV_DONTNEED", start, length)
+
+    def map_chunks(self, fn, start=None, end=None):
+        """
+        Apply ``fn(first_row, blocks)`` to block-aligned chunks of the time
+        range in the thread pool; returns the results in time order.
+        """
+        if self._mm is None and self.n_steps:
+            raise ValueError(f"{self.filepath}: query is closed")
+        lo, hi = self.rows(start, end)
+        bounds = [(a, min(a + self.chunk_steps, hi)) for a in range(lo, hi, self.chunk_steps)]
+        if len(bounds) <= 1 or self.workers == 1:
+            return [self._chunk(fn, a, b) for a, b in bounds]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="stream-query")
+        return list(self._pool.map(lambda ab: self._chunk(fn, *ab), bounds))
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def reduce(self, channel, stat="mean", start=None, end=None, elements=None):
+        """
+        Per-element statistic over the blocks with ``start <= t <= end``.
+
+        Parameters
+        ----------
+        channel : str
+            ``"pressure"``, ``"flow"``, ``"node_quality"`` or ``"link_quality"``.
+        stat : str
+            One of ``STATS``; sums are accumulated in float64.
+        elements : list of str or array of int, optional
+            Restrict to these elements (IDs or 0-based positions).
+
+        Returns
+        -------
+        ndarray
+            float64, one value per element (NaN for an empty range).
+        """
+        self._check_channel(channel)
+        if stat not in STATS:
+            raise ValueError(f"stat must be one of {STATS}, got {stat!r}")
+        idx = self.element_index(channel, elements)
+
+        def partial(_, blocks):
+            values = blocks[channel] if idx is None else blocks[channel][:, idx]
+            if stat == "min":
+                return values.min(axis=0).astype(np.float64)
+            if stat == "max":
+                return values.max(axis=0).astype(np.float64)
+            total = values.sum(axis=0, dtype=np.float64)
+            if stat == "std":
+                return len(values), total, np.square(values, dtype=np.float64).sum(axis=0)
+            return len(values), total
+
+        parts = self.map_chunks(partial, start, end)
+        n_cols = self.dtype[channel].shape[0] if idx is None else idx.size
+        if not parts:
+            return np.full(n_cols, np.nan)
+        if stat == "min":
+            return np.minimum.reduce(parts)
+        if stat == "max":
+            return np.maximum.reduce(parts)
+        count = sum(p[0] for p in parts)
+        total = np.add.reduce([p[1] for p in parts])
+        if stat == "sum":
+            return total
+        mean = total / count
+        if stat == "mean":
+            return mean
+        squares = np.add.reduce([p[2] for p in parts])
+        return np.sqrt(np.maximum(squares / count - mean * mean, 0.0))
+
+    def extract(self, channel, elements=None, start=None, end=None):
+        """
+        Copy a (T, k) float32 slab of ``channel`` out of the file, with
+        every chunk gathered by its own worker into its rows of the result.
+        """
+        self._check_channel(channel)
+        idx = self.element_index(channel, elements)
+        lo, hi = self.rows(start, end)
+        n_cols = self.dtype[channel].shape[0] if idx is None else idx.size
+        out = np.empty((hi - lo, n_cols), dtype=np.float32)
+
+        def gather(first, blocks):
+            rows = out[first - lo:first - lo + len(blocks)]
+            if idx is None:
+                rows[...] = blocks[channel]
+            else:
+                np.take(blocks[channel], idx, axis=1, out=rows)
+
+        self.map_chunks(gather, start, end)
+        return out
+
+    def exceedance(self, channel, threshold, below=False, start=None, end=None, elements=None):
+        """
+        Per-element threshold scan.
+
+        Returns
+        -------
+        dict
+            ``count`` (int64 steps with value < threshold when ``below``,
+            > threshold otherwise), ``first_time`` (int64 time of the first
+            such step, -1 if none), ``worst`` (float64 minimum when
+            ``below``, maximum otherwise) and ``steps`` (blocks scanned).
+        """
+        self._check_channel(channel)
+        idx = self.element_index(channel, elements)
+
+        def partial(_, blocks):
+            values = blocks[channel] if idx is None else blocks[channel][:, idx]
+            hit = values < threshold if below else values > threshold
+            any_hit = hit.any(axis=0)
+            first = np.where(any_hit, blocks["t"][hit.argmax(axis=0)], -1)
+            worst = values.min(axis=0) if below else values.max(axis=0)
+            return hit.sum(axis=0), first.astype(np.int64), worst.astype(np.float64), len(values)
+
+        parts = self.map_chunks(partial, start, end)
+        n_cols = self.dtype[channel].shape[0] if idx is None else idx.size
+        count = np.zeros(n_cols, dtype=np.int64)
+        first = np.full(n_cols, -1, dtype=np.int64)
+        worst = np.full(n_cols, np.nan)
+        steps = 0
+        for hits, first_t, extreme, n in parts:          # time order: keep the earliest hit
+            count += hits
+            first = np.where(first < 0, first_t, first)
+            worst = np.fmin(worst, extreme) if below else np.fmax(worst, extreme)
+            steps += n
+        return {"count": count, "first_time": first, "worst": worst, "steps": steps}
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self.blocks = np.zeros(0, dtype=self.dtype)
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                pass        # arrays handed out still view the mapping; it closes with them
+            self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return (f"StreamQuery({self.filepath!r}, steps={self.n_steps}, channels={self.channels}, "
+                f"workers={self.workers}, chunk_steps={self.chunk_steps})")
@@ -0,0 +1,244 @@
+"""
+EPANET-Turbo Protocol V2 Streams
+================================
+
+Writer and memmap reader for the Protocol V2 result files described in
+``OUTPUT_FORMAT.md`` (``{name}.out`` + ``{name}.meta.json``).
+
+Besides the classic pressure/flow blocks, a stream can carry water quality
+channels. The enabled channels are stored as a bitmask in the first
+reserved header word (offset ``0x1C``); ``0`` means the original layout
+(pressures + flows), so files written before the channel field existed
+still load unchanged.
+
+Usage:
+------
+    from streaming_v2 import StreamingWriter, load_streaming_result, CH_NODE_QUALITY
+
+    with StreamingWriter("age.out", node_ids, link_ids, rpt_step=3600,
+                         channels=CH_NODE_QUALITY) as sink:
+        sink.write_block(t, node_quality=buf)
+
+    res = load_streaming_result("age.out")
+    res.node_quality[24, 0]                 # memmap view, shape (T, N)
+"""
+
+import json
+import os
+import struct
+from datetime import datetime
+
+import numpy as np
+
+MAGIC = b"EPST"
+PROTOCOL_VERSION = 2
+HEADER_SIZE = 512
+# magic, version, n_nodes, n_links, start_ts, rpt_step, channels
+_HEADER = struct.Struct("<4siiiqii")
+
+# Channel bitmask (header offset 0x1C)
+CH_PRESSURE = 1
+CH_FLOW = 2
+CH_NODE_QUALITY = 4
+CH_LINK_QUALITY = 8
+CH_LEGACY = CH_PRESSURE | CH_FLOW
+
+# channel bit -> (block field, element kind), in on-disk order
+CHANNELS = (
+    (CH_PRESSURE, "pressure", "nodes"),
+    (CH_FLOW, "flow", "links"),
+    (CH_NODE_QUALITY, "node_quality", "nodes"),
+    (CH_LINK_QUALITY, "link_quality", "links"),
+)
+
+
+def block_dtype(n_nodes, n_links, channels=CH_LEGACY):
+    """Structured dtype of one time-step block: int32 t + float32 arrays."""
+    sizes = {"nodes": n_nodes, "links": n_links}
+    fields = [("t", "<i4")]
+    for bit, name, kind in CHANNELS:
+        if channels & bit:
+            fields.append((name, "<f4", (sizes[kind],)))
+    return np.dtype(fields)
+
+
+def meta_path(out_path):
+    root, _ = os.path.splitext(os.fspath(out_path))
+    return root + ".meta.json"
+
+
+class StreamingWriter:
+    def __init__(self, filepath, node_ids, link_ids, rpt_step, start_ts=0,
+                 channels=CH_LEGACY, config=None, engine_version="2.3.0"):
+        """
+        Append-only Protocol V2 writer.
+
+        Each ``write_block`` call copies the given arrays into one reusable
+        block record (cast to float32) and issues a single ``write``.
+
+        Parameters
+        ----------
+        filepath : str
+            ``.out`` path; the ``.meta.json`` sidecar is written on close.
+        node_ids, link_ids : list of str
+        rpt_step : int
+            Reporting step (s) stored in the header.
+        start_ts : int
+            Unix timestamp of T=0.
+        channels : int
+            Bitmask of CH_* channels contained in each block.
+        config : dict, optional
+            Extra entries for the ``config`` section of the sidecar.
+        """
+        self.filepath = os.fspath(filepath)
+        self.node_ids = list(node_ids)
+        self.link_ids = list(link_ids)
+        self.rpt_step = int(rpt_step)
+        self.start_ts = int(start_ts)
+        self.channels = int(channels)
+        self.config = dict(config or {})
+        self.engine_version = engine_version
+        self.n_steps = 0
+
+        self.dtype = block_dtype(len(self.node_ids), len(self.link_ids), self.channels)
+        self._block = np.zeros(1, dtype=self.dtype)
+        self._fh = open(self.filepath, "wb")
+        header = _HEADER.pack(MAGIC, PROTOCOL_VERSION, len(self.node_ids), len(self.link_ids),
+                              self.start_ts, self.rpt_step,
+                              0 if self.channels == CH_LEGACY else self.channels)
+        self._fh.write(header.ljust(HEADER_SIZE, b"\0"))
+
+    @property
+    def block_size(self):
+        return self.dtype.itemsize
+
+    def write_block(self, t, pressure=None, flow=None, node_quality=None, link_quality=None):
+        """Append the block for time ``t`` (s); every enabled channel must be given."""
+        given = {"pressure": pressure, "flow": flow,
+                 "node_quality": node_quality, "link_quality": link_quality}
+        block = self._block[0]
+        block["t"] = t
+        for bit, name, _ in CHANNELS:
+            if not self.channels & bit:
+                continue
+            values = given[name]
+            if values is None:
+                raise ValueError(f"stream has a '{name}' channel but no values were given")
+            block[name] = values
+        self._fh.write(self._block.data)
+        self.n_steps += 1
+
+    def close(self):
+        if self._fh is None:
+            return
+        self._fh.close()
+        self._fh = None
+        meta = {
+            "protocol": PROTOCOL_VERSION,
+            "engine_version": self.engine_version,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "config": {"rpt_step": self.rpt_step, "start_time": self.start_ts, **self.config},
+            "stats": {"nodes": len(self.node_ids), "links": len(self.link_ids), "steps": self.n_steps},
+            "channels": [name for bit, name, _ in CHANNELS if self.channels & bit],
+            "ids": {"nodes": self.node_ids, "links": self.link_ids},
+        }
+        with open(meta_path(self.filepath), "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StreamingResult:
+    def __init__(self, filepath, header, blocks, meta):
+        self.filepath = filepath
+        self.n_nodes = header["n_nodes"]
+        self.n_links = header["n_links"]
+        self.start_ts = header["start_ts"]
+        self.rpt_step = header["rpt_step"]
+        self.channels = header["channels"]
+        self.blocks = blocks
+        self.meta = meta
+
+    @property
+    def node_ids(self):
+        return self.meta.get("ids", {}).get("nodes")
+
+    @property
+    def link_ids(self):
+        return self.meta.get("ids", {}).get("links")
+
+    @property
+    def n_steps(self):
+        return len(self.blocks)
+
+    @property
+    def times(self):
+        return self.blocks["t"]
+
+    def _channel(self, name):
+        if name not in self.blocks.dtype.names:
+            return None
+        return self.blocks[name]
+
+    @property
+    def pressures(self):
+        return self._channel("pressure")
+
+    @property
+    def flows(self):
+        return self._channel("flow")
+
+    @property
+    def node_quality(self):
+        return self._channel("node_quality")
+
+    @property
+    def link_quality(self):
+        return self._channel("link_quality")
+
+    def __repr__(self):
+        names = [n for n in self.blocks.dtype.names if n != "t"]
+        return f"StreamingResult({self.filepath!r}, steps={self.n_steps}, channels={names})"
+
+
+def read_header(filepath):
+    with open(filepath, "rb") as fh:
+        raw = fh.read(HEADER_SIZE)
+    if len(raw) < HEADER_SIZE:
+        raise ValueError(f"{filepath}: truncated Protocol V2 header")
+    magic, version, n_nodes, n_links, start_ts, rpt_step, channels = _HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError(f"{filepath}: not an EPANET-Turbo stream (magic={magic!r})")
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"{filepath}: unsupported protocol version {version}")
+    return {"n_nodes": n_nodes, "n_links": n_links, "start_ts": start_ts,
+            "rpt_step": rpt_step, "channels": channels or CH_LEGACY}
+
+
+def load_streaming_result(filepath):
+    """
+    Map a Protocol V2 ``.out`` file (and its sidecar, when present).
+
+    Channel arrays are strided views into one read-only memmap, so nothing
+    is read from disk until it is indexed. A partially written trailing
+    block (e.g. from a running simulation) is ignored.
+    """
+    filepath = os.fspath(filepath)
+    header = read_header(filepath)
+    dtype = block_dtype(header["n_nodes"], header["n_links"], header["channels"])
+    n_steps = (os.path.getsize(filepath) - HEADER_SIZE) // dtype.itemsize
+    if n_steps > 0:
+        blocks = np.memmap(filepath, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(n_steps,))
+    else:
+        blocks = np.zeros(0, dtype=dtype)
+
+    meta = {}
+    sidecar = meta_path(filepath)
+    if os.path.exists(sidecar):
+        with open(sidecar, encoding="utf-8") as fh:
+            meta = json.load(fh)
+    return StreamingResult(filepath, header, blocks, meta)
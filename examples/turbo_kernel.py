@@ -0,0 +1,1032 @@
+"""
+EPANET-Turbo Kernel Bridge
+==========================
+
+Open ctypes binding to the bundled kernel (``dll/``) over its public C ABI
+(``include/epanet2_2.h``, ``include/epanet_bulk.h``, ``include/epanet_turbo.h``),
+plus ``ResidentProject``: an Open-Once project handle that keeps the model
+in kernel memory and exposes the Batch API and bulk getters on NumPy arrays.
+
+The toolkit modules in ``examples/`` build on this file. Indices follow the
+kernel convention (1-based, as returned by ``EN_getnodeindex``).
+
+Usage:
+------
+    from turbo_kernel import ResidentProject, EN_BASEDEMAND, EN_PRESSURE
+
+    with ResidentProject("Net3.inp") as proj:
+        idx = proj.node_index(["101", "103"])
+        proj.set_node_values(idx, EN_BASEDEMAND, [120.0, 80.0])
+
+        proj.init_hydraulics()
+        t = proj.run_step()
+        pressures = proj.get_node_values(EN_PRESSURE)
+
+        # Step-wise, with reused buffers and early termination
+        for t, pressures, flows in proj.iter_steps():
+            if pressures.min() < 0:
+                break
+"""
+
+import ctypes
+import os
+import sys
+
+import numpy as np
+
+# --- Subset of epanet2_enums.h -------------------------------------------
+# Node properties
+EN_ELEVATION = 0
+EN_BASEDEMAND = 1
+EN_PATTERN = 2
+EN_EMITTER = 3
+EN_INITQUAL = 4
+EN_SOURCEQUAL = 5
+EN_SOURCEPAT = 6
+EN_SOURCETYPE = 7
+EN_TANKLEVEL = 8
+EN_DEMAND = 9
+EN_HEAD = 10
+EN_PRESSURE = 11
+EN_QUALITY = 12
+EN_TANKDIAM = 17
+EN_MINVOLUME = 18
+EN_VOLCURVE = 19
+EN_MINLEVEL = 20
+EN_MAXLEVEL = 21
+EN_CANOVERFLOW = 26
+
+# Link properties
+EN_DIAMETER = 0
+EN_LENGTH = 1
+EN_ROUGHNESS = 2
+EN_MINORLOSS = 3
+EN_INITSTATUS = 4
+EN_INITSETTING = 5
+EN_KBULK = 6
+EN_KWALL = 7
+EN_FLOW = 8
+EN_VELOCITY = 9
+EN_HEADLOSS = 10
+EN_STATUS = 11
+EN_SETTING = 12
+EN_LINKQUAL = 14
+
+# Time parameters
+EN_DURATION = 0
+EN_HYDSTEP = 1
+EN_QUALSTEP = 2
+EN_PATTERNSTEP = 3
+EN_PATTERNSTART = 4
+EN_REPORTSTEP = 5
+EN_REPORTSTART = 6
+EN_STARTTIME = 10
+EN_HTIME = 11
+EN_QTIME = 12
+
+# Analysis options
+EN_TRIALS = 0
+EN_ACCURACY = 1
+EN_DEMANDMULT = 4
+EN_UNBALANCED = 14
+EN_CHECKFREQ = 15
+EN_MAXCHECK = 16
+EN_DAMPLIMIT = 17
+
+# Analysis statistics (EN_getstatistic)
+EN_ITERATIONS = 0
+EN_RELATIVEERROR = 1
+EN_MAXHEADERROR = 2
+EN_MAXFLOWCHANGE = 3
+
+# Solver warnings returned by EN_runH (codes < 100)
+EN_WARN_UNBALANCED = 1
+EN_WARN_UNSTABLE = 2
+EN_WARN_DISCONNECTED = 3
+EN_WARN_PUMPS = 4
+EN_WARN_VALVES = 5
+EN_WARN_PRESSURES = 6
+
+# Counts / object types
+EN_NODECOUNT = 0
+EN_TANKCOUNT = 1
+EN_LINKCOUNT = 2
+EN_PATCOUNT = 3
+EN_CONTROLCOUNT = 5
+EN_RULECOUNT = 6
+
+# Node / link types
+EN_JUNCTION = 0
+EN_RESERVOIR = 1
+EN_TANK = 2
+EN_CVPIPE = 0
+EN_PIPE = 1
+EN_PUMP = 2
+EN_PRV = 3
+EN_PSV = 4
+EN_PBV = 5
+EN_FCV = 6
+EN_TCV = 7
+EN_GPV = 8
+
+# Hydraulic init flags
+EN_NOSAVE = 0
+EN_SAVE = 1
+EN_INITFLOW = 10
+EN_SAVE_AND_INIT = 11
+
+# Water quality analysis types
+EN_NONE = 0
+EN_CHEM = 1
+EN_AGE = 2
+EN_TRACE = 3
+
+# Link status
+EN_CLOSED = 0
+EN_OPEN = 1
+
+# Simple control types
+EN_LOWLEVEL = 0
+EN_HILEVEL = 1
+EN_TIMER = 2
+EN_TIMEOFDAY = 3
+
+_c_double_p = ctypes.POINTER(ctypes.c_double)
+_c_int_p = ctypes.POINTER(ctypes.c_int)
+_c_int32_p = ctypes.POINTER(ctypes.c_int32)
+_c_long_p = ctypes.POINTER(ctypes.c_long)
+
+# name -> argtypes (restype is int for every entry point used here)
+_SIGNATURES = {
+    "EN_createproject": [ctypes.POINTER(ctypes.c_void_p)],
+    "EN_deleteproject": [ctypes.c_void_p],
+    "EN_open": [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p],
+    "EN_close": [ctypes.c_void_p],
+    "EN_geterror": [ctypes.c_int, ctypes.c_char_p, ctypes.c_int],
+    "EN_getcount": [ctypes.c_void_p, ctypes.c_int, _c_int_p],
+    "EN_getnodeid": [ctypes.c_void_p, ctypes.c_int, ctypes.c_char_p],
+    "EN_getlinkid": [ctypes.c_void_p, ctypes.c_int, ctypes.c_char_p],
+    "EN_getnodetype": [ctypes.c_void_p, ctypes.c_int, _c_int_p],
+    "EN_getlinktype": [ctypes.c_void_p, ctypes.c_int, _c_int_p],
+    "EN_getnodevalue": [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, _c_double_p],
+    "EN_setnodevalue": [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_double],
+    "EN_getlinkvalue": [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, _c_double_p],
+    "EN_setlinkvalue": [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_double],
+    "EN_gettimeparam": [ctypes.c_void_p, ctypes.c_int, _c_long_p],
+    "EN_settimeparam": [ctypes.c_void_p, ctypes.c_int, ctypes.c_long],
+    "EN_getoption": [ctypes.c_void_p, ctypes.c_int, _c_double_p],
+    "EN_setoption": [ctypes.c_void_p, ctypes.c_int, ctypes.c_double],
+    "EN_getstatistic": [ctypes.c_void_p, ctypes.c_int, _c_double_p],
+    "EN_getpatternindex": [ctypes.c_void_p, ctypes.c_char_p, _c_int_p],
+    "EN_getpatternlen": [ctypes.c_void_p, ctypes.c_int, _c_int_p],
+    "EN_getpatternvalue": [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, _c_double_p],
+    "EN_deletepattern": [ctypes.c_void_p, ctypes.c_int],
+    "EN_addpattern": [ctypes.c_void_p, ctypes.c_char_p],
+    "EN_setpattern": [ctypes.c_void_p, ctypes.c_int, _c_double_p, ctypes.c_int],
+    "EN_openH": [ctypes.c_void_p],
+    "EN_initH": [ctypes.c_void_p, ctypes.c_int],
+    "EN_runH": [ctypes.c_void_p, _c_long_p],
+    "EN_nextH": [ctypes.c_void_p, _c_long_p],
+    "EN_closeH": [ctypes.c_void_p],
+    "EN_solveH": [ctypes.c_void_p],
+    "EN_savehydfile": [ctypes.c_void_p, ctypes.c_char_p],
+    "EN_usehydfile": [ctypes.c_void_p, ctypes.c_char_p],
+    "EN_getqualtype": [ctypes.c_void_p, _c_int_p, _c_int_p],
+    "EN_getqualinfo": [ctypes.c_void_p, _c_int_p, ctypes.c_char_p, ctypes.c_char_p, _c_int_p],
+    "EN_setqualtype": [ctypes.c_void_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p],
+    "EN_openQ": [ctypes.c_void_p],
+    "EN_initQ": [ctypes.c_void_p, ctypes.c_int],
+    "EN_runQ": [ctypes.c_void_p, _c_long_p],
+    "EN_nextQ": [ctypes.c_void_p, _c_long_p],
+    "EN_closeQ": [ctypes.c_void_p],
+    "EN_addcontrol": [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_double, ctypes.c_int,
+                      ctypes.c_double, _c_int_p],
+    "EN_getcontrol": [ctypes.c_void_p, ctypes.c_int, _c_int_p, _c_int_p, _c_double_p, _c_int_p, _c_double_p],
+    "EN_deletecontrol": [ctypes.c_void_p, ctypes.c_int],
+    "EN_addrule": [ctypes.c_void_p, ctypes.c_char_p],
+    "EN_deleterule": [ctypes.c_void_p, ctypes.c_int],
+    # epanet_bulk.h
+    "EN_get_counts": [ctypes.c_void_p, _c_int_p, _c_int_p],
+    "EN_get_all_pressures": [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, _c_double_p],
+    "EN_get_all_flows": [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, _c_double_p],
+    # epanet_turbo.h (Batch API)
+    "ENT_version": [],
+    "ENT_set_node_values": [ctypes.c_void_p, ctypes.c_int32, _c_int32_p, _c_double_p, ctypes.c_int32],
+    "ENT_set_link_values": [ctypes.c_void_p, ctypes.c_int32, _c_int32_p, _c_double_p, ctypes.c_int32],
+    "ENT_set_demand_multiplier": [ctypes.c_void_p, ctypes.c_double],
+}
+# void-returning exports
+_VOID_SIGNATURES = {
+    "ENT_set_num_threads": [ctypes.c_int],
+}
+
+# Warnings (< 100) are not errors, see EN_geterror
+MAX_WARNING_CODE = 99
+# Selections smaller than 1/SUBSET_BULK_RATIO of all elements are read with
+# per-element getters; larger ones with one bulk sweep plus a gather
+# (a ctypes call costs roughly as much as 128 elements of a bulk sweep).
+SUBSET_BULK_RATIO = 128
+ID_BUFSIZE = 64
+
+
+class EPANETError(RuntimeError):
+    def __init__(self, code, where=""):
+        self.code = code
+        message = _error_text(code)
+        super().__init__(f"{where}: EPANET error {code}: {message}" if where else f"EPANET error {code}: {message}")
+
+
+def _lib_candidates(openmp):
+    here = os.path.dirname(os.path.abspath(__file__))
+    # Installed wheel: epanet_turbo/dll; source tree: resources/dll
+    dirs = [os.path.join(here, os.pardir, "dll"),
+            os.path.join(here, os.pardir, "resources", "dll")]
+    if sys.platform == "win32":
+        names = ["epanet2_openmp.dll", "epanet2.dll"]
+    elif sys.platform == "darwin":
+        names = ["libepanet2.dylib"]
+    else:
+        names = ["libepanet2_openmp.so", "libepanet2.so"]
+    if not openmp:
+        names = [n for n in names if "openmp" not in n] or names
+    return [os.path.normpath(os.path.join(d, n)) for d in dirs for n in names]
+
+
+_KERNELS = {}
+
+
+def load_kernel(openmp=True):
+    """
+    Load (once per variant) the bundled kernel library.
+
+    ``EPANET_TURBO_LIB`` overrides the search with an explicit path.
+    """
+    key = bool(openmp)
+    lib = _KERNELS.get(key)
+    if lib is not None:
+        return lib
+
+    override = os.environ.get("EPANET_TURBO_LIB")
+    candidates = [override] if override else _lib_candidates(openmp)
+    errors = []
+    for path in candidates:
+        if not os.path.exists(path):
+            continue
+        try:
+            lib = ctypes.CDLL(path)
+            break
+        except OSError as e:
+            errors.append(f"{path}: {e}")
+    if lib is None:
+        detail = "; ".join(errors) if errors else "searched " + ", ".join(candidates)
+        raise OSError(f"EPANET-Turbo kernel not found ({detail})")
+
+    for name, argtypes in _SIGNATURES.items():
+        fn = getattr(lib, name, None)
+        if fn is None:
+            continue
+        fn.argtypes = argtypes
+        fn.restype = ctypes.c_int
+    for name, argtypes in _VOID_SIGNATURES.items():
+        fn = getattr(lib, name, None)
+        if fn is not None:
+            fn.argtypes = argtypes
+            fn.restype = None
+    lib.path = path
+    _KERNELS[key] = lib
+    return lib
+
+
+def set_num_threads(n, openmp=True):
+    """
+    OpenMP team size for solves issued from the calling thread.
+
+    ``ENT_set_num_threads`` wraps ``omp_set_num_threads``, which sets the
+    calling thread's value only, so each Python thread driving its own
+    project can be given its share of the cores. ``n <= 0`` is ignored by
+    the kernel; the serial kernel ignores the call altogether.
+    """
+    lib = load_kernel(openmp)
+    fn = getattr(lib, "ENT_set_num_threads", None)
+    if fn is not None and n is not None:
+        fn(int(n))
+
+
+class _MallInfo2(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_size_t) for name in (
+        "arena", "ordblks", "smblks", "hblks", "hblkhd", "usmblks", "fsmblks", "uordblks", "fordblks", "keepcost")]
+
+
+_MALLINFO = []
+
+
+def heap_bytes():
+    """
+    Bytes currently allocated through ``malloc`` in this process, or None.
+
+    Uses glibc ``mallinfo2`` (2.33+). The kernel allocates all model and
+    solver arrays with malloc, while Python objects live in separately
+    mapped arenas, so the difference around a kernel call is the memory
+    that call kept (approximate when other threads allocate meanwhile).
+    """
+    if not _MALLINFO:
+        fn = None
+        if sys.platform.startswith("linux"):
+            fn = getattr(ctypes.CDLL(None), "mallinfo2", None)
+            if fn is not None:
+                fn.argtypes = []
+                fn.restype = _MallInfo2
+        _MALLINFO.append(fn)
+    fn = _MALLINFO[0]
+    if fn is None:
+        return None
+    info = fn()
+    return info.uordblks + info.hblkhd
+
+
+def _heap_delta(before):
+    after = heap_bytes()
+    return None if before is None or after is None else max(after - before, 0)
+
+
+def _error_text(code):
+    lib = _KERNELS.get(True) or _KERNELS.get(False)
+    if lib is None:
+        return "unknown"
+    buf = ctypes.create_string_buffer(256)
+    lib.EN_geterror(code, buf, 255)
+    return buf.value.decode(errors="replace")
+
+
+def _as_index_array(indices):
+    return np.ascontiguousarray(indices, dtype=np.int32)
+
+
+def _as_value_array(values, n):
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 0:
+        # ascontiguousarray would turn a scalar into shape (1,)
+        values = np.full(n, float(values))
+    values = np.ascontiguousarray(values)
+    if values.shape != (n,):
+        raise ValueError(f"expected {n} values, got shape {values.shape}")
+    return values
+
+
+def report_times(proj, start=None, end=None, every=1):
+    """
+    Reporting times (s) of a project, restricted to ``[start, end]`` and
+    keeping every ``every``-th reporting step.
+    """
+    duration = proj.get_time_param(EN_DURATION)
+    first = proj.get_time_param(EN_REPORTSTART)
+    step = max(proj.get_time_param(EN_REPORTSTEP), 1)
+    if int(every) < 1:
+        raise ValueError("every must be >= 1")
+    if duration < first:
+        return np.zeros(0, dtype=np.int32)
+    times = np.arange(first, duration + 1, step, dtype=np.int32)
+    if start is not None:
+        times = times[times >= start]
+    if end is not None:
+        times = times[times <= end]
+    return times[::int(every)]
+
+
+def resolve_selection(proj, selection, kind):
+    """
+    Normalise a node/link selection to ``(indices, ids)``.
+
+    ``selection`` is None (everything), a list of IDs, or an array of
+    1-based kernel indices. ``indices`` is None for a full selection.
+    """
+    all_ids = proj.node_ids if kind == "node" else proj.link_ids
+    if selection is None:
+        return None, all_ids
+    selection = list(selection) if not isinstance(selection, np.ndarray) else selection
+    if len(selection) and isinstance(selection[0], str):
+        idx = proj.node_index(selection) if kind == "node" else proj.link_index(selection)
+    else:
+        idx = np.ascontiguousarray(selection, dtype=np.int32)
+        if idx.size and (idx.min() < 1 or idx.max() > len(all_ids)):
+            raise IndexError(f"{kind} indices must be 1-based kernel indices in [1, {len(all_ids)}]")
+    return idx, [all_ids[i - 1] for i in idx.tolist()]
+
+
+class ResidentProject:
+    def __init__(self, inp_path, openmp=True, report_path=None, track_changes=False, num_threads=None):
+        """
+        Open a model once and keep it resident in kernel memory.
+
+        Parameters
+        ----------
+        inp_path : str
+            INP file to open.
+        openmp : bool
+            Prefer the OpenMP kernel when it is bundled for this platform.
+        report_path : str, optional
+            Status report file (defaults to the null device).
+        track_changes : bool
+            Remember the original value of everything changed through this
+            object (element values, patterns, demand multiplier, time
+            parameters, quality type, added controls and rules) so that
+            ``reset()`` can restore it.
+        num_threads : int, optional
+            OpenMP threads for this project's solves. Applied to the calling
+            thread whenever a solver is started, so it holds for whichever
+            thread drives the project (see ``concurrent_projects.py``).
+        """
+        self.inp_path = os.fspath(inp_path)
+        self.lib = load_kernel(openmp)
+        self.kernel_bytes = {}
+        heap = heap_bytes()
+        self._ph = ctypes.c_void_p()
+        self._check(self.lib.EN_createproject(ctypes.byref(self._ph)), "EN_createproject")
+        rpt = report_path or os.devnull
+        code = self.lib.EN_open(self._ph, self.inp_path.encode(), os.fsencode(rpt), b"")
+        if code > MAX_WARNING_CODE:
+            self.lib.EN_deleteproject(self._ph)
+            self._ph = None
+            raise EPANETError(code, f"EN_open({self.inp_path})")
+        self.kernel_bytes["model"] = _heap_delta(heap)
+
+        n_nodes, n_links = ctypes.c_int(), ctypes.c_int()
+        self._check(self.lib.EN_get_counts(self._ph, ctypes.byref(n_nodes), ctypes.byref(n_links)), "EN_get_counts")
+        self.num_nodes = n_nodes.value
+        self.num_links = n_links.value
+        self._node_ids = None
+        self._link_ids = None
+        self._node_lookup = None
+        self._link_lookup = None
+        self._node_scratch = None
+        self._link_scratch = None
+        self._hyd_open = False
+        self._qual_open = False
+        self.hydraulics_ready = False
+        self.track_changes = track_changes
+        self.num_threads = num_threads
+        self._journal = {}
+        self.last_warning = 0
+        self._t = ctypes.c_long(0)
+        self._tstep = ctypes.c_long(0)
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+    @property
+    def handle(self):
+        """Raw EN_Project handle (for direct kernel calls)."""
+        if self._ph is None:
+            raise RuntimeError("project is closed")
+        return self._ph
+
+    def _apply_num_threads(self):
+        # Per-thread OpenMP setting: re-applied by the thread that starts a solve
+        if self.num_threads is not None:
+            fn = getattr(self.lib, "ENT_set_num_threads", None)
+            if fn is not None:
+                fn(int(self.num_threads))
+
+    def _check(self, code, where):
+        if code > MAX_WARNING_CODE:
+            raise EPANETError(code, where)
+        return code
+
+    def count(self, what):
+        out = ctypes.c_int()
+        self._check(self.lib.EN_getcount(self.handle, what, ctypes.byref(out)), "EN_getcount")
+        return out.value
+
+    def get_option(self, option):
+        out = ctypes.c_double()
+        self._check(self.lib.EN_getoption(self.handle, option, ctypes.byref(out)), "EN_getoption")
+        return out.value
+
+    def set_option(self, option, value):
+        if self.track_changes:
+            self._journal.setdefault(("option", option), self.get_option(option))
+        self._check(self.lib.EN_setoption(self.handle, option, float(value)), "EN_setoption")
+
+    def get_time_param(self, param):
+        out = ctypes.c_long()
+        self._check(self.lib.EN_gettimeparam(self.handle, param, ctypes.byref(out)), "EN_gettimeparam")
+        return out.value
+
+    def set_time_param(self, param, value):
+        if self.track_changes:
+            self._journal.setdefault(("time", param), self.get_time_param(param))
+        self._check(self.lib.EN_settimeparam(self.handle, param, int(value)), "EN_settimeparam")
+
+    # ------------------------------------------------------------------
+    # IDs and indices
+    # ------------------------------------------------------------------
+    def _fetch_ids(self, getter, n):
+        buf = ctypes.create_string_buffer(ID_BUFSIZE)
+        ids = []
+        for i in range(1, n + 1):
+            getter(self.handle, i, buf)
+            ids.append(buf.value.decode(errors="replace"))
+        return ids
+
+    @property
+    def node_ids(self):
+        """Node IDs in kernel index order (position 0 == index 1)."""
+        if self._node_ids is None:
+            self._node_ids = self._fetch_ids(self.lib.EN_getnodeid, self.num_nodes)
+        return self._node_ids
+
+    @property
+    def link_ids(self):
+        """Link IDs in kernel index order (position 0 == index 1)."""
+        if self._link_ids is None:
+            self._link_ids = self._fetch_ids(self.lib.EN_getlinkid, self.num_links)
+        return self._link_ids
+
+    def node_index(self, ids):
+        """Map node IDs to 1-based kernel indices (int32 array)."""
+        if self._node_lookup is None:
+            self._node_lookup = {nid: i for i, nid in enumerate(self.node_ids, start=1)}
+        return self._lookup(self._node_lookup, ids, "node")
+
+    def link_index(self, ids):
+        """Map link IDs to 1-based kernel indices (int32 array)."""
+        if self._link_lookup is None:
+            self._link_lookup = {lid: i for i, lid in enumerate(self.link_ids, start=1)}
+        return self._lookup(self._link_lookup, ids, "link")
+
+    @staticmethod
+    def _lookup(table, ids, kind):
+        try:
+            return np.fromiter((table[i] for i in ids), dtype=np.int32)
+        except KeyError as e:
+            raise KeyError(f"unknown {kind} ID {e.args[0]!r}") from None
+
+    def node_types(self, indices):
+        """``EN_JUNCTION``/``EN_RESERVOIR``/``EN_TANK`` of 1-based node indices (int32 array)."""
+        return self._types(indices, self.lib.EN_getnodetype)
+
+    def link_types(self, indices):
+        """``EN_PIPE``/``EN_PUMP``/valve type codes of 1-based link indices (int32 array)."""
+        return self._types(indices, self.lib.EN_getlinktype)
+
+    def _types(self, indices, getter):
+        idx = _as_index_array(indices)
+        out = np.empty(idx.size, dtype=np.int32)
+        value = ctypes.c_int()
+        ref = ctypes.byref(value)
+        for j, i in enumerate(idx.tolist()):
+            self._check(getter(self.handle, i, ref), getter.__name__)
+            out[j] = value.value
+        return out
+
+    # ------------------------------------------------------------------
+    # Batch API / bulk getters
+    # ------------------------------------------------------------------
+    def set_node_values(self, indices, prop, values):
+        """Set one node property for many nodes in a single kernel call."""
+        idx = _as_index_array(indices)
+        vals = _as_value_array(values, idx.size)
+        if self.track_changes:
+            self._remember("node", prop, idx)
+        code = self.lib.ENT_set_node_values(
+            self.handle, prop, idx.ctypes.data_as(_c_int32_p), vals.ctypes.data_as(_c_double_p), idx.size)
+        self._check(code, "ENT_set_node_values")
+
+    def set_link_values(self, indices, prop, values):
+        """Set one link property for many links in a single kernel call."""
+        idx = _as_index_array(indices)
+        vals = _as_value_array(values, idx.size)
+        if self.track_changes:
+            self._remember("link", prop, idx)
+        code = self.lib.ENT_set_link_values(
+            self.handle, prop, idx.ctypes.data_as(_c_int32_p), vals.ctypes.data_as(_c_double_p), idx.size)
+        self._check(code, "ENT_set_link_values")
+
+    def set_demand_multiplier(self, factor):
+        if self.track_changes:
+            self._journal.setdefault(("option", EN_DEMANDMULT), self.get_option(EN_DEMANDMULT))
+        # ENT_set_demand_multiplier of the 2.3.0 kernel writes option 13
+        # (EN_SP_VISCOS) instead of EN_DEMANDMULT, so go through EN_setoption
+        self._check(self.lib.EN_setoption(self.handle, EN_DEMANDMULT, float(factor)), "EN_setoption")
+
+    def get_node_values(self, prop, out=None, indices=None):
+        """
+        Read one node property for all nodes (EN_get_all_pressures), or
+        only for the 1-based ``indices`` of a selection.
+        """
+        if indices is not None:
+            return self._get_subset(indices, prop, out, self.num_nodes, self.lib.EN_getnodevalue,
+                                    self.get_node_values, "_node_scratch")
+        if out is None:
+            out = np.empty(self.num_nodes, dtype=np.float64)
+        code = self.lib.EN_get_all_pressures(self.handle, out.size, prop, out.ctypes.data_as(_c_double_p))
+        self._check(code, "EN_get_all_pressures")
+        return out
+
+    def get_link_values(self, prop, out=None, indices=None):
+        """
+        Read one link property for all links (EN_get_all_flows), or only
+        for the 1-based ``indices`` of a selection.
+        """
+        if indices is not None:
+            return self._get_subset(indices, prop, out, self.num_links, self.lib.EN_getlinkvalue,
+                                    self.get_link_values, "_link_scratch")
+        if out is None:
+            out = np.empty(self.num_links, dtype=np.float64)
+        code = self.lib.EN_get_all_flows(self.handle, out.size, prop, out.ctypes.data_as(_c_double_p))
+        self._check(code, "EN_get_all_flows")
+        return out
+
+    def _get_subset(self, indices, prop, out, n_total, getter, bulk, scratch_attr):
+        idx = _as_index_array(indices)
+        if out is None:
+            out = np.empty(idx.size, dtype=np.float64)
+        if idx.size * SUBSET_BULK_RATIO < n_total:
+            # Small selection: one getter call per element beats a full sweep
+            value = ctypes.c_double()
+            ref = ctypes.byref(value)
+            handle = self.handle
+            for j, i in enumerate(idx.tolist()):
+                code = getter(handle, i, prop, ref)
+                if code > MAX_WARNING_CODE:
+                    raise EPANETError(code, "EN_get*value")
+                out[j] = value.value
+            return out
+        scratch = getattr(self, scratch_attr)
+        if scratch is None:
+            scratch = np.empty(n_total, dtype=np.float64)
+            setattr(self, scratch_attr, scratch)
+        bulk(prop, out=scratch)
+        np.take(scratch, idx - 1, out=out)
+        return out
+
+    # ------------------------------------------------------------------
+    # Patterns
+    # ------------------------------------------------------------------
+    def pattern_index(self, pattern_id, create=False):
+        """1-based pattern index; optionally add the pattern when missing."""
+        out = ctypes.c_int()
+        code = self.lib.EN_getpatternindex(self.handle, str(pattern_id).encode(), ctypes.byref(out))
+        if code and create:
+            self._check(self.lib.EN_addpattern(self.handle, str(pattern_id).encode()), "EN_addpattern")
+            code = self.lib.EN_getpatternindex(self.handle, str(pattern_id).encode(), ctypes.byref(out))
+        self._check(code, f"EN_getpatternindex({pattern_id})")
+        return out.value
+
+    def get_pattern(self, pattern_id):
+        """Multipliers of a time pattern (ID, or int 1-based index) as a float64 array."""
+        index = pattern_id if isinstance(pattern_id, int) else self.pattern_index(pattern_id)
+        length = ctypes.c_int()
+        self._check(self.lib.EN_getpatternlen(self.handle, index, ctypes.byref(length)), "EN_getpatternlen")
+        out = np.empty(length.value, dtype=np.float64)
+        value = ctypes.c_double()
+        for period in range(length.value):
+            self._check(self.lib.EN_getpatternvalue(self.handle, index, period + 1, ctypes.byref(value)),
+                        "EN_getpatternvalue")
+            out[period] = value.value
+        return out
+
+    def set_pattern(self, pattern_id, factors, create=True):
+        """Replace all multipliers of a time pattern."""
+        if self.track_changes and ("pattern", pattern_id) not in self._journal:
+            try:
+                self._journal["pattern", pattern_id] = self.get_pattern(pattern_id)
+            except EPANETError:
+                self._journal["pattern", pattern_id] = None     # created here
+        index = self.pattern_index(pattern_id, create=create)
+        factors = np.ascontiguousarray(factors, dtype=np.float64)
+        code = self.lib.EN_setpattern(self.handle, index, factors.ctypes.data_as(_c_double_p), factors.size)
+        self._check(code, "EN_setpattern")
+        return index
+
+    # ------------------------------------------------------------------
+    # Controls and rules
+    # ------------------------------------------------------------------
+    def add_controls(self, types, links, settings, nodes, levels):
+        """
+        Add simple controls from equal-length arrays; returns their 1-based
+        indices.
+
+        ``types`` are ``EN_LOWLEVEL``/``EN_HILEVEL``/``EN_TIMER``/
+        ``EN_TIMEOFDAY``, ``links``/``nodes`` 1-based indices (node 0 for
+        time controls), ``levels`` the trigger level or time in seconds.
+        """
+        columns = [np.ascontiguousarray(types, dtype=np.int32), _as_index_array(links)]
+        n = columns[1].size
+        columns += [_as_value_array(settings, n), _as_index_array(nodes), _as_value_array(levels, n)]
+        if any(c.shape != (n,) for c in columns):
+            raise ValueError("control arrays must have the same length")
+        if self.track_changes:
+            self._journal.setdefault(("controls", None), self.count(EN_CONTROLCOUNT))
+        out = np.empty(n, dtype=np.int32)
+        index = ctypes.c_int()
+        ref = ctypes.byref(index)
+        add, handle = self.lib.EN_addcontrol, self.handle
+        for j, (kind, link, setting, node, level) in enumerate(zip(*(c.tolist() for c in columns))):
+            code = add(handle, kind, link, setting, node, level, ref)
+            if code > MAX_WARNING_CODE:
+                raise EPANETError(code, f"EN_addcontrol (row {j})")
+            out[j] = index.value
+        return out
+
+    def get_controls(self):
+        """
+        All simple controls as ``(types, links, settings, nodes, levels)``
+        arrays, the layout of ``add_controls``.
+        """
+        n = self.count(EN_CONTROLCOUNT)
+        types, links, nodes = (np.empty(n, dtype=np.int32) for _ in range(3))
+        settings, levels = np.empty(n), np.empty(n)
+        kind, link, node = ctypes.c_int(), ctypes.c_int(), ctypes.c_int()
+        setting, level = ctypes.c_double(), ctypes.c_double()
+        refs = [ctypes.byref(v) for v in (kind, link, setting, node, level)]
+        for j in range(n):
+            self._check(self.lib.EN_getcontrol(self.handle, j + 1, *refs), "EN_getcontrol")
+            types[j], links[j], settings[j] = kind.value, link.value, setting.value
+            nodes[j], levels[j] = node.value, level.value
+        return types, links, settings, nodes, levels
+
+    def add_rules(self, rules):
+        """Add rule-based controls, one INP-format rule text each; returns their 1-based indices."""
+        if self.track_changes:
+            self._journal.setdefault(("rules", None), self.count(EN_RULECOUNT))
+        first = self.count(EN_RULECOUNT) + 1
+        for j, text in enumerate(rules):
+            # EN_addrule tokenises the text in place and needs newline-ended clauses
+            buf = ctypes.create_string_buffer(text.rstrip("\n").encode() + b"\n")
+            self._check(self.lib.EN_addrule(self.handle, buf), f"EN_addrule (rule {j})")
+        return np.arange(first, self.count(EN_RULECOUNT) + 1, dtype=np.int32)
+
+    def truncate_controls(self, n_controls=None, n_rules=None):
+        """Delete the controls / rules after the first ``n_controls`` / ``n_rules``."""
+        for what, keep, delete in ((EN_CONTROLCOUNT, n_controls, self.lib.EN_deletecontrol),
+                                   (EN_RULECOUNT, n_rules, self.lib.EN_deleterule)):
+            if keep is None:
+                continue
+            for index in range(self.count(what), keep, -1):
+                self._check(delete(self.handle, index), delete.__name__)
+
+    # ------------------------------------------------------------------
+    # Hydraulic stepping primitives
+    # ------------------------------------------------------------------
+    def init_hydraulics(self, flag=EN_NOSAVE):
+        """Open (once) and initialise the hydraulic solver."""
+        self._apply_num_threads()
+        if not self._hyd_open:
+            heap = heap_bytes()
+            self._check(self.lib.EN_openH(self.handle), "EN_openH")
+            self._hyd_open = True
+            self.kernel_bytes["hydraulics"] = _heap_delta(heap)
+        self._check(self.lib.EN_initH(self.handle, flag), "EN_initH")
+
+    def run_step(self):
+        """
+        Solve hydraulics at the current time; returns that time (s).
+
+        The solver warning of the step (0, or ``EN_WARN_*``, e.g.
+        ``EN_WARN_UNBALANCED`` when it did not converge) is kept in
+        ``last_warning``.
+        """
+        self.last_warning = self._check(self.lib.EN_runH(self.handle, ctypes.byref(self._t)), "EN_runH")
+        return self._t.value
+
+    def get_statistic(self, stat):
+        """Solver statistic of the last step (``EN_ITERATIONS``, ``EN_RELATIVEERROR``, ...)."""
+        out = ctypes.c_double()
+        self._check(self.lib.EN_getstatistic(self.handle, stat, ctypes.byref(out)), "EN_getstatistic")
+        return out.value
+
+    def next_step(self):
+        """Advance to the next hydraulic event; returns the step length (0 = done)."""
+        self._check(self.lib.EN_nextH(self.handle, ctypes.byref(self._tstep)), "EN_nextH")
+        return self._tstep.value
+
+    def close_hydraulics(self):
+        if self._hyd_open:
+            self.lib.EN_closeH(self.handle)
+            self._hyd_open = False
+            self.kernel_bytes.pop("hydraulics", None)
+
+    def iter_steps(self, nodes=None, links=None, reporting_only=False, start=None, end=None, every=1):
+        """
+        Generator over an extended-period run yielding ``(t, pressures, flows)``.
+
+        ``pressures``/``flows`` are read-only views of two buffers allocated
+        once and refilled in place at every step: copy what must outlive the
+        step. Breaking out of the loop (or ``close()``) closes hydraulics.
+
+        Parameters
+        ----------
+        nodes, links : list of str or array of int, optional
+            Restrict the views to these elements (IDs or 1-based indices).
+        reporting_only : bool
+            Yield only reporting times instead of every hydraulic step
+            (intermediate steps from controls and tank events included).
+        start, end : int, optional
+            Time window (s); the run stops after ``end``.
+        every : int
+            With ``reporting_only``, keep every n-th reporting step of the
+            window (the times of ``report_times``).
+        """
+        if int(every) != 1 and not reporting_only:
+            raise ValueError("every thins reporting steps; it needs reporting_only=True")
+        node_idx, _ = resolve_selection(self, nodes, "node")
+        link_idx, _ = resolve_selection(self, links, "link")
+        p_buf = np.empty(self.num_nodes if node_idx is None else node_idx.size)
+        q_buf = np.empty(self.num_links if link_idx is None else link_idx.size)
+        p_view, q_view = p_buf.view(), q_buf.view()
+        p_view.flags.writeable = False
+        q_view.flags.writeable = False
+        # Same times as run_simulation: every n-th step counted from the window start
+        times = report_times(self, start, end, every) if reporting_only else None
+        k = 0
+
+        self.init_hydraulics(EN_NOSAVE)
+        try:
+            while True:
+                t = self.run_step()
+                if reporting_only:
+                    while k < len(times) and times[k] < t:
+                        k += 1
+                    wanted = k < len(times) and t == times[k]
+                else:
+                    wanted = (start is None or t >= start) and (end is None or t <= end)
+                if wanted:
+                    # Read before EN_nextH, which already advances tank levels
+                    self.get_node_values(EN_PRESSURE, out=p_buf, indices=node_idx)
+                    self.get_link_values(EN_FLOW, out=q_buf, indices=link_idx)
+                    yield t, p_view, q_view
+                if (end is not None and t >= end) or self.next_step() <= 0:
+                    break
+        finally:
+            self.close_hydraulics()
+
+    def solve_hydraulics(self):
+        """Run the full hydraulic simulation and keep it for a quality run (EN_solveH)."""
+        self.close_hydraulics()
+        self._apply_num_threads()
+        self._check(self.lib.EN_solveH(self.handle), "EN_solveH")
+        self.hydraulics_ready = True
+
+    def save_hydraulics(self, path):
+        """Copy the solved hydraulics to a binary hydraulics file (EN_savehydfile)."""
+        self._check(self.lib.EN_savehydfile(self.handle, os.fsencode(path)), "EN_savehydfile")
+
+    def use_hydraulics(self, path):
+        """Load hydraulics saved by ``save_hydraulics`` instead of solving (EN_usehydfile)."""
+        self.close_hydraulics()
+        self._check(self.lib.EN_usehydfile(self.handle, os.fsencode(path)), "EN_usehydfile")
+        self.hydraulics_ready = True
+
+    # ------------------------------------------------------------------
+    # Water quality stepping primitives
+    # ------------------------------------------------------------------
+    @property
+    def quality_type(self):
+        """(analysis type, trace node index) of the current quality option."""
+        qual, trace = ctypes.c_int(), ctypes.c_int()
+        self._check(self.lib.EN_getqualtype(self.handle, ctypes.byref(qual), ctypes.byref(trace)), "EN_getqualtype")
+        return qual.value, trace.value
+
+    def quality_info(self):
+        """(analysis type, chemical name, chemical units, trace node ID)."""
+        qual, trace = ctypes.c_int(), ctypes.c_int()
+        name, units = ctypes.create_string_buffer(ID_BUFSIZE), ctypes.create_string_buffer(ID_BUFSIZE)
+        code = self.lib.EN_getqualinfo(self.handle, ctypes.byref(qual), name, units, ctypes.byref(trace))
+        self._check(code, "EN_getqualinfo")
+        trace_id = self.node_ids[trace.value - 1] if trace.value > 0 else ""
+        return qual.value, name.value.decode(errors="replace"), units.value.decode(errors="replace"), trace_id
+
+    def set_quality_type(self, qual_type, chem_name="", chem_units="", trace_node=""):
+        """Select the analysis: EN_NONE, EN_CHEM, EN_AGE or EN_TRACE (with ``trace_node`` ID)."""
+        if self.track_changes:
+            self._journal.setdefault(("quality",), self.quality_info())
+        code = self.lib.EN_setqualtype(self.handle, qual_type, str(chem_name).encode(),
+                                       str(chem_units).encode(), str(trace_node).encode())
+        self._check(code, "EN_setqualtype")
+
+    def init_quality(self, flag=EN_NOSAVE):
+        """Open (once) and initialise the quality solver on saved hydraulics."""
+        self._apply_num_threads()
+        if not self._qual_open:
+            heap = heap_bytes()
+            self._check(self.lib.EN_openQ(self.handle), "EN_openQ")
+            self._qual_open = True
+            self.kernel_bytes["quality"] = _heap_delta(heap)
+        self._check(self.lib.EN_initQ(self.handle, flag), "EN_initQ")
+
+    def run_quality_step(self):
+        """Load hydraulics and quality at the next hydraulic time; returns that time (s)."""
+        self._check(self.lib.EN_runQ(self.handle, ctypes.byref(self._t)), "EN_runQ")
+        return self._t.value
+
+    def next_quality_step(self):
+        """Route quality to the next hydraulic time; returns the step length (0 = done)."""
+        self._check(self.lib.EN_nextQ(self.handle, ctypes.byref(self._tstep)), "EN_nextQ")
+        return self._tstep.value
+
+    def close_quality(self):
+        if self._qual_open:
+            self.lib.EN_closeQ(self.handle)
+            self._qual_open = False
+            self.kernel_bytes.pop("quality", None)
+
+    # ------------------------------------------------------------------
+    # Change tracking
+    # ------------------------------------------------------------------
+    def _remember(self, kind, prop, idx):
+        # Keep the first-seen original value of every (kind, prop, index)
+        key = (kind, prop)
+        known_idx, known_vals = self._journal.get(key, (np.zeros(0, np.int32), np.zeros(0)))
+        new_idx = np.setdiff1d(idx, known_idx)
+        if new_idx.size == 0:
+            return
+        getter = self.get_node_values if kind == "node" else self.get_link_values
+        new_vals = getter(prop, indices=new_idx)
+        self._journal[key] = (np.concatenate([known_idx, new_idx]), np.concatenate([known_vals, new_vals]))
+
+    @property
+    def is_dirty(self):
+        """True when tracked changes are pending a ``reset()``."""
+        return bool(self._journal)
+
+    def reset(self):
+        """
+        Close any running solver and undo every tracked change.
+
+        Requires ``track_changes=True``; changes made with raw kernel calls
+        on ``handle`` are not seen.
+        """
+        self.close_quality()
+        self.close_hydraulics()
+        self.hydraulics_ready = False
+        journal, self._journal = self._journal, {}
+        tracking, self.track_changes = self.track_changes, False
+        try:
+            for key, original in journal.items():
+                kind = key[0]
+                if kind == "node":
+                    self.set_node_values(original[0], key[1], original[1])
+                elif kind == "link":
+                    self.set_link_values(original[0], key[1], original[1])
+                elif kind == "pattern":
+                    if original is None:
+                        self._check(self.lib.EN_deletepattern(self.handle, self.pattern_index(key[1])),
+                                    "EN_deletepattern")
+                    else:
+                        self.set_pattern(key[1], original, create=False)
+                elif kind == "option":
+                    self.set_option(key[1], original)
+                elif kind == "time":
+                    self.set_time_param(key[1], original)
+                elif kind == "quality":
+                    self.set_quality_type(*original)
+                elif kind == "controls":
+                    self.truncate_controls(n_controls=original)
+                elif kind == "rules":
+                    self.truncate_controls(n_rules=original)
+        finally:
+            self.track_changes = tracking
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def close(self):
+        if self._ph is None:
+            return
+        self.close_quality()
+        self.close_hydraulics()
+        self.lib.EN_close(self._ph)
+        self.lib.EN_deleteproject(self._ph)
+        self._ph = None
+        self.kernel_bytes.clear()
+
+    def memory_usage(self):
+        """
+        Bytes held for this project: ``kernel`` (malloc'd by EN_open, EN_openH
+        and EN_openQ, None where it cannot be measured) and ``buffers`` (the
+        NumPy scratch arrays of subset reads).
+        """
+        kernel = None if None in self.kernel_bytes.values() else sum(self.kernel_bytes.values())
+        buffers = sum(a.nbytes for a in (self._node_scratch, self._link_scratch) if a is not None)
+        return {"kernel": kernel, "buffers": buffers}
+
+    @property
+    def closed(self):
+        return self._ph is None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __repr__(self):
+        state = "closed" if self.closed else f"{self.num_nodes} nodes, {self.num_links} links"
+        return f"ResidentProject({self.inp_path!r}, {state})"
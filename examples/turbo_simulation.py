@@ -0,0 +1,279 @@
+"""
+EPANET-Turbo Simulation Results
+===============================
+
+Open ``simulate()`` / ``run_simulation()`` built on ``ResidentProject`` with
+a selectable result container:
+
+* ``"numpy"``  - the (T, N) / (T, M) buffers the kernel's bulk getters wrote
+  into, returned as-is (or the Protocol V2 memmap views when streaming).
+* ``"polars"`` - element-major frames (one row per node/link, one column per
+  reporting time). Every time column wraps one contiguous buffer row, so no
+  data is copied.
+* ``"pandas"`` - the familiar time-indexed frames (``TimedeltaIndex``, one
+  column per element) built from a single 2-D block with ``copy=False``.
+
+Usage:
+------
+    from turbo_simulation import simulate, run_simulation
+
+    pressures, flows = simulate("Net3.inp")                        # pandas
+    pressures, flows = simulate("Net3.inp", return_type="numpy")   # (T, N) arrays
+
+    res = run_simulation("big.inp", output="big.out")              # streamed to disk
+    p_pl, q_pl = res.to("polars")                                  # views on the memmap
+
+    # Monitor only sensor nodes / meters, 06:00-18:00, every 2nd report step
+    res = run_simulation("big.inp", nodes=sensor_ids, links=meter_ids,
+                         start=6 * 3600, end=18 * 3600, every=2)
+"""
+
+import time
+
+import numpy as np
+
+try:
+    from . import turbo_kernel as tk
+    from .turbo_kernel import report_times, resolve_selection
+    from .streaming_v2 import StreamingWriter, load_streaming_result
+    from .reducers import ReducerSet
+except ImportError:
+    import turbo_kernel as tk
+    from turbo_kernel import report_times, resolve_selection
+    from streaming_v2 import StreamingWriter, load_streaming_result
+    from reducers import ReducerSet
+
+RETURN_TYPES = ("numpy", "polars", "pandas")
+
+
+class SimulationCancelled(RuntimeError):
+    """Raised by ``run_simulation`` when its ``cancel`` event is set."""
+
+    def __init__(self, t):
+        super().__init__(f"simulation cancelled at t={t}s")
+        self.t = t
+
+
+class SimulationResult:
+    def __init__(self, times, pressures, flows, node_ids, link_ids, source=None):
+        """
+        Reporting-step results of one hydraulic run.
+
+        ``pressures``/``flows`` are (T, N) / (T, M) arrays: in-memory kernel
+        buffers (float64) or memmap views of a Protocol V2 file (float32).
+        """
+        self.times = times
+        self.pressures = pressures
+        self.flows = flows
+        self.node_ids = node_ids
+        self.link_ids = link_ids
+        self.source = source
+        self.reductions = {}
+        self.reduction_kinds = {}
+        self.profile = {}
+
+    @classmethod
+    def from_stream(cls, stream):
+        """Wrap a ``StreamingResult`` (memmap) without reading it."""
+        if stream.pressures is None or stream.flows is None:
+            raise ValueError(f"{stream.filepath} has no pressure/flow channels")
+        return cls(stream.times, stream.pressures, stream.flows, stream.node_ids, stream.link_ids,
+                   source=stream.filepath)
+
+    @property
+    def n_steps(self):
+        return len(self.times)
+
+    def to_numpy(self):
+        if self.pressures is None:
+            raise ValueError("pressures/flows were not recorded (record=False)")
+        return self.pressures, self.flows
+
+    def reductions_frame(self, kind="node"):
+        """Polars frame of the reducer results for ``"node"`` or ``"link"`` elements."""
+        import polars as pl
+        ids = self.node_ids if kind == "node" else self.link_ids
+        cols = [pl.Series("id", ids, dtype=pl.Utf8)]
+        for name, values in self.reductions.items():
+            if self.reduction_kinds.get(name) == kind:
+                cols.append(pl.Series(name, values))
+        return pl.DataFrame(cols)
+
+    def to_polars(self):
+        import polars as pl
+        self.to_numpy()
+
+        def frame(values, ids):
+            cols = [pl.Series("id", ids, dtype=pl.Utf8)]
+            cols += [pl.Series(str(int(t)), values[k]) for k, t in enumerate(self.times)]
+            return pl.DataFrame(cols)
+
+        return frame(self.pressures, self.node_ids), frame(self.flows, self.link_ids)
+
+    def to_pandas(self):
+        import pandas as pd
+        self.to_numpy()
+        index = pd.to_timedelta(np.asarray(self.times, dtype=np.int64), unit="s")
+        # copy=False keeps the 2-D buffer as the frame's only block
+        p = pd.DataFrame(self.pressures, index=index, columns=self.node_ids, copy=False)
+        q = pd.DataFrame(self.flows, index=index, columns=self.link_ids, copy=False)
+        return p, q
+
+    def to(self, return_type):
+        """(pressures, flows) as ``"numpy"``, ``"polars"`` or ``"pandas"``."""
+        if return_type not in RETURN_TYPES:
+            raise ValueError(f"return_type must be one of {RETURN_TYPES}, got {return_type!r}")
+        return getattr(self, f"to_{return_type}")()
+
+    def __repr__(self):
+        where = f", source={self.source!r}" if self.source else ""
+        return (f"SimulationResult(steps={self.n_steps}, nodes={len(self.node_ids)}, "
+                f"links={len(self.link_ids)}{where})")
+
+
+def run_simulation(model, output=None, nodes=None, links=None, start=None, end=None, every=1,
+                   reducers=None, record=True, cancel=None, openmp=True, boundaries=None, steady=None):
+    """
+    Run an extended-period hydraulic simulation and keep the reporting steps.
+
+    Parameters
+    ----------
+    model : str or ResidentProject
+        INP path (opened and closed here) or an open project.
+    output : str, optional
+        Stream blocks into this Protocol V2 file; the result then wraps the
+        file's memmap instead of holding (T, N) arrays in memory.
+    nodes, links : list of str or array of int, optional
+        Record only these elements (IDs, or 1-based kernel indices).
+        Buffers, stream blocks and extraction calls scale with the selection.
+    start, end : int, optional
+        Reporting window (s). The run stops once ``end`` has been recorded.
+    every : int
+        Keep every n-th reporting step inside the window.
+    reducers : list of Reducer, optional
+        Streaming statistics (see ``reducers.py``) updated at every recorded
+        step; results end up in ``SimulationResult.reductions``.
+    record : bool
+        Keep pressures/flows (in memory or in ``output``). Set to False to
+        compute only the reducers.
+    cancel : threading.Event, optional
+        Checked between hydraulic steps; when set, the run stops and
+        raises ``SimulationCancelled``.
+    boundaries : BoundaryConditions, optional
+        Time-gridded element values (see ``scada_ingest.py``) pushed to the
+        project before every hydraulic step that enters a new grid interval.
+    steady : SteadySteps, optional
+        Skip ``EN_runH`` on steps whose inputs did not change since the last
+        solve and carry that solution forward (see ``steady_steps.py``).
+        Solved and skipped step counts end up in ``SimulationResult.profile``.
+
+    Returns
+    -------
+    SimulationResult
+    """
+    owned = not isinstance(model, tk.ResidentProject)
+    proj = tk.ResidentProject(model, openmp=openmp) if owned else model
+    try:
+        times = report_times(proj, start, end, every)
+        n_steps = len(times)
+        node_idx, node_ids = resolve_selection(proj, nodes, "node")
+        link_idx, link_ids = resolve_selection(proj, links, "link")
+        interval = proj.get_time_param(tk.EN_REPORTSTEP) * int(every)
+        stats = ReducerSet(reducers) if reducers else None
+        if stats is not None:
+            stats.start(len(node_ids), len(link_ids), interval)
+
+        sink = None
+        if not record:
+            output = None
+        elif output is not None:
+            sink = StreamingWriter(output, node_ids, link_ids, rpt_step=interval,
+                                   config={"duration": proj.get_time_param(tk.EN_DURATION)})
+            p_row = np.empty(len(node_ids), dtype=np.float64)
+            q_row = np.empty(len(link_ids), dtype=np.float64)
+        else:
+            # The getters write straight into these rows
+            pressures = np.empty((n_steps, len(node_ids)), dtype=np.float64)
+            flows = np.empty((n_steps, len(link_ids)), dtype=np.float64)
+
+        if boundaries is not None:
+            boundaries.start(proj)
+        if steady is not None:
+            steady.start(proj)
+        started = time.perf_counter()
+        n_hydraulic = n_skipped = 0
+        proj.init_hydraulics(tk.EN_NOSAVE)
+        k = 0
+        try:
+            while k < n_steps:
+                if cancel is not None and cancel.is_set():
+                    raise SimulationCancelled(proj.get_time_param(tk.EN_HTIME))
+                pushed = False
+                if boundaries is not None or steady is not None:
+                    t = proj.get_time_param(tk.EN_HTIME)
+                    if boundaries is not None:
+                        pushed = boundaries.update(proj, t)
+                n_hydraulic += 1
+                if steady is not None and steady.is_steady(proj, t, pushed):
+                    n_skipped += 1
+                else:
+                    t = proj.run_step()
+                    if steady is not None:
+                        steady.solved(proj, t)
+                if t == times[k]:
+                    known = None
+                    if record:
+                        p_out = p_row if sink is not None else pressures[k]
+                        q_out = q_row if sink is not None else flows[k]
+                        proj.get_node_values(tk.EN_PRESSURE, out=p_out, indices=node_idx)
+                        proj.get_link_values(tk.EN_FLOW, out=q_out, indices=link_idx)
+                        if sink is not None:
+                            sink.write_block(t, pressure=p_out, flow=q_out)
+                        known = {"pressure": p_out, "flow": q_out}
+                    if stats is not None:
+                        stats.update(proj, t, node_idx, link_idx, known)
+                    k += 1
+                if proj.next_step() <= 0:
+                    break
+        finally:
+            proj.close_hydraulics()
+            if sink is not None:
+                sink.close()
+
+        if sink is not None:
+            result = SimulationResult.from_stream(load_streaming_result(output))
+        elif record:
+            result = SimulationResult(times[:k], pressures[:k], flows[:k], node_ids, link_ids)
+        else:
+            result = SimulationResult(times[:k], None, None, node_ids, link_ids)
+        if stats is not None:
+            result.reductions = stats.results()
+            result.reduction_kinds = stats.kinds()
+        result.profile = {"hydraulic_steps": n_hydraulic, "solved_steps": n_hydraulic - n_skipped,
+                          "skipped_steps": n_skipped, "seconds": time.perf_counter() - started}
+        return result
+    finally:
+        if owned:
+            proj.close()
+
+
+def simulate(model, return_type="pandas", output=None, nodes=None, links=None, start=None, end=None,
+             every=1, openmp=True):
+    """
+    Run a hydraulic simulation and return ``(pressures, flows)``.
+
+    Parameters
+    ----------
+    model : str or ResidentProject
+    return_type : {"pandas", "polars", "numpy"}
+        Result container, see the module docstring for layouts.
+    output : str, optional
+        Stream to a Protocol V2 file and return views on its memmap.
+    nodes, links, start, end, every
+        Element selection and reporting window, see ``run_simulation``.
+    """
+    if return_type not in RETURN_TYPES:
+        raise ValueError(f"return_type must be one of {RETURN_TYPES}, got {return_type!r}")
+    result = run_simulation(model, output=output, nodes=nodes, links=links, start=start, end=end,
+                            every=every, openmp=openmp)
+    return result.to(return_type)
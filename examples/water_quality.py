@@ -0,0 +1,313 @@
+"""
+EPANET-Turbo Water Quality Runs
+===============================
+
+Fast path for water age, chemical (e.g. chlorine decay) and source trace
+analyses. Hydraulics are solved once with ``EN_solveH``; quality is then
+routed with the ``EN_openQ / EN_runQ / EN_nextQ`` loop (the loop behind
+``ENsolveQ``) and ``EN_QUALITY`` is pulled for all nodes (and optionally
+links) with one bulk call per reporting step into preallocated buffers.
+
+Only reporting times are captured, so large models do not pay an extraction
+for every intermediate hydraulic event. Results are returned as float32
+arrays or streamed straight into a Protocol V2 file with quality channels.
+
+Usage:
+------
+    from water_quality import run_quality
+    from turbo_kernel import EN_AGE, EN_CHEM
+
+    # Water age, in memory: res.node_quality has shape (T, N)
+    res = run_quality("Net3.inp", EN_AGE)
+
+    # Chlorine decay streamed to disk every 2 hours
+    res = run_quality("network.inp", EN_CHEM, chem_name="Chlorine", chem_units="mg/L",
+                      report_step=7200, output="chlorine.out")
+    res.node_quality[-1]                     # memmap view
+
+    # Scenario sweep: hydraulics solved once, quality runs in worker processes
+    from water_quality import run_quality_sweep
+    scenarios = [{"name": src, "qual_type": EN_TRACE, "trace_node": src} for src in ("River", "Lake")]
+    results = run_quality_sweep("Net3.inp", scenarios, workers=4)
+"""
+
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    from . import turbo_kernel as tk
+    from .streaming_v2 import (StreamingWriter, load_streaming_result, CH_PRESSURE, CH_FLOW,
+                               CH_NODE_QUALITY, CH_LINK_QUALITY)
+except ImportError:
+    import turbo_kernel as tk
+    from streaming_v2 import (StreamingWriter, load_streaming_result, CH_PRESSURE, CH_FLOW,
+                              CH_NODE_QUALITY, CH_LINK_QUALITY)
+
+QUALITY_NAMES = {tk.EN_NONE: "NONE", tk.EN_CHEM: "CHEMICAL", tk.EN_AGE: "AGE", tk.EN_TRACE: "TRACE"}
+
+
+class QualityResult:
+    def __init__(self, times, node_quality, link_quality, node_ids, link_ids, qual_type):
+        self.times = times
+        self.node_quality = node_quality
+        self.link_quality = link_quality
+        self.node_ids = node_ids
+        self.link_ids = link_ids
+        self.qual_type = qual_type
+
+    @property
+    def n_steps(self):
+        return len(self.times)
+
+    def to_polars(self, kind="node"):
+        """Wide DataFrame: one row per reporting time, one column per element."""
+        import polars as pl
+        values, ids = (self.node_quality, self.node_ids) if kind == "node" else (self.link_quality, self.link_ids)
+        if values is None:
+            raise ValueError(f"no {kind} quality was captured")
+        df = pl.from_numpy(values, schema=ids, orient="row")
+        return df.insert_column(0, pl.Series("time", self.times))
+
+    def __repr__(self):
+        return (f"QualityResult({QUALITY_NAMES.get(self.qual_type, self.qual_type)}, "
+                f"steps={self.n_steps}, nodes={len(self.node_ids)})")
+
+
+def report_times(project, report_step=None):
+    """Reporting times (s) of the project, optionally decimated to ``report_step``."""
+    duration = project.get_time_param(tk.EN_DURATION)
+    start = project.get_time_param(tk.EN_REPORTSTART)
+    model_step = project.get_time_param(tk.EN_REPORTSTEP)
+    step = int(report_step or model_step)
+    if step <= 0 or step % model_step:
+        raise ValueError(f"report step must be a positive multiple of the model reporting step ({model_step} s)")
+    if duration < start:
+        return np.zeros(0, dtype=np.int32)
+    return np.arange(start, duration + 1, step, dtype=np.int32)
+
+
+def run_quality(model, qual_type=None, chem_name="", chem_units="", trace_node="",
+                report_step=None, links=False, output=None, hydraulics=False,
+                reuse_hydraulics=False, openmp=True):
+    """
+    Run a water quality simulation and capture ``EN_QUALITY`` at reporting times.
+
+    Parameters
+    ----------
+    model : str or ResidentProject
+        INP path (opened and closed here) or an open project.
+    qual_type : int, optional
+        EN_AGE, EN_CHEM or EN_TRACE. Default: the [OPTIONS] Quality of the INP.
+    chem_name, chem_units : str
+        Constituent name/units for EN_CHEM.
+    trace_node : str
+        Source node ID for EN_TRACE.
+    report_step : int, optional
+        Capture interval (s); defaults to the model reporting step. Use a
+        multiple of it to decimate long runs.
+    links : bool
+        Also capture link quality.
+    output : str, optional
+        Stream blocks to this Protocol V2 file instead of keeping them in memory.
+    hydraulics : bool
+        With ``output``, also stream pressures and flows at the same times.
+    reuse_hydraulics : bool
+        Skip ``EN_solveH`` when the project already holds a hydraulic
+        solution (solved earlier or loaded with ``use_hydraulics``).
+
+    Returns
+    -------
+    QualityResult, or StreamingResult when ``output`` is given.
+    """
+    owned = not isinstance(model, tk.ResidentProject)
+    proj = tk.ResidentProject(model, openmp=openmp) if owned else model
+    try:
+        if qual_type is not None:
+            proj.set_quality_type(qual_type, chem_name, chem_units, trace_node)
+        qual_type = proj.quality_type[0]
+        if qual_type == tk.EN_NONE:
+            raise ValueError("no water quality analysis selected (pass qual_type or set [OPTIONS] Quality)")
+
+        times = report_times(proj, report_step)
+        step = int(times[1] - times[0]) if len(times) > 1 else int(report_step or 1)
+
+        node_buf = np.empty(proj.num_nodes, dtype=np.float64)
+        link_buf = np.empty(proj.num_links, dtype=np.float64) if links else None
+        if output is not None:
+            channels = CH_NODE_QUALITY | (CH_LINK_QUALITY if links else 0)
+            if hydraulics:
+                channels |= CH_PRESSURE | CH_FLOW
+            sink = StreamingWriter(output, proj.node_ids, proj.link_ids, rpt_step=step, channels=channels,
+                                   config={"duration": proj.get_time_param(tk.EN_DURATION),
+                                           "quality": QUALITY_NAMES[qual_type],
+                                           "chem_units": chem_units or None})
+            pres_buf = np.empty(proj.num_nodes, dtype=np.float64) if hydraulics else None
+            flow_buf = np.empty(proj.num_links, dtype=np.float64) if hydraulics else None
+        else:
+            sink = None
+            node_q = np.empty((len(times), proj.num_nodes), dtype=np.float32)
+            link_q = np.empty((len(times), proj.num_links), dtype=np.float32) if links else None
+
+        if not (reuse_hydraulics and proj.hydraulics_ready):
+            proj.solve_hydraulics()
+        proj.init_quality(tk.EN_NOSAVE)
+        k = 0
+        try:
+            while True:
+                t = proj.run_quality_step()
+                if k < len(times) and t == times[k]:
+                    proj.get_node_values(tk.EN_QUALITY, out=node_buf)
+                    if links:
+                        proj.get_link_values(tk.EN_LINKQUAL, out=link_buf)
+                    if sink is not None:
+                        if hydraulics:
+                            proj.get_node_values(tk.EN_PRESSURE, out=pres_buf)
+                            proj.get_link_values(tk.EN_FLOW, out=flow_buf)
+                        sink.write_block(t, pressure=pres_buf if hydraulics else None,
+                                         flow=flow_buf if hydraulics else None,
+                                         node_quality=node_buf, link_quality=link_buf)
+                    else:
+                        node_q[k] = node_buf
+                        if links:
+                            link_q[k] = link_buf
+                    k += 1
+                if proj.next_quality_step() <= 0:
+                    break
+        finally:
+            proj.close_quality()
+            if sink is not None:
+                sink.close()
+
+        if sink is not None:
+            return load_streaming_result(output)
+        if k < len(times):
+            times, node_q = times[:k], node_q[:k]
+            link_q = link_q[:k] if links else None
+        return QualityResult(times, node_q, link_q, proj.node_ids, proj.link_ids, qual_type)
+    finally:
+        if owned:
+            proj.close()
+
+
+# ----------------------------------------------------------------------
+# Scenario sweeps on shared hydraulics
+# ----------------------------------------------------------------------
+def save_hydraulics(inp_path, path=None, openmp=True):
+    """
+    Solve hydraulics once and keep them in a binary hydraulics file.
+
+    Without ``path`` the file is created in a fresh directory under
+    ``/dev/shm`` when available (RAM-backed), otherwise the temp dir.
+    Returns the file path.
+    """
+    if path is None:
+        shm = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        path = os.path.join(tempfile.mkdtemp(prefix="epanet_turbo_hyd_", dir=shm), "hydraulics.hyd")
+    with tk.ResidentProject(inp_path, openmp=openmp) as proj:
+        proj.solve_hydraulics()
+        proj.save_hydraulics(path)
+    return path
+
+
+_WORKER = {}
+
+
+def _init_worker(inp_path, hyd_path, openmp):
+    proj = tk.ResidentProject(inp_path, openmp=openmp)
+    proj.use_hydraulics(hyd_path)
+    _WORKER["project"] = proj
+    # INP analysis, restored after every scenario so none inherits the last one's
+    _WORKER["quality"] = proj.quality_info()
+
+
+def _set_values(proj, kind, values):
+    # values: {prop: {id: value}}; returns the baseline needed to undo the change
+    undo = []
+    for prop, by_id in (values or {}).items():
+        if kind == "node":
+            idx = proj.node_index(list(by_id))
+            old = proj.get_node_values(prop)[idx - 1]
+            proj.set_node_values(idx, prop, list(by_id.values()))
+        else:
+            idx = proj.link_index(list(by_id))
+            old = proj.get_link_values(prop)[idx - 1]
+            proj.set_link_values(idx, prop, list(by_id.values()))
+        undo.append((kind, prop, idx, old))
+    return undo
+
+
+def _run_scenario(name, scenario, report_step, links, output_dir):
+    proj = _WORKER["project"]
+    undo = _set_values(proj, "node", scenario.get("node_values"))
+    undo += _set_values(proj, "link", scenario.get("link_values"))
+    output = None
+    if output_dir is not None:
+        output = os.path.join(output_dir, f"{name}.out")
+    try:
+        result = run_quality(
+            proj, scenario.get("qual_type"), scenario.get("chem_name", ""), scenario.get("chem_units", ""),
+            scenario.get("trace_node", ""), report_step=report_step, links=links, output=output,
+            reuse_hydraulics=True,
+        )
+    finally:
+        for kind, prop, idx, old in reversed(undo):
+            setter = proj.set_node_values if kind == "node" else proj.set_link_values
+            setter(idx, prop, old)
+        if proj.quality_info() != _WORKER["quality"]:
+            proj.set_quality_type(*_WORKER["quality"])
+    if output is not None:
+        return output
+    return result
+
+
+def run_quality_sweep(inp_path, scenarios, workers=None, hydraulics_file=None,
+                      report_step=None, links=False, output_dir=None, openmp=True):
+    """
+    Run many water quality scenarios on one shared hydraulic solution.
+
+    Hydraulics are solved once (or taken from ``hydraulics_file``); every
+    worker process opens the model once, attaches the hydraulics file with
+    ``EN_usehydfile`` and then only routes quality per scenario.
+
+    Parameters
+    ----------
+    inp_path : str
+    scenarios : list of dict
+        Keys: ``name``, ``qual_type``, ``chem_name``, ``chem_units``,
+        ``trace_node`` and, for per-scenario inputs that do not affect
+        hydraulics, ``node_values`` / ``link_values`` as
+        ``{property: {id: value}}`` (e.g. EN_INITQUAL, EN_SOURCEQUAL,
+        EN_KBULK, EN_KWALL). Changed values are restored after each run.
+    workers : int, optional
+        Worker processes (default: ``os.cpu_count()``).
+    hydraulics_file : str, optional
+        Existing hydraulics file to reuse; it is kept. A temporary one is
+        created (and removed) otherwise.
+    output_dir : str, optional
+        Stream each scenario to ``{output_dir}/{name}.out`` and return the
+        paths instead of in-memory results.
+
+    Returns
+    -------
+    list of QualityResult (or output paths), in scenario order.
+    """
+    scenarios = list(scenarios)
+    names = [sc.get("name", f"scenario_{i}") for i, sc in enumerate(scenarios)]
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    owned = hydraulics_file is None
+    hyd_path = save_hydraulics(inp_path, openmp=openmp) if owned else os.fspath(hydraulics_file)
+    try:
+        workers = min(workers or os.cpu_count() or 1, max(len(scenarios), 1))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(os.fspath(inp_path), hyd_path, openmp)) as pool:
+            n = len(scenarios)
+            return list(pool.map(_run_scenario, names, scenarios, [report_step] * n, [links] * n, [output_dir] * n))
+    finally:
+        if owned:
+            shutil.rmtree(os.path.dirname(hyd_path), ignore_errors=True)
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import polars as pl
+import pytest
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples")
+sys.path.insert(0, EXAMPLES)
+
+from lazy_parser import LazyInpParser  # noqa: E402
+
+NET1 = os.path.join(EXAMPLES, "Net1.inp")
+
+
+def _set(df, element, **values):
+    hit = pl.col("id") == element
+    return df.with_columns(pl.when(hit).then(pl.lit(v)).otherwise(pl.col(k)).alias(k) for k, v in values.items())
+
+
+def test_null_middle_field_keeps_later_columns(tmp_path):
+    model = LazyInpParser(NET1)
+    junctions = _set(model.table("JUNCTIONS"), "10", demand=None, pattern="1")
+    out = model.write_inp(str(tmp_path / "out.inp"), tables={"junctions": junctions})
+
+    row = LazyInpParser(out).table("JUNCTIONS").filter(pl.col("id") == "10").row(0, named=True)
+    assert row["demand"] == 0.0
+    assert row["pattern"] == "1"
+
+
+def test_null_middle_text_field_raises(tmp_path):
+    model = LazyInpParser(NET1)
+    tanks = _set(model.table("TANKS"), "2", vol_curve=None, overflow="YES")
+    with pytest.raises(ValueError, match="vol_curve"):
+        model.write_inp(str(tmp_path / "out.inp"), tables={"tanks": tanks})
+
+
+def test_compact_keeps_coordinates_full_precision(tmp_path):
+    model = LazyInpParser(NET1, compact=True)
+    coords = _set(model.table("COORDINATES"), "10", x=4512345.89, y=10.123456789)
+    out = model.write_inp(str(tmp_path / "out.inp"), tables={"coordinates": coords})
+
+    assert model.table("JUNCTIONS")["elevation"].dtype == pl.Float32
+    assert coords["x"].dtype == pl.Float64
+    row = LazyInpParser(out).table("COORDINATES").filter(pl.col("id") == "10").row(0, named=True)
+    assert row["x"] == 4512345.89
+    assert row["y"] == 10.123456789
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples")
+sys.path.insert(0, EXAMPLES)
+
+import turbo_kernel as tk  # noqa: E402
+from turbo_simulation import run_simulation  # noqa: E402
+
+HOUR = 3600
+
+
+@pytest.fixture
+def net3():
+    proj = tk.ResidentProject(os.path.join(EXAMPLES, "Net3.inp"))
+    yield proj
+    proj.close()
+
+
+def test_iter_steps_every_matches_run_simulation(net3):
+    window = dict(start=7 * HOUR, end=15 * HOUR, every=2)
+    times = [t for t, _, _ in net3.iter_steps(reporting_only=True, **window)]
+    assert times == [7 * HOUR, 9 * HOUR, 11 * HOUR, 13 * HOUR, 15 * HOUR]
+    np.testing.assert_array_equal(run_simulation(net3, **window).times, times)
+
+
+def test_iter_steps_rejects_every_without_reporting_only(net3):
+    with pytest.raises(ValueError):
+        next(net3.iter_steps(every=2))
+
+
+def test_iter_steps_checks_index_bounds(net3):
+    with pytest.raises(IndexError):
+        next(net3.iter_steps(nodes=[0]))